@@ -0,0 +1,230 @@
+'''
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+Search-as-you-type over members, threads, workshift types and wiki pages.
+
+The titles of those objects are held in memory in a PrefixIndex, a sorted
+array of (word, entry) pairs that is searched by bisection. Each index keeps
+an LRU cache of the prefixes it has answered. Flushing the search queue bumps
+a version number in Django's cache, and each process rebuilds its index when
+that version changes or when its index is older than AUTOCOMPLETE_MAX_AGE,
+so processes that do not share a cache still catch up.
+'''
+
+from __future__ import absolute_import
+
+from bisect import bisect_left
+from collections import OrderedDict
+from heapq import nsmallest
+import re
+import threading
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.utils.encoding import force_text
+
+from utils.variables import ANONYMOUS_USERNAME
+
+VERSION_KEY = "autocomplete_version"
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Result types, in the order they are listed for equally good matches
+MEMBER = "Member"
+THREAD = "Thread"
+WORKSHIFT_TYPE = "Workshift Type"
+WIKI_PAGE = "Wiki Page"
+TYPE_ORDER = dict(
+    (name, index)
+    for index, name in enumerate([MEMBER, THREAD, WORKSHIFT_TYPE, WIKI_PAGE])
+)
+
+
+def _words(text):
+    return WORD_RE.findall(force_text(text).lower())
+
+
+class LRUCache(object):
+    ''' A dictionary holding at most size items, dropping the least recently
+    used first. '''
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                return None
+            self.items[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+class PrefixIndex(object):
+    '''
+    Entries are dictionaries with a label, type and url. Every word of an
+    entry's label and keywords is a key; a query matches the entries that have
+    a key starting with each of the query's words.
+    '''
+    def __init__(self, entries, cache_size):
+        self.entries = entries
+        self.phrases = []
+        keys = set()
+        for number, entry in enumerate(entries):
+            self.phrases.append(" ".join(_words(entry["label"])))
+            for word in _words(" ".join([entry["label"]] + entry["keywords"])):
+                keys.add((word, number))
+        self.keys = sorted(keys)
+        self.cache = LRUCache(cache_size)
+
+    def _match_word(self, prefix):
+        # Every word starting with prefix sorts before prefix + U+FFFF
+        start = bisect_left(self.keys, (prefix,))
+        end = bisect_left(self.keys, (prefix + u"\uffff",), start)
+        return set(number for _, number in self.keys[start:end])
+
+    def search(self, query, limit):
+        words = _words(query)
+        if not words:
+            return []
+        phrase = " ".join(words)
+        key = (phrase, limit)
+        results = self.cache.get(key)
+        if results is not None:
+            return results
+
+        # Match the longest word first, it has the fewest candidates
+        words.sort(key=len, reverse=True)
+        matches = self._match_word(words[0])
+        for word in words[1:]:
+            if not matches:
+                break
+            matches &= self._match_word(word)
+
+        best = nsmallest(limit, matches, key=lambda number: (
+            not self.phrases[number].startswith(phrase),
+            TYPE_ORDER[self.entries[number]["type"]],
+            self.phrases[number],
+        ))
+        results = [
+            dict(
+                label=self.entries[number]["label"],
+                type=self.entries[number]["type"],
+                url=self.entries[number]["url"],
+            )
+            for number in best
+        ]
+        self.cache.set(key, results)
+        return results
+
+
+def _build_entries():
+    from base.models import UserProfile
+    from threads.models import Thread
+    from workshift.models import WorkshiftType
+    from wiki.models import Page
+
+    entries = []
+    for profile in UserProfile.objects.exclude(
+            user__username=ANONYMOUS_USERNAME).select_related("user"):
+        user = profile.user
+        entries.append(dict(
+            label=user.get_full_name() or user.username,
+            keywords=[user.username],
+            type=MEMBER,
+            url=reverse("member_profile",
+                        kwargs={"targetUsername": user.username}),
+        ))
+    for pk, subject in Thread.objects.filter(active=True) \
+      .values_list("pk", "subject"):
+        entries.append(dict(
+            label=subject,
+            keywords=[],
+            type=THREAD,
+            url=reverse("threads:view_thread", kwargs={"pk": pk}),
+        ))
+    for workshift_type in WorkshiftType.objects.all():
+        entries.append(dict(
+            label=workshift_type.title,
+            keywords=[],
+            type=WORKSHIFT_TYPE,
+            url=workshift_type.get_view_url(),
+        ))
+    for page in Page.objects.all().select_related("wiki"):
+        entries.append(dict(
+            label=page.slug,
+            keywords=[],
+            type=WIKI_PAGE,
+            url=page.get_absolute_url(),
+        ))
+    return entries
+
+
+def autocomplete_models():
+    from base.models import UserProfile
+    from threads.models import Thread
+    from workshift.models import WorkshiftType
+    from wiki.models import Page
+
+    return set([UserProfile, Thread, WorkshiftType, Page])
+
+
+_state = dict(index=None, version=None, built=0)
+_lock = threading.Lock()
+
+
+def _is_current(index, version):
+    return index is not None and _state["version"] == version and \
+      time() - _state["built"] < settings.AUTOCOMPLETE_MAX_AGE
+
+
+def get_index():
+    '''
+    Returns this process's PrefixIndex, rebuilding it first if the search
+    queue has changed any of its models since it was built.
+    '''
+    version = cache.get(VERSION_KEY, 0)
+    index = _state["index"]
+    if _is_current(index, version):
+        return index
+    with _lock:
+        index = _state["index"]
+        if not _is_current(index, version):
+            index = PrefixIndex(
+                _build_entries(), settings.AUTOCOMPLETE_CACHE_SIZE,
+            )
+            _state.update(index=index, version=version, built=time())
+        return index
+
+
+def invalidate(models=None):
+    '''
+    Marks every process's index as out of date. Called by the search queue
+    with the models it flushed; other models are ignored.
+    '''
+    if models is not None and not autocomplete_models() & set(models):
+        return
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+    _state["index"] = None
+
+
+def autocomplete(query, limit=None):
+    if limit is None:
+        limit = settings.AUTOCOMPLETE_MAX_RESULTS
+    return get_index().search(query, limit)
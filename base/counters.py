@@ -0,0 +1,214 @@
+'''
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+Site statistics. Each registered counter holds the number of rows of a model
+that match some filters. Counts are kept in the SiteCounter table and adjusted
+on each save and delete, so the archives page does not have to count whole
+tables. Bulk updates and bulk creates send no signals, so reconcile, run from
+cron, recounts everything from scratch. Processes keep the counts they read for
+SITE_COUNTERS_CACHE_SECONDS, as clearing the cache when a count changes only
+reaches other processes if they share a cache backend.
+
+To tell whether a save moved a row between filtered counters, the values of
+the fields they filter on are noted when each instance is loaded. The old row
+is only read back when one of those fields has changed since.
+'''
+
+from __future__ import absolute_import
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import post_init, pre_save, post_save, \
+    post_delete
+
+CACHE_KEY = "site_counters"
+
+Counter = namedtuple("Counter", ["name", "model", "filters", "exclude"])
+
+_counters = []
+_connected = set()
+_tracked = {}
+
+# The _counted_in of an instance saved without changing any filtered field
+_UNCHANGED = object()
+
+
+def _value(instance, lookup):
+    for name in lookup.split("__"):
+        instance = getattr(instance, name, None)
+        if instance is None:
+            break
+    return instance
+
+
+def _matches(counter, instance):
+    return all(
+        _value(instance, lookup) == value
+        for lookup, value in counter.filters.items()
+    ) and not (counter.exclude and all(
+        _value(instance, lookup) == value
+        for lookup, value in counter.exclude.items()
+    ))
+
+
+def _queryset(counter):
+    queryset = counter.model._default_manager.filter(**counter.filters)
+    if counter.exclude:
+        queryset = queryset.exclude(**counter.exclude)
+    return queryset
+
+
+def register(name, model, exclude=None, **filters):
+    '''
+    Counts the rows of model that match filters and do not match exclude.
+    Filters may only test for equality, and may follow relations.
+    '''
+    _counters.append(Counter(name, model, filters, exclude or {}))
+    _tracked.pop(model, None)
+    if model not in _connected:
+        _connected.add(model)
+        post_init.connect(_initialized, sender=model,
+                          dispatch_uid="counters_post_init")
+        pre_save.connect(_remember, sender=model,
+                         dispatch_uid="counters_pre_save")
+        post_save.connect(_saved, sender=model,
+                          dispatch_uid="counters_post_save")
+        post_delete.connect(_deleted, sender=model,
+                            dispatch_uid="counters_post_delete")
+
+
+def _model_counters(model):
+    return [counter for counter in _counters if counter.model is model]
+
+
+def _tracked_fields(model):
+    ''' The attnames of the fields model's counters filter on. '''
+    if model not in _tracked:
+        names = set()
+        for counter in _model_counters(model):
+            for lookup in list(counter.filters) + list(counter.exclude):
+                field = model._meta.get_field(lookup.split("__")[0])
+                names.add(field.attname)
+        _tracked[model] = sorted(names)
+    return _tracked[model]
+
+
+def _snapshot(model, instance):
+    # Deferred fields are left out rather than loaded
+    return tuple(
+        (name, instance.__dict__[name])
+        for name in _tracked_fields(model)
+        if name in instance.__dict__
+    )
+
+
+def _initialized(sender, instance, **kwargs):
+    if instance.pk is not None and _tracked_fields(sender):
+        instance._counter_fields = _snapshot(sender, instance)
+
+
+def _adjust(deltas):
+    from base.models import SiteCounter
+
+    deltas = dict((name, delta) for name, delta in deltas.items() if delta)
+    # Counters without a row yet are counted from scratch when they are read
+    for name, delta in deltas.items():
+        SiteCounter.objects.filter(name=name).update(value=F("value") + delta)
+    if deltas:
+        cache.delete(CACHE_KEY)
+
+
+def _remember(sender, instance, raw=False, **kwargs):
+    ''' Records which counters instance was in before it is saved. '''
+    if raw or instance.pk is None:
+        return
+    filtered = [c for c in _model_counters(sender) if c.filters or c.exclude]
+    if not filtered:
+        return
+    snapshot = getattr(instance, "_counter_fields", None)
+    # Instances built by hand with a pk may not match the row they overwrite
+    if not instance._state.adding and snapshot is not None and \
+       len(snapshot) == len(_tracked_fields(sender)) and \
+       snapshot == _snapshot(sender, instance):
+        instance._counted_in = _UNCHANGED
+        return
+    try:
+        old = sender._default_manager.get(pk=instance.pk)
+    except sender.DoesNotExist:
+        return
+    instance._counted_in = set(
+        counter.name for counter in filtered if _matches(counter, old)
+    )
+
+
+def _saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    counted_in = getattr(instance, "_counted_in", None)
+    instance._counted_in = None
+    if _tracked_fields(sender):
+        instance._counter_fields = _snapshot(sender, instance)
+    deltas = {}
+    for counter in _model_counters(sender):
+        if created:
+            was = False
+        elif counter.filters or counter.exclude:
+            if counted_in is _UNCHANGED:
+                continue
+            was = counted_in is not None and counter.name in counted_in
+        else:
+            continue
+        deltas[counter.name] = int(_matches(counter, instance)) - int(was)
+    _adjust(deltas)
+
+
+def _deleted(sender, instance, **kwargs):
+    _adjust(dict(
+        (counter.name, -1)
+        for counter in _model_counters(sender)
+        if _matches(counter, instance)
+    ))
+
+
+def _recount(counters):
+    from base.models import SiteCounter
+
+    values = {}
+    for counter in counters:
+        values[counter.name] = _queryset(counter).count()
+        SiteCounter.objects.update_or_create(
+            name=counter.name, defaults=dict(value=values[counter.name]),
+        )
+    return values
+
+
+def reconcile():
+    '''
+    Recounts every counter from the database, correcting any drift. Returns
+    the counts.
+    '''
+    values = _recount(_counters)
+    cache.delete(CACHE_KEY)
+    return values
+
+
+def get_counts():
+    '''
+    A dictionary from counter name to count, read from the cache or in one
+    query. Counters that have never been counted are counted now.
+    '''
+    from base.models import SiteCounter
+
+    values = cache.get(CACHE_KEY)
+    if values is None:
+        values = dict(SiteCounter.objects.values_list("name", "value"))
+        values.update(_recount(
+            counter for counter in _counters if counter.name not in values
+        ))
+        cache.set(CACHE_KEY, values, settings.SITE_COUNTERS_CACHE_SECONDS)
+    return values
@@ -0,0 +1,75 @@
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils.timezone import now
+
+from django_cron import CronJobBase, Schedule
+from notifications.models import Notification
+
+from base.counters import reconcile
+from base.mail import queue_digests, send_queued_mail
+from base.search_queue import flush_search_queue
+
+class FlushSearchQueueCronJob(CronJobBase):
+    RUN_EVERY_MINS = 5
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = "base.flush_search_queue"
+
+    def do(self):
+        flush_search_queue()
+
+class SendQueuedMailCronJob(CronJobBase):
+    RUN_EVERY_MINS = 5
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = "base.send_queued_mail"
+
+    def do(self):
+        send_queued_mail()
+
+class QueueDigestsCronJob(CronJobBase):
+    RUN_EVERY_MINS = settings.EMAIL_DIGEST_MINS
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = "base.queue_digests"
+
+    def do(self):
+        if settings.SEND_EMAILS:
+            queue_digests()
+
+class PruneNotificationsCronJob(CronJobBase):
+    """
+    Delete read notifications more than NOTIFICATION_READ_LIFE days old, a
+    batch at a time so that the table is never locked for long.
+    """
+    RUN_AT_TIMES = ['03:00',]
+    BATCH_SIZE = 500
+
+    schedule = Schedule(run_at_times=RUN_AT_TIMES)
+    code = "base.prune_notifications"
+
+    def do(self):
+        if settings.NOTIFICATION_READ_LIFE is None:
+            return
+        cutoff = now() - timedelta(days=settings.NOTIFICATION_READ_LIFE)
+        old = Notification.objects.filter(unread=False, timestamp__lt=cutoff)
+        while True:
+            pks = list(old.values_list("pk", flat=True)[:self.BATCH_SIZE])
+            if not pks:
+                break
+            Notification.objects.filter(pk__in=pks).delete()
+
+class ReconcileCountersCronJob(CronJobBase):
+    """
+    Recount the site statistics, correcting changes made by bulk updates,
+    which the counters do not see.
+    """
+    RUN_EVERY_MINS = 60
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = "base.reconcile_counters"
+
+    def do(self):
+        reconcile()
@@ -8,9 +8,8 @@ from django.http import HttpResponseRedirect
 from django.core.urlresolvers import reverse
 
 from utils.variables import MESSAGES
+from base.permissions import get_capabilities
 from base.redirects import red_home
-from base.models import UserProfile
-from managers.models import Manager
 
 def profile_required(function=None, redirect_no_user='login', redirect_profile=red_home):
     def real_decorator(view_func):
@@ -24,9 +23,7 @@ def profile_required(function=None, redirect_no_user='login', redirect_profile=r
                 if redirect_no_user == "login":
                     redirect_to += "?next=" + request.path
                 return HttpResponseRedirect(redirect_to)
-            try:
-                UserProfile.objects.get(user=request.user)
-            except UserProfile.DoesNotExist:
+            if get_capabilities(request.user).profile is None:
                 return redirect_profile(request, MESSAGES['NO_PROFILE'])
             return view_func(request, *args, **kwargs)
         return wrap
@@ -50,9 +47,7 @@ def admin_required(function=None, redirect_no_user='login', redirect_profile=red
                 if redirect_no_user == "login":
                     redirect_to += "?next=" + request.path
                 return HttpResponseRedirect(redirect_to)
-            try:
-                UserProfile.objects.get(user=request.user)
-            except UserProfile.DoesNotExist:
+            if get_capabilities(request.user).profile is None:
                 return redirect_profile(request, MESSAGES['NO_PROFILE'])
             if not request.user.is_superuser:
                 return redirect_profile(request, MESSAGES['ADMINS_ONLY'])
@@ -70,14 +65,10 @@ def president_admin_required(function=None, redirect_no_user='login', redirect_p
                 if redirect_no_user == "login":
                     redirect_to += "?next=" + request.path
                 return HttpResponseRedirect(redirect_to)
-            try:
-                UserProfile.objects.get(user=request.user)
-            except UserProfile.DoesNotExist:
+            if get_capabilities(request.user).profile is None:
                 return redirect_profile(request, MESSAGES['NO_PROFILE'])
-            # whether the user has president privileges
-            president = Manager.objects.filter(incumbent__user=request.user, president=True) \
-                        .count() > 0
-            if (not request.user.is_superuser) and (not president):
+            if (not request.user.is_superuser) and \
+              (not get_capabilities(request.user).is_president):
                 return redirect_profile(request, MESSAGES['PRESIDENTS_ONLY'])
             return view_func(request, *args, **kwargs)
         return wrap
@@ -0,0 +1,206 @@
+'''
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+Notification fan-out. notify_many records one event for all of its recipients
+and hands it to a worker thread, which writes the notifications of every event
+it has waiting with one bulk_create. Unlike notify.send, no per-recipient
+signals are sent.
+
+A recipient is not notified again of an event while they have an unread
+notification from the same actor, with the same verb, about the same target
+(or action object, for events without a target). Events about neither are
+always delivered.
+'''
+
+from __future__ import absolute_import
+
+import atexit
+from collections import namedtuple
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections
+from django.utils.six.moves import queue
+from django.utils.timezone import now
+
+logger = logging.getLogger(__name__)
+
+FanoutEvent = namedtuple("FanoutEvent", [
+    "actor", "verb", "action_object", "target", "description", "timestamp",
+    "recipient_pks",
+])
+
+_queue = queue.Queue()
+_worker = dict(thread=None)
+_worker_lock = threading.Lock()
+
+
+def _reference(obj):
+    if obj is None:
+        return None
+    return (ContentType.objects.get_for_model(obj).pk, str(obj.pk))
+
+
+def notify_many(actor, recipients, verb, action_object=None, target=None,
+                description=None):
+    '''
+    Notifies each of recipients, users, that actor did verb. Recipients that
+    are None or repeated are skipped.
+    '''
+    send_events([make_event(
+        actor, recipients, verb, action_object=action_object, target=target,
+        description=description,
+    )])
+
+
+def make_event(actor, recipients, verb, action_object=None, target=None,
+               description=None):
+    '''
+    The event notify_many would send, or None if there is no one to notify.
+    For callers sending many events at once with send_events.
+    '''
+    recipient_pks = []
+    for recipient in recipients:
+        if recipient is not None and recipient.pk not in recipient_pks:
+            recipient_pks.append(recipient.pk)
+    if not recipient_pks:
+        return None
+    return FanoutEvent(
+        actor=_reference(actor),
+        verb=verb,
+        action_object=_reference(action_object),
+        target=_reference(target),
+        description=description,
+        timestamp=now(),
+        recipient_pks=recipient_pks,
+    )
+
+
+def send_events(events):
+    ''' Delivers events, from make_event, or queues them for the worker. '''
+    events = [event for event in events if event is not None]
+    if not events:
+        return
+    if not settings.NOTIFICATION_FANOUT_ASYNC:
+        deliver(events)
+        return
+    for event in events:
+        _queue.put(event)
+    _start_worker()
+
+
+def _dedupe_key(event):
+    return (event.actor, event.verb, event.target or event.action_object)
+
+
+def _unread_filter(event):
+    lookup = dict(
+        unread=True,
+        verb=event.verb,
+        actor_content_type_id=event.actor[0],
+        actor_object_id=event.actor[1],
+    )
+    about = "target" if event.target else "action_object"
+    content_type_id, object_id = event.target or event.action_object
+    lookup["{0}_content_type_id".format(about)] = content_type_id
+    lookup["{0}_object_id".format(about)] = object_id
+    return lookup
+
+
+def deliver(events):
+    '''
+    Writes the notifications for events, skipping recipients who already
+    have an unread notification of the same kind.
+    '''
+    from notifications.models import Notification
+
+    notified = set()
+    notifications = []
+    for event in events:
+        recipient_pks = event.recipient_pks
+        key = None
+        if event.target or event.action_object:
+            key = _dedupe_key(event)
+            recipient_pks = [
+                pk for pk in recipient_pks if (key, pk) not in notified
+            ]
+            for start in range(0, len(recipient_pks), 500):
+                notified.update(
+                    (key, pk)
+                    for pk in Notification.objects.filter(
+                        recipient__pk__in=recipient_pks[start:start + 500],
+                        **_unread_filter(event)
+                    ).values_list("recipient", flat=True)
+                )
+        for pk in recipient_pks:
+            if key is not None:
+                if (key, pk) in notified:
+                    continue
+                notified.add((key, pk))
+            notification = Notification(
+                recipient_id=pk,
+                actor_content_type_id=event.actor[0],
+                actor_object_id=event.actor[1],
+                verb=event.verb,
+                description=event.description,
+                timestamp=event.timestamp,
+            )
+            for name in ("action_object", "target"):
+                reference = getattr(event, name)
+                if reference is not None:
+                    setattr(notification, "{0}_content_type_id".format(name),
+                            reference[0])
+                    setattr(notification, "{0}_object_id".format(name),
+                            reference[1])
+            notifications.append(notification)
+    Notification.objects.bulk_create(notifications)
+    return len(notifications)
+
+
+def _drain(block):
+    events = []
+    try:
+        events.append(_queue.get(block=block))
+        while True:
+            events.append(_queue.get(block=False))
+    except queue.Empty:
+        pass
+    return events
+
+
+def flush():
+    ''' Delivers every waiting event in the calling thread. '''
+    events = _drain(block=False)
+    if events:
+        deliver(events)
+
+
+def _work():
+    while True:
+        events = _drain(block=True)
+        try:
+            deliver(events)
+        except Exception:
+            logger.exception("Failed to deliver %d notification events",
+                             len(events))
+        finally:
+            close_old_connections()
+
+
+def _start_worker():
+    if _worker["thread"] is not None:
+        return
+    with _worker_lock:
+        if _worker["thread"] is None:
+            thread = threading.Thread(target=_work, name="notification-fanout")
+            thread.daemon = True
+            thread.start()
+            _worker["thread"] = thread
+
+
+# Deliver what the worker has not reached yet when the process exits
+atexit.register(flush)
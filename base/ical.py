@@ -0,0 +1,215 @@
+'''
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+iCalendar feed of a member's assigned workshifts and the events they have
+RSVP'd to. Calendar clients fetch it by URL with a per-user token in place of
+a session, and poll it with conditional GETs.
+'''
+
+from __future__ import absolute_import
+
+from datetime import datetime, timedelta
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.encoding import force_bytes, force_text
+from django.utils.http import parse_etags, parse_http_date_safe
+
+from events.models import Event
+from workshift.models import WorkshiftInstance
+
+TOKEN_SALT = "base.ical"
+
+
+def get_calendar_token(user):
+    '''
+    The token for a user's feed. It is derived from their password hash, so
+    changing the password revokes any URL that has been shared.
+    '''
+    value = "{0}{1}".format(user.pk, user.password)
+    return salted_hmac(TOKEN_SALT, value).hexdigest()[:20]
+
+
+def check_calendar_token(user, token):
+    return constant_time_compare(get_calendar_token(user), token)
+
+
+def get_feed_items(user, moment=None):
+    ''' The workshift instances and events in a user's feed. '''
+    if moment is None:
+        moment = timezone.now()
+    since = moment - timedelta(days=settings.ICAL_PAST_DAYS)
+    instances = WorkshiftInstance.objects.filter(
+        workshifter__user=user,
+        date__gte=timezone.localtime(since).date(),
+    ).select_related("semester").order_by("date", "start_time", "pk")
+    events = Event.objects.filter(
+        rsvps__user=user,
+        end_time__gte=since,
+    ).order_by("start_time", "pk")
+    return list(instances), list(events)
+
+
+def get_feed_version(user, instances, events):
+    '''
+    Returns the feed's ETag and the time it last changed. The ETag is a digest
+    of every field the feed shows. The time is when this process's cache
+    first saw that digest. If the cache forgets it, clients refetch once.
+    '''
+    digest = sha1()
+    for instance in instances:
+        digest.update(force_bytes(repr((
+            instance.pk, instance.date, instance.start_time,
+            instance.end_time, instance.week_long, instance.title,
+            instance.semester.sem_url,
+        ))))
+    for event in events:
+        digest.update(force_bytes(repr((
+            event.pk, event.change_date, event.start_time, event.end_time,
+            event.cancelled,
+        ))))
+    etag = digest.hexdigest()
+
+    key = "ical_version_{0}".format(user.pk)
+    version = cache.get(key)
+    if version is None or version[0] != etag:
+        changed = timezone.now().replace(microsecond=0)
+        if version is not None and changed <= version[1]:
+            # HTTP dates have whole seconds, keep each version distinct
+            changed = version[1] + timedelta(seconds=1)
+        version = (etag, changed)
+        cache.set(key, version, None)
+    return version
+
+
+def is_not_modified(request, etag, last_modified):
+    '''
+    Whether a conditional GET can be answered with 304 Not Modified.
+    last_modified may be None for responses that only have an ETag.
+    '''
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return etag in etags or "*" in etags
+    if_modified_since = parse_http_date_safe(
+        request.META.get("HTTP_IF_MODIFIED_SINCE", "")
+    )
+    if if_modified_since is None or last_modified is None:
+        return False
+    return timestamp(last_modified) <= if_modified_since
+
+
+def timestamp(moment):
+    ''' Seconds since the epoch of an aware datetime, for HTTP dates. '''
+    return int((moment - datetime(1970, 1, 1, tzinfo=timezone.utc))
+               .total_seconds())
+
+
+def _escape(text):
+    return force_text(text).replace("\\", "\\\\").replace(";", "\\;") \
+      .replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+
+
+def _fold(line):
+    ''' Splits a content line into lines of at most 75 octets, RFC 5545. '''
+    parts, part, size = [], [], 0
+    for char in force_text(line):
+        length = len(char.encode("utf-8"))
+        if size + length > 75:
+            parts.append("".join(part))
+            part, size = [" "], 1
+        part.append(char)
+        size += length
+    parts.append("".join(part))
+    return "\r\n".join(parts) + "\r\n"
+
+
+def _utc(moment):
+    return moment.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _instance_times(instance):
+    '''
+    DTSTART and DTEND for a workshift instance. Shifts without both times,
+    and week long shifts, are all day events.
+    '''
+    if instance.week_long or instance.start_time is None or \
+       instance.end_time is None:
+        days = 7 if instance.week_long else 1
+        end = instance.date + timedelta(days=days)
+        return (
+            "DTSTART;VALUE=DATE:" + instance.date.strftime("%Y%m%d"),
+            "DTEND;VALUE=DATE:" + end.strftime("%Y%m%d"),
+        )
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(
+        datetime.combine(instance.date, instance.start_time), tz,
+    )
+    end = timezone.make_aware(
+        datetime.combine(instance.date, instance.end_time), tz,
+    )
+    if end <= start:
+        # Shifts that run past midnight
+        end += timedelta(days=1)
+    return "DTSTART:" + _utc(start), "DTEND:" + _utc(end)
+
+
+def iter_calendar(instances, events, last_modified, build_url):
+    '''
+    Yields the lines of the feed. build_url turns a path into an absolute URL.
+    '''
+    host = build_url("/").split("//", 1)[-1].strip("/")
+    stamp = "DTSTAMP:" + _utc(last_modified)
+    for line in [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Farnsworth//{0}//EN".format(_escape(settings.HOUSE_NAME)),
+        "CALSCALE:GREGORIAN",
+        "X-WR-CALNAME:" + _escape(
+            "{0} Workshifts and Events".format(settings.SHORT_HOUSE_NAME)
+        ),
+    ]:
+        yield _fold(line)
+
+    for instance in instances:
+        start, end = _instance_times(instance)
+        for line in [
+            "BEGIN:VEVENT",
+            "UID:workshift-{0}@{1}".format(instance.pk, host),
+            stamp,
+            start,
+            end,
+            "SUMMARY:" + _escape(instance.title),
+            "URL:" + build_url(instance.get_view_url()),
+            "END:VEVENT",
+        ]:
+            yield _fold(line)
+
+    for event in events:
+        lines = [
+            "BEGIN:VEVENT",
+            "UID:event-{0}@{1}".format(event.pk, host),
+            stamp,
+            "DTSTART:" + _utc(event.start_time),
+            "DTEND:" + _utc(event.end_time),
+            "SUMMARY:" + _escape(event.title),
+            "DESCRIPTION:" + _escape(event.description),
+            "URL:" + build_url(
+                reverse("events:view", kwargs={"event_pk": event.pk})
+            ),
+        ]
+        if event.location:
+            lines.append("LOCATION:" + _escape(event.location))
+        if event.cancelled:
+            lines.append("STATUS:CANCELLED")
+        lines.append("END:VEVENT")
+        for line in lines:
+            yield _fold(line)
+
+    yield _fold("END:VCALENDAR")
@@ -0,0 +1,262 @@
+'''
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+Outbound e-mail. queue_mail records a message in the QueuedEmail table instead
+of sending it during the request, and send_queued_mail, run from cron, sends
+the queue in batches over one connection per batch. queue_digests gathers each
+member's unread notifications into one e-mail, according to their e-mail
+preferences.
+'''
+
+from __future__ import absolute_import
+
+from collections import defaultdict
+from smtplib import SMTPException
+import socket
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.urlresolvers import reverse
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from base.models import QueuedEmail, UserProfile
+from utils.variables import DIGEST_SUBJECT, DIGEST_EMAIL
+
+# Notifications about objects from these apps, or from them when they are not
+# about any object, are e-mailed to the members who have the matching
+# UserProfile preference set, under the given heading.
+DIGEST_CATEGORIES = (
+    ("threads", "email_thread_notifications", "Threads"),
+    ("managers", "email_request_notifications", "Requests"),
+    ("workshift", "email_workshift_notifications", "Workshift"),
+)
+
+
+def _split(addresses):
+    return [address for address in addresses.splitlines() if address]
+
+
+def _join(addresses):
+    return "\n".join(
+        address for address in addresses
+        if address and address not in settings.EMAIL_BLACKLIST
+    )
+
+
+def queue_mail(subject, body, to=(), bcc=(), html_body="", from_email=None,
+               commit=True):
+    '''
+    Queues an e-mail to the addresses in to and bcc, leaving out those in
+    EMAIL_BLACKLIST. Returns the QueuedEmail, or None if no one is left to
+    send it to. The QueuedEmail is not saved if commit is False.
+    '''
+    email = QueuedEmail(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.EMAIL_HOST_USER,
+        to=_join(to),
+        bcc=_join(bcc),
+    )
+    if not email.to and not email.bcc:
+        return None
+    if commit:
+        email.save()
+    return email
+
+
+def _message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=_split(email.to),
+        bcc=_split(email.bcc),
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def send_queued_mail(batch_size=None):
+    '''
+    Sends the e-mails queued before the call started, batch_size at a time,
+    with the EMAIL_QUEUE_BACKEND backend. Messages that fail are kept for the
+    next run until they have failed EMAIL_QUEUE_MAX_ATTEMPTS times. Returns the
+    number of messages sent.
+    '''
+    if batch_size is None:
+        batch_size = settings.EMAIL_QUEUE_BATCH_SIZE
+    started = now()
+    last_pk = 0
+    sent = 0
+
+    while True:
+        emails = list(
+            QueuedEmail.objects.filter(
+                pk__gt=last_pk,
+                queued_at__lte=started,
+                attempts__lt=settings.EMAIL_QUEUE_MAX_ATTEMPTS,
+            ).order_by("pk")[:batch_size]
+        )
+        if not emails:
+            break
+        last_pk = emails[-1].pk
+
+        sent_pks, errors = [], {}
+        connection = get_connection(
+            backend=settings.EMAIL_QUEUE_BACKEND, fail_silently=False,
+        )
+        try:
+            connection.open()
+            for email in emails:
+                try:
+                    connection.send_messages([_message(email, connection)])
+                except (SMTPException, socket.error) as e:
+                    errors[email.pk] = repr(e)
+                else:
+                    sent_pks.append(email.pk)
+        except (SMTPException, socket.error) as e:
+            # Could not connect, everything left in the batch failed
+            for email in emails:
+                if email.pk not in sent_pks:
+                    errors[email.pk] = repr(e)
+        finally:
+            connection.close()
+
+        for start in range(0, len(sent_pks), 500):
+            QueuedEmail.objects.filter(
+                pk__in=sent_pks[start:start + 500],
+            ).delete()
+        for pk, error in errors.items():
+            QueuedEmail.objects.filter(pk=pk).update(
+                attempts=F("attempts") + 1, last_error=error,
+            )
+        sent += len(sent_pks)
+
+        if len(emails) < batch_size:
+            break
+
+    return sent
+
+
+def _category_fields():
+    ''' A dictionary from ContentType pk to the category of its notifications. '''
+    categories = dict(
+        (app_label, (field, heading))
+        for app_label, field, heading in DIGEST_CATEGORIES
+    )
+    return dict(
+        (content_type.pk, categories[content_type.app_label])
+        for content_type in ContentType.objects.filter(
+            app_label__in=categories.keys(),
+        )
+    )
+
+
+def _describe(notification):
+    about = notification.target or notification.action_object
+    if about is None:
+        return u"{0} {1}".format(notification.actor, notification.verb)
+    return u"{0} {1} {2}".format(notification.actor, notification.verb, about)
+
+
+def _queue_profile_digests(profiles, started, categories, profile_url):
+    from notifications.models import Notification
+
+    profiles = dict((profile.user_id, profile) for profile in profiles)
+    since = [
+        profile.email_digest_sent for profile in profiles.values()
+        if profile.email_digest_sent is not None
+    ]
+    notifications = Notification.objects.filter(
+        recipient__in=profiles.keys(),
+        unread=True,
+        timestamp__lte=started,
+    ).filter(
+        Q(target_content_type__in=categories.keys()) |
+        Q(target_content_type__isnull=True,
+          action_object_content_type__in=categories.keys()) |
+        Q(target_content_type__isnull=True,
+          action_object_content_type__isnull=True,
+          actor_content_type__in=categories.keys())
+    )
+    if len(since) == len(profiles):
+        notifications = notifications.filter(timestamp__gt=min(since))
+    notifications = notifications.order_by("timestamp", "pk").prefetch_related(
+        "actor", "target", "action_object",
+    )
+
+    lines = defaultdict(lambda: defaultdict(list))
+    for notification in notifications:
+        profile = profiles[notification.recipient_id]
+        if profile.email_digest_sent is not None \
+                and notification.timestamp <= profile.email_digest_sent:
+            continue
+        field, heading = categories[
+            notification.target_content_type_id or
+            notification.action_object_content_type_id or
+            notification.actor_content_type_id
+        ]
+        if getattr(profile, field):
+            lines[profile][heading].append(_describe(notification))
+
+    emails = []
+    for profile, sections in lines.items():
+        body = "\n\n".join(
+            u"{0}\n{1}".format(heading, "\n".join(
+                u"  * {0}".format(line) for line in sections[heading]
+            ))
+            for _, _, heading in DIGEST_CATEGORIES
+            if heading in sections
+        )
+        email = queue_mail(
+            subject=DIGEST_SUBJECT.format(house=settings.HOUSE_NAME),
+            body=DIGEST_EMAIL.format(
+                full_name=profile.user.get_full_name(),
+                house=settings.HOUSE_NAME,
+                notifications=body,
+                profile_url=profile_url,
+            ),
+            to=[profile.user.email],
+            commit=False,
+        )
+        if email is not None:
+            emails.append(email)
+    QueuedEmail.objects.bulk_create(emails)
+    UserProfile.objects.filter(
+        pk__in=[profile.pk for profile in profiles.values()],
+    ).update(email_digest_sent=started)
+    return len(emails)
+
+
+def queue_digests(profile_url=None, batch_size=500):
+    '''
+    Queues an e-mail to every member with the unread notifications they have
+    received since their last digest, in the categories they chose to have
+    e-mailed. Returns the number of e-mails queued.
+    '''
+    started = now()
+    categories = _category_fields()
+    if profile_url is None:
+        profile_url = settings.BASE_URL + reverse("my_profile")
+    wanted = Q()
+    for _, field, _ in DIGEST_CATEGORIES:
+        wanted |= Q(**{field: True})
+    profiles = UserProfile.objects.filter(wanted).exclude(user__email="") \
+      .select_related("user").order_by("pk")
+
+    queued = 0
+    last_pk = 0
+    while True:
+        batch = list(profiles.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        queued += _queue_profile_digests(batch, started, categories, profile_url)
+    return queued
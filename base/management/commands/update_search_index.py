@@ -0,0 +1,111 @@
+"""
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+"""
+
+from __future__ import absolute_import
+
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from haystack import connections
+
+from base.models import SearchIndexCheckpoint
+
+
+class Command(BaseCommand):
+    help = "Reindex objects changed since the last successful run, using " \
+      "each index's updated field. Models without one are reindexed in " \
+      "full. An interrupted run resumes where it stopped. Deletions are " \
+      "left to the search queue."
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "--full",
+            action="store_true",
+            dest="full",
+            default=False,
+            help="Reindex every object, ignoring previous runs.",
+        ),
+        make_option(
+            "--all-revisions",
+            action="store_true",
+            dest="all_revisions",
+            default=False,
+            help="Index every wiki revision, not only the latest of each page.",
+        ),
+        make_option(
+            "--batch-size",
+            dest="batch_size",
+            default=None,
+            type="int",
+            help="Number of objects to index at once.",
+        ),
+    )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"] or settings.SEARCH_QUEUE_BATCH_SIZE
+        verbosity = int(options["verbosity"])
+
+        for using in connections.connections_info:
+            unified_index = connections[using].get_unified_index()
+            backend = connections[using].get_backend()
+            for model in unified_index.get_indexed_models():
+                index = unified_index.get_index(model)
+                reset = hasattr(index, "all_revisions")
+                if reset:
+                    index.all_revisions = options["all_revisions"]
+                try:
+                    count = self._update(
+                        using, backend, index, batch_size, options["full"],
+                    )
+                finally:
+                    if reset:
+                        index.all_revisions = False
+                if verbosity >= 1:
+                    self.stdout.write("Indexed {0} {1} objects in {2}".format(
+                        count, model._meta.object_name, using,
+                    ))
+
+    def _update(self, using, backend, index, batch_size, full):
+        model = index.get_model()
+        checkpoint, _ = SearchIndexCheckpoint.objects.get_or_create(
+            using=using,
+            model="{0}.{1}".format(model._meta.app_label, model._meta.model_name),
+        )
+        if full or checkpoint.run_started is None:
+            checkpoint.run_started = now()
+            checkpoint.last_pk = None
+            checkpoint.save()
+
+        queryset = index.index_queryset(using=using)
+        updated_field = index.get_updated_field()
+        if updated_field and checkpoint.indexed_until and not full:
+            queryset = queryset.filter(**{
+                "{0}__gte".format(updated_field): checkpoint.indexed_until,
+            })
+        queryset = queryset.order_by("pk")
+
+        count = 0
+        while True:
+            batch = queryset
+            if checkpoint.last_pk is not None:
+                batch = batch.filter(pk__gt=checkpoint.last_pk)
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            backend.update(index, batch)
+            count += len(batch)
+            checkpoint.last_pk = batch[-1].pk
+            checkpoint.save(update_fields=["last_pk"])
+
+        # Changes made during this run are picked up by the next one
+        checkpoint.indexed_until = checkpoint.run_started
+        checkpoint.run_started = None
+        checkpoint.last_pk = None
+        checkpoint.save()
+        return count
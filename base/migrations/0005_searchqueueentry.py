@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0001_initial'),
+        ('base', '0004_remove_rooms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchQueueEntry',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('object_id', models.CharField(help_text=b'The primary key of the changed object.', max_length=255)),
+                ('action', models.CharField(default=b'U', help_text=b'Whether to update or remove the object from the index.', max_length=1, choices=[(b'U', b'Update'), (b'D', b'Delete')])),
+                ('queued_at', models.DateTimeField(help_text=b'The last time this object was changed.', auto_now=True, db_index=True)),
+                ('content_type', models.ForeignKey(help_text=b'The type of the changed object.', to='contenttypes.ContentType')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchqueueentry',
+            unique_together=set([('content_type', 'object_id')]),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_searchqueueentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexCheckpoint',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('using', models.CharField(help_text=b'The search connection this checkpoint is for.', max_length=255)),
+                ('model', models.CharField(help_text=b'The app_label.model_name of the indexed model.', max_length=255)),
+                ('indexed_until', models.DateTimeField(help_text=b'Start of the last complete run. Objects changed since then are reindexed.', null=True, blank=True)),
+                ('run_started', models.DateTimeField(help_text=b'Start of the unfinished run, if any.', null=True, blank=True)),
+                ('last_pk', models.PositiveIntegerField(help_text=b'The last primary key indexed by the unfinished run.', null=True, blank=True)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchindexcheckpoint',
+            unique_together=set([('using', 'model')]),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0006_searchindexcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedEmail',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('subject', models.CharField(help_text=b'The subject of the e-mail.', max_length=255)),
+                ('body', models.TextField(help_text=b'The plain text body of the e-mail.')),
+                ('html_body', models.TextField(default=b'', help_text=b'An HTML alternative to the body, if any.', blank=True)),
+                ('from_email', models.CharField(help_text=b'The sender of the e-mail.', max_length=255)),
+                ('to', models.TextField(default=b'', help_text=b'Recipient addresses, one per line.', blank=True)),
+                ('bcc', models.TextField(default=b'', help_text=b'Blind copied addresses, one per line.', blank=True)),
+                ('queued_at', models.DateTimeField(help_text=b'When the e-mail was queued.', auto_now_add=True, db_index=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0, help_text=b'The number of failed attempts to send the e-mail.')),
+                ('last_error', models.TextField(default=b'', help_text=b'The error from the last failed attempt, if any.', blank=True)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='email_digest_sent',
+            field=models.DateTimeField(help_text=b'When notifications were last e-mailed to this user in a digest.', null=True, blank=True),
+            preserve_default=True,
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_queuedemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteCounter',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(help_text=b'The name the counter was registered under.', unique=True, max_length=100)),
+                ('value', models.IntegerField(default=0, help_text=b'The number of objects counted.')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+    ]
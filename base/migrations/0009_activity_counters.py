@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.db.models import Count
+
+def forwards_func(apps, schema_editor):
+    UserProfile = apps.get_model("base", "UserProfile")
+    db_alias = schema_editor.connection.alias
+    for app_label, model_name, field in [
+            ("threads", "Thread", "number_of_threads"),
+            ("threads", "Message", "number_of_messages"),
+            ("managers", "Request", "number_of_requests"),
+    ]:
+        model = apps.get_model(app_label, model_name)
+        counts = model.objects.using(db_alias).values_list("owner") \
+          .annotate(count=Count("pk")).order_by()
+        for owner_pk, count in counts:
+            UserProfile.objects.using(db_alias).filter(pk=owner_pk) \
+              .update(**{field: count})
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_sitecounter'),
+        ('threads', '0003_message_edited'),
+        ('managers', '0004_request_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='number_of_messages',
+            field=models.PositiveIntegerField(default=0, help_text=b'The number of messages this user has posted.'),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='number_of_requests',
+            field=models.PositiveIntegerField(default=0, help_text=b'The number of requests this user has posted.'),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='number_of_threads',
+            field=models.PositiveIntegerField(default=0, help_text=b'The number of threads this user has started.'),
+            preserve_default=True,
+        ),
+        migrations.RunPython(
+            forwards_func,
+        ),
+    ]
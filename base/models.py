@@ -6,6 +6,8 @@ Author: Karandeep Singh Nagra
 
 from django.conf import settings
 from django.contrib.auth.models import User, Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.db import models
 
@@ -13,8 +15,14 @@ from phonenumber_field.modelfields import PhoneNumberField
 
 from social.utils import setting_name
 
+from base import counters
+from utils.variables import ANONYMOUS_USERNAME
+
 UID_LENGTH = getattr(settings, setting_name('UID_LENGTH'), 255)
 
+MEMBER_DIRECTORY_CACHE_KEY = "member_directory"
+LANDING_CACHE_KEY = "landing_page"
+
 def _get_user_view_url(user):
     return reverse("member_profile", kwargs={"targetUsername": user.username})
 
@@ -75,6 +83,23 @@ class UserProfile(models.Model):
         default=True,
         help_text="Whether notifications are e-mailed to you about workshift updates.",
         )
+    number_of_threads = models.PositiveIntegerField(
+        default=0,
+        help_text="The number of threads this user has started.",
+        )
+    number_of_messages = models.PositiveIntegerField(
+        default=0,
+        help_text="The number of messages this user has posted.",
+        )
+    number_of_requests = models.PositiveIntegerField(
+        default=0,
+        help_text="The number of requests this user has posted.",
+        )
+    email_digest_sent = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When notifications were last e-mailed to this user in a digest.",
+        )
 
     def __unicode__(self):
         return self.user.get_full_name()
@@ -167,6 +192,150 @@ class ProfileRequest(models.Model):
     def is_profilerequest(self):
         return True
 
+class SearchQueueEntry(models.Model):
+    '''
+    An object waiting to be updated in or removed from the search index.  Saves
+    and deletes are recorded here and flushed to the index in batches, with
+    repeated changes to one object coalescing into a single entry.
+    '''
+    content_type = models.ForeignKey(
+        ContentType,
+        help_text="The type of the changed object.",
+        )
+    object_id = models.CharField(
+        max_length=255,
+        help_text="The primary key of the changed object.",
+        )
+    UPDATE = 'U'
+    DELETE = 'D'
+    ACTION_CHOICES = (
+        (UPDATE, "Update"),
+        (DELETE, "Delete"),
+    )
+    action = models.CharField(
+        max_length=1,
+        choices=ACTION_CHOICES,
+        default=UPDATE,
+        help_text="Whether to update or remove the object from the index.",
+        )
+    queued_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        help_text="The last time this object was changed.",
+        )
+
+    class Meta:
+        unique_together = ("content_type", "object_id")
+
+    def __unicode__(self):
+        return "{0} {1}.{2}".format(
+            self.get_action_display(), self.content_type_id, self.object_id,
+        )
+
+class SearchIndexCheckpoint(models.Model):
+    '''
+    Progress of update_search_index for one model in one search connection.
+    indexed_until is when the last complete run started; run_started and
+    last_pk are set while a run is in progress so it can be resumed.
+    '''
+    using = models.CharField(
+        max_length=255,
+        help_text="The search connection this checkpoint is for.",
+        )
+    model = models.CharField(
+        max_length=255,
+        help_text="The app_label.model_name of the indexed model.",
+        )
+    indexed_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Start of the last complete run. Objects changed since then are reindexed.",
+        )
+    run_started = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Start of the unfinished run, if any.",
+        )
+    last_pk = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="The last primary key indexed by the unfinished run.",
+        )
+
+    class Meta:
+        unique_together = ("using", "model")
+
+    def __unicode__(self):
+        return "{0}: {1}".format(self.using, self.model)
+
+class QueuedEmail(models.Model):
+    '''
+    An e-mail waiting to be sent.  Views queue messages here rather than
+    talking to the mail server, and send_queued_mail sends them in batches.
+    Messages are deleted once sent.
+    '''
+    subject = models.CharField(
+        max_length=255,
+        help_text="The subject of the e-mail.",
+        )
+    body = models.TextField(
+        help_text="The plain text body of the e-mail.",
+        )
+    html_body = models.TextField(
+        blank=True,
+        default="",
+        help_text="An HTML alternative to the body, if any.",
+        )
+    from_email = models.CharField(
+        max_length=255,
+        help_text="The sender of the e-mail.",
+        )
+    to = models.TextField(
+        blank=True,
+        default="",
+        help_text="Recipient addresses, one per line.",
+        )
+    bcc = models.TextField(
+        blank=True,
+        default="",
+        help_text="Blind copied addresses, one per line.",
+        )
+    queued_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        help_text="When the e-mail was queued.",
+        )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="The number of failed attempts to send the e-mail.",
+        )
+    last_error = models.TextField(
+        blank=True,
+        default="",
+        help_text="The error from the last failed attempt, if any.",
+        )
+
+    def __unicode__(self):
+        return u"{0} ({1})".format(self.subject, self.queued_at)
+
+class SiteCounter(models.Model):
+    '''
+    The current value of one of the site statistics registered in
+    base.counters.
+    '''
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        help_text="The name the counter was registered under.",
+        )
+    value = models.IntegerField(
+        default=0,
+        help_text="The number of objects counted.",
+        )
+
+    def __unicode__(self):
+        return u"{0}: {1}".format(self.name, self.value)
+
 def create_user_profile(sender, instance, created, **kwargs):
     '''
     Function to add a user profile for every User that is created.
@@ -176,6 +345,39 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
+def count_activity(owner_pk, field, delta):
+    '''
+    Adds delta to one of the activity counters, such as number_of_threads, of
+    the UserProfile with owner_pk.
+    '''
+    profiles = UserProfile.objects.filter(pk=owner_pk)
+    if delta < 0:
+        profiles = profiles.filter(**{field + "__gte": -delta})
+    profiles.update(**{field: models.F(field) + delta})
+
+def invalidate_member_directory(sender, instance, **kwargs):
+    '''
+    Function to drop the cached member directory whenever a user or their
+    profile changes.  Logins only change last_login, which it does not show.
+    '''
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and not set(update_fields) - {"last_login"}:
+        return
+    cache.delete(MEMBER_DIRECTORY_CACHE_KEY)
+
 # Connect signals with their respective functions from above.
 # When a user is created, create a user profile associated with that user.
 models.signals.post_save.connect(create_user_profile, sender=User)
+# When a user or their profile changes, drop the cached member directory.
+models.signals.post_save.connect(invalidate_member_directory, sender=User)
+models.signals.post_delete.connect(invalidate_member_directory, sender=User)
+models.signals.post_save.connect(invalidate_member_directory, sender=UserProfile)
+models.signals.post_delete.connect(invalidate_member_directory, sender=UserProfile)
+
+counters.register("members.residents", UserProfile, status=UserProfile.RESIDENT)
+counters.register("members.boarders", UserProfile, status=UserProfile.BOARDER)
+counters.register(
+    "members.alumni", UserProfile,
+    exclude={"user__username": ANONYMOUS_USERNAME},
+    status=UserProfile.ALUMNUS,
+    )
@@ -0,0 +1,98 @@
+'''
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+What a user is allowed to do. get_capabilities returns one Capabilities for
+each user object, which works each answer out the first time it is asked for
+and remembers it. request.user is a new object on every request, so checks
+made while handling a request cost a query once and are then free, without
+outliving the request.
+'''
+
+from __future__ import absolute_import
+
+from django.utils.functional import cached_property
+
+from base.models import UserProfile
+from managers.models import Manager, RequestType
+
+
+class Capabilities(object):
+    def __init__(self, user):
+        self.user = user
+        self._remembered = {}
+
+    @cached_property
+    def authenticated(self):
+        return self.user.is_authenticated()
+
+    @cached_property
+    def profile(self):
+        ''' The user's UserProfile, or None if they do not have one. '''
+        if not self.authenticated:
+            return None
+        try:
+            return UserProfile.objects.get(user=self.user)
+        except UserProfile.DoesNotExist:
+            return None
+
+    @cached_property
+    def positions(self):
+        ''' Every manager position the user holds, active or not. '''
+        if not self.authenticated:
+            return []
+        return list(Manager.objects.filter(incumbent__user=self.user))
+
+    @property
+    def active_positions(self):
+        return [position for position in self.positions if position.active]
+
+    @property
+    def is_manager(self):
+        return bool(self.positions)
+
+    @property
+    def is_president(self):
+        return any(position.president for position in self.positions)
+
+    @property
+    def is_workshift_manager(self):
+        return any(position.workshift_manager for position in self.positions)
+
+    @cached_property
+    def _request_type_positions(self):
+        if not self.authenticated:
+            return []
+        return list(RequestType.objects.filter(
+            managers__incumbent__user=self.user,
+        ).values_list("pk", "managers__active"))
+
+    @property
+    def managed_request_types(self):
+        ''' The pks of the request types the user holds a position for. '''
+        return set(pk for pk, active in self._request_type_positions)
+
+    @property
+    def active_request_types(self):
+        ''' The pks of the request types the user holds an active position for. '''
+        return set(pk for pk, active in self._request_type_positions if active)
+
+    def remember(self, name, compute):
+        '''
+        Returns compute(), only calling it the first time name is asked for.
+        For answers that belong to other apps, such as workshift's.
+        '''
+        if name not in self._remembered:
+            self._remembered[name] = compute()
+        return self._remembered[name]
+
+
+def get_capabilities(user):
+    ''' The Capabilities shared by every check made with this user object. '''
+    try:
+        return user._capabilities
+    except AttributeError:
+        user._capabilities = Capabilities(user)
+        return user._capabilities
+
@@ -0,0 +1,117 @@
+'''
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+Per-request SQL instrumentation. When QUERY_PROFILE is set,
+QueryProfileMiddleware records how many queries each request ran, how long
+they took, which query shapes ran more than once (usually a query inside a
+loop) and how long the request took. The numbers are sent in X-Query-* response
+headers and the last QUERY_PROFILE_SIZE requests are kept in memory, one
+buffer per process, for admins to look through.
+
+Responses streamed after the view returns, such as calendar feeds, are only
+measured up to the point the view returned.
+'''
+
+from __future__ import absolute_import
+
+from collections import Counter, deque, namedtuple
+import re
+import threading
+from time import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils.timezone import now
+
+RequestProfile = namedtuple("RequestProfile", [
+    "timestamp", "method", "path", "status", "view_name", "query_count",
+    "sql_time", "duplicates", "view_time",
+])
+
+_profiles = deque(maxlen=getattr(settings, "QUERY_PROFILE_SIZE", 200))
+_profiles_lock = threading.Lock()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:\?, )*\?\)")
+
+
+def query_shape(sql):
+    '''
+    sql with its literal values replaced by ?, so that the same query run for
+    different rows has the same shape.
+    '''
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+def duplicate_shapes(queries):
+    '''
+    A list of (shape, count) for the shapes of queries, dictionaries as in
+    connection.queries, that ran more than once, most repeated first.
+    '''
+    counts = Counter(query_shape(query["sql"]) for query in queries)
+    return [(shape, count) for shape, count in counts.most_common()
+            if count > 1]
+
+
+def recent_profiles():
+    ''' The profiles of the requests this process handled last, newest first. '''
+    with _profiles_lock:
+        return list(reversed(_profiles))
+
+
+class QueryProfileMiddleware(object):
+    '''
+    Measures each request, if QUERY_PROFILE is set. It should come first in
+    MIDDLEWARE_CLASSES, so that the other middleware's queries are counted.
+    '''
+
+    def __init__(self):
+        if not getattr(settings, "QUERY_PROFILE", False):
+            raise MiddlewareNotUsed()
+
+    def process_request(self, request):
+        request._query_profile = (
+            time(), len(connection.queries), connection.use_debug_cursor,
+        )
+        connection.use_debug_cursor = True
+
+    def process_response(self, request, response):
+        try:
+            started, first, use_debug_cursor = request._query_profile
+        except AttributeError:
+            # An earlier middleware answered before process_request ran
+            return response
+        del request._query_profile
+        view_time = time() - started
+        # connection.queries is emptied when each request starts
+        queries = connection.queries[first:]
+        connection.use_debug_cursor = use_debug_cursor
+
+        duplicates = duplicate_shapes(queries)
+        profile = RequestProfile(
+            timestamp=now(),
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+            view_name=getattr(request.resolver_match, "view_name", None),
+            query_count=len(queries),
+            sql_time=sum(float(query["time"]) for query in queries),
+            duplicates=duplicates,
+            view_time=view_time,
+        )
+        with _profiles_lock:
+            _profiles.append(profile)
+
+        response["X-Query-Count"] = str(profile.query_count)
+        response["X-Query-Time"] = "{0:.1f}ms".format(profile.sql_time * 1000)
+        response["X-Query-Duplicates"] = str(
+            sum(count - 1 for _, count in duplicates)
+        )
+        response["X-View-Time"] = "{0:.1f}ms".format(view_time * 1000)
+        return response
@@ -0,0 +1,484 @@
+'''
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+A haystack search backend built on SQLite's FTS5 full-text index. It needs no
+external service: the index lives in a single SQLite file next to the site's
+database, or in memory during tests.
+
+Documents are stored once in search_document, along with their stored fields
+and boost. Their text goes into the search_fts table, one column per distinct
+field boost, so that bm25 ranking honours the boosts declared on the
+SearchIndex classes. Faceted fields are kept in search_facet, which serves
+both facet counts and narrowing on selected facets.
+'''
+
+from __future__ import absolute_import, unicode_literals
+
+from datetime import date, datetime
+from decimal import Decimal
+import json
+import logging
+import re
+import sqlite3
+import threading
+from warnings import warn
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import six, timezone
+from django.utils.encoding import force_text
+
+from haystack import connections
+from haystack.backends import BaseEngine, BaseSearchBackend, \
+     BaseSearchQuery, log_query
+from haystack.constants import DJANGO_CT, DJANGO_ID, ID
+from haystack.inputs import AutoQuery, Exact
+from haystack.models import SearchResult
+from haystack.utils import get_identifier, get_model_ct
+
+logger = logging.getLogger(__name__)
+
+# Field types whose contents are tokenized into the full-text index
+TEXT_FIELD_TYPES = ("string", "edge_ngram", "ngram")
+
+# Matches a narrowing query such as exact_user:"Cooperative User"
+NARROW_RE = re.compile(r'^(?P<field>\w+):"(?P<value>(?:[^"]|"")*)"$')
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _quote(term):
+    return '"{0}"'.format(term.replace('"', '""'))
+
+
+def _encode(value):
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        # Stored as naive UTC, made aware again in _process_results
+        value = timezone.make_naive(value, timezone.utc)
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%dT%H:%M:%S")
+    if isinstance(value, Decimal):
+        return six.text_type(value)
+    if isinstance(value, (list, tuple, set)):
+        return [_encode(i) for i in value]
+    return value
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    def __init__(self, connection_alias, **connection_options):
+        super(SQLiteSearchBackend, self).__init__(
+            connection_alias, **connection_options
+        )
+        if "PATH" not in connection_options:
+            raise ImproperlyConfigured(
+                "You must specify a 'PATH' in your settings for connection "
+                "'{0}'.".format(connection_alias)
+            )
+        self.path = connection_options["PATH"]
+        self.lock = threading.RLock()
+        self.conn = None
+        self.columns = None
+
+    def _get_text_boosts(self):
+        """
+        The distinct boosts of the full-text fields across every index,
+        lowest first. Each one gets its own column in search_fts.
+        """
+        unified_index = connections[self.connection_alias].get_unified_index()
+        boosts = set([1.0])
+        for model in unified_index.get_indexed_models():
+            for field in unified_index.get_index(model).fields.values():
+                if self._is_text_field(field):
+                    boosts.add(float(field.boost))
+        return sorted(boosts)
+
+    def _is_text_field(self, field):
+        return field.indexed and field.field_type in TEXT_FIELD_TYPES \
+          and not field.faceted and not getattr(field, "facet_for", None)
+
+    def setup(self):
+        """
+        Opens the index, creating or recreating its tables when the set of
+        field boosts has changed. A recreated index is empty and needs a
+        rebuild_index.
+        """
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        boosts = self._get_text_boosts()
+        signature = json.dumps(boosts)
+
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_meta "
+            "(key TEXT PRIMARY KEY, value TEXT)"
+        )
+        row = conn.execute(
+            "SELECT value FROM search_meta WHERE key = 'columns'"
+        ).fetchone()
+        if row is None or row[0] != signature:
+            if row is not None:
+                logger.warning(
+                    "Search index boosts changed, the index must be rebuilt."
+                )
+            conn.executescript(
+                "DROP TABLE IF EXISTS search_fts;"
+                "DROP TABLE IF EXISTS search_facet;"
+                "DROP TABLE IF EXISTS search_document;"
+            )
+            conn.execute(
+                "CREATE TABLE search_document ("
+                "id INTEGER PRIMARY KEY, "
+                "identifier TEXT NOT NULL UNIQUE, "
+                "django_ct TEXT NOT NULL, "
+                "django_id TEXT NOT NULL, "
+                "boost REAL NOT NULL DEFAULT 1, "
+                "data TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX search_document_ct "
+                "ON search_document (django_ct)"
+            )
+            conn.execute(
+                "CREATE TABLE search_facet ("
+                "document_id INTEGER NOT NULL, "
+                "field TEXT NOT NULL, "
+                "value TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX search_facet_field "
+                "ON search_facet (field, value)"
+            )
+            conn.execute(
+                "CREATE INDEX search_facet_document "
+                "ON search_facet (document_id)"
+            )
+            try:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE search_fts USING fts5({0}, "
+                    "prefix='2 3 4')".format(
+                        ", ".join("c{0}".format(i) for i in range(len(boosts)))
+                    )
+                )
+            except sqlite3.OperationalError:
+                raise ImproperlyConfigured(
+                    "The SQLite library used by Python was built without "
+                    "FTS5, which the search backend requires."
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO search_meta (key, value) "
+                "VALUES ('columns', ?)", (signature,),
+            )
+            conn.commit()
+
+        self.columns = dict((boost, i) for i, boost in enumerate(boosts))
+        self.weights = boosts
+        self.conn = conn
+
+    def _get_conn(self):
+        if self.conn is None:
+            self.setup()
+        return self.conn
+
+    def _delete(self, conn, where, params):
+        ids = "SELECT id FROM search_document WHERE " + where
+        conn.execute(
+            "DELETE FROM search_fts WHERE rowid IN ({0})".format(ids), params,
+        )
+        conn.execute(
+            "DELETE FROM search_facet WHERE document_id IN ({0})".format(ids),
+            params,
+        )
+        conn.execute("DELETE FROM search_document WHERE " + where, params)
+
+    def _document(self, index, obj):
+        data = index.full_prepare(obj)
+        texts = [[] for _ in self.weights]
+        facets, stored = [], {}
+
+        for field_name, field in index.fields.items():
+            value = data.get(field.index_fieldname)
+            if value is None:
+                continue
+            if field.stored:
+                stored[field.index_fieldname] = _encode(value)
+            if hasattr(field, "get_facet_for_name"):
+                values = value if isinstance(value, (list, tuple)) else [value]
+                facets.extend(
+                    (field.index_fieldname, force_text(_encode(i)))
+                    for i in values
+                )
+            if self._is_text_field(field):
+                column = self.columns.get(float(field.boost), 0)
+                if isinstance(value, (list, tuple)):
+                    value = " ".join(force_text(i) for i in value)
+                texts[column].append(force_text(value))
+
+        return (
+            data[ID], data[DJANGO_CT], data[DJANGO_ID],
+            float(data.get("boost", 1)), json.dumps(stored),
+            ["\n".join(i) for i in texts], facets,
+        )
+
+    def update(self, index, iterable, commit=True):
+        with self.lock:
+            conn = self._get_conn()
+            try:
+                for obj in iterable:
+                    identifier, ct, pk, boost, stored, texts, facets = \
+                      self._document(index, obj)
+                    self._delete(conn, "identifier = ?", (identifier,))
+                    cursor = conn.execute(
+                        "INSERT INTO search_document "
+                        "(identifier, django_ct, django_id, boost, data) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (identifier, ct, pk, boost, stored),
+                    )
+                    document_id = cursor.lastrowid
+                    conn.execute(
+                        "INSERT INTO search_fts (rowid, {0}) VALUES (?, {1})"
+                        .format(
+                            ", ".join(
+                                "c{0}".format(i) for i in range(len(texts))
+                            ),
+                            ", ".join("?" for _ in texts),
+                        ),
+                        [document_id] + texts,
+                    )
+                    conn.executemany(
+                        "INSERT INTO search_facet (document_id, field, value) "
+                        "VALUES (?, ?, ?)",
+                        [(document_id, field, value)
+                         for field, value in facets],
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                if not self.silently_fail:
+                    raise
+                logger.error("Failed to update the search index.",
+                             exc_info=True)
+
+    def remove(self, obj_or_string, commit=True):
+        identifier = get_identifier(obj_or_string)
+        with self.lock:
+            conn = self._get_conn()
+            try:
+                self._delete(conn, "identifier = ?", (identifier,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                if not self.silently_fail:
+                    raise
+                logger.error("Failed to remove '%s' from the search index.",
+                             identifier, exc_info=True)
+
+    def clear(self, models=[], commit=True):
+        with self.lock:
+            conn = self._get_conn()
+            if models:
+                cts = [get_model_ct(model) for model in models]
+                self._delete(
+                    conn,
+                    "django_ct IN ({0})".format(", ".join("?" for _ in cts)),
+                    cts,
+                )
+            else:
+                conn.executescript(
+                    "DELETE FROM search_fts;"
+                    "DELETE FROM search_facet;"
+                    "DELETE FROM search_document;"
+                )
+            conn.commit()
+
+    def _build_where(self, query_string, narrow_queries, models):
+        """
+        Builds the FROM and WHERE clauses shared by the result, count and
+        facet queries.
+        """
+        unified_index = connections[self.connection_alias].get_unified_index()
+        if query_string and query_string != "*":
+            tables = "search_fts JOIN search_document d " \
+              "ON d.id = search_fts.rowid"
+            where, params = ["search_fts MATCH ?"], [query_string]
+        else:
+            tables = "search_document d"
+            where, params = [], []
+
+        if models:
+            cts = [get_model_ct(model) for model in models]
+            where.append(
+                "d.django_ct IN ({0})".format(", ".join("?" for _ in cts))
+            )
+            params.extend(cts)
+
+        for narrow in narrow_queries or []:
+            match = NARROW_RE.match(narrow)
+            if not match:
+                warn("Unsupported narrow query: {0}".format(narrow))
+                continue
+            where.append(
+                "d.id IN (SELECT document_id FROM search_facet "
+                "WHERE field = ? AND value = ?)"
+            )
+            params.extend([
+                unified_index.get_facet_fieldname(match.group("field")),
+                match.group("value").replace('""', '"'),
+            ])
+
+        return tables, " AND ".join(where) or "1", params
+
+    @log_query
+    def search(self, query_string, sort_by=None, start_offset=0,
+               end_offset=None, facets=None, narrow_queries=None,
+               models=None, result_class=None, **kwargs):
+        if not query_string:
+            return {"results": [], "hits": 0}
+        if sort_by:
+            warn("sort_by is not implemented in this backend, results are "
+                 "ordered by relevance.")
+        if kwargs.get("date_facets") or kwargs.get("query_facets"):
+            warn("Only field facets are implemented in this backend.")
+
+        result_class = result_class or SearchResult
+        tables, where, params = self._build_where(
+            query_string, narrow_queries, models,
+        )
+        if tables.startswith("search_fts"):
+            rank = "bm25(search_fts, {0}) * d.boost".format(
+                ", ".join(repr(weight) for weight in self.weights)
+            )
+        else:
+            rank = "0"
+
+        limit = -1 if end_offset is None else end_offset - start_offset
+
+        with self.lock:
+            conn = self._get_conn()
+            try:
+                hits = conn.execute(
+                    "SELECT COUNT(*) FROM {0} WHERE {1}".format(tables, where),
+                    params,
+                ).fetchone()[0]
+                rows = conn.execute(
+                    "SELECT d.django_ct, d.django_id, d.data, {0} AS rank "
+                    "FROM {1} WHERE {2} ORDER BY rank, d.id "
+                    "LIMIT ? OFFSET ?".format(rank, tables, where),
+                    params + [limit, start_offset],
+                ).fetchall()
+                facet_counts = {}
+                for field, options in (facets or {}).items():
+                    facet_counts[field] = [
+                        tuple(row) for row in conn.execute(
+                            "SELECT f.value, COUNT(*) AS count FROM {0} "
+                            "JOIN search_facet f ON f.document_id = d.id "
+                            "WHERE {1} AND f.field = ? GROUP BY f.value "
+                            "ORDER BY count DESC, f.value LIMIT ?"
+                            .format(tables, where),
+                            params + [field, options.get("limit", 100)],
+                        )
+                    ]
+            except sqlite3.OperationalError:
+                if not self.silently_fail:
+                    raise
+                logger.error("Failed to query the search index with '%s'.",
+                             query_string, exc_info=True)
+                return {"results": [], "hits": 0}
+
+        return {
+            "results": self._process_results(rows, result_class),
+            "hits": hits,
+            "facets": {"fields": facet_counts} if facets else {},
+        }
+
+    def _process_results(self, rows, result_class):
+        unified_index = connections[self.connection_alias].get_unified_index()
+        fields = unified_index.all_searchfields()
+        results = []
+        for django_ct, django_id, data, rank in rows:
+            stored = {}
+            for key, value in json.loads(data).items():
+                if key in fields:
+                    value = fields[key].convert(value)
+                if isinstance(value, datetime) and settings.USE_TZ:
+                    value = timezone.make_aware(value, timezone.utc)
+                stored[str(key)] = value
+            app_label, model_name = django_ct.split(".")
+            results.append(result_class(
+                app_label, model_name, django_id, -rank, **stored
+            ))
+        return results
+
+    def more_like_this(self, model_instance, additional_query_string=None,
+                       start_offset=0, end_offset=None,
+                       limit_to_registered_models=None, result_class=None,
+                       **kwargs):
+        warn("more_like_this is not implemented in this backend")
+        return {"results": [], "hits": 0}
+
+
+class SQLiteSearchQuery(BaseSearchQuery):
+    """
+    Builds FTS5 match expressions. Plain words are matched as prefixes, which
+    is what the EdgeNgramFields declared on the indexes ask for.
+    """
+    def clean(self, query_fragment):
+        if not isinstance(query_fragment, six.string_types):
+            return query_fragment
+        return query_fragment.replace('"', '""')
+
+    def matching_all_fragment(self):
+        return "*"
+
+    def _terms(self, text, prefix=True):
+        return [
+            _quote(word) + ("*" if prefix else "")
+            for word in WORD_RE.findall(force_text(text))
+        ]
+
+    def _auto_query(self, query_string):
+        positive, negative = [], []
+        exacts = AutoQuery.exact_match_re.findall(query_string)
+        for rough_token in AutoQuery.exact_match_re.split(query_string):
+            if not rough_token:
+                continue
+            if rough_token in exacts:
+                words = WORD_RE.findall(rough_token)
+                if words:
+                    positive.append(_quote(" ".join(words)))
+                continue
+            for token in rough_token.split():
+                if token.startswith("-") and len(token) > 1:
+                    negative.extend(self._terms(token[1:], prefix=False))
+                else:
+                    positive.extend(self._terms(token))
+
+        if not positive:
+            return ""
+        query = " AND ".join(positive)
+        for term in negative:
+            query = "({0}) NOT {1}".format(query, term)
+        return query
+
+    def build_query_fragment(self, field, filter_type, value):
+        """
+        Every field filter matches against the full document, the index does
+        not keep a separate column per field.
+        """
+        if isinstance(value, AutoQuery):
+            return self._auto_query(value.query_string)
+        if isinstance(value, Exact) or filter_type == "exact":
+            words = WORD_RE.findall(force_text(getattr(
+                value, "query_string", value,
+            )))
+            return _quote(" ".join(words)) if words else ""
+        if isinstance(value, (list, tuple, set)):
+            terms = [" AND ".join(self._terms(i)) for i in value]
+            terms = ["({0})".format(i) for i in terms if i]
+            return " OR ".join(terms)
+        text = getattr(value, "query_string", value)
+        return " AND ".join(self._terms(text))
+
+
+class SQLiteSearchEngine(BaseEngine):
+    backend = SQLiteSearchBackend
+    query = SQLiteSearchQuery
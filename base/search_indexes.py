@@ -29,4 +29,9 @@ class UserProfileIndex(indexes.SearchIndex, indexes.Indexable):
         return data
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all().exclude(user__username=ANONYMOUS_USERNAME)
+        return self.get_model().objects.all().exclude(user__username=ANONYMOUS_USERNAME) \
+          .select_related('user')
+
+    def read_queryset(self, using=None):
+        return self.index_queryset(using=using) \
+          .prefetch_related('room_set', 'previousresident_set__room')
@@ -0,0 +1,185 @@
+'''
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+Deferred search indexing. Saves and deletes of indexed models are recorded in
+the SearchQueueEntry table rather than written to the search index inside the
+request, and flush_search_queue applies them to the index in batches.
+
+Haystack loads the signal processor while the app registry is still being
+populated, so models are imported where they are used.
+'''
+
+from __future__ import absolute_import
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils.encoding import force_text
+from django.utils.timezone import now
+
+from haystack import connection_router, connections
+from haystack.exceptions import NotHandled
+from haystack.signals import BaseSignalProcessor
+from haystack.utils import get_model_ct
+
+from base import autocomplete
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    '''
+    Records changed objects in the search queue instead of indexing them
+    immediately. Repeated changes to the same object coalesce into one entry.
+    '''
+    def setup(self):
+        self._indexed_models = None
+        models.signals.post_save.connect(self.handle_save)
+        models.signals.post_delete.connect(self.handle_delete)
+
+    def teardown(self):
+        models.signals.post_save.disconnect(self.handle_save)
+        models.signals.post_delete.disconnect(self.handle_delete)
+
+    def _is_indexed(self, sender):
+        if self._indexed_models is None:
+            indexed = set()
+            for connection in self.connections.all():
+                indexed.update(
+                    connection.get_unified_index().get_indexed_models()
+                )
+            self._indexed_models = indexed
+        return sender._meta.concrete_model in self._indexed_models
+
+    def enqueue(self, instance, action):
+        from django.contrib.contenttypes.models import ContentType
+        from base.models import SearchQueueEntry
+
+        lookup = dict(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_id=force_text(instance.pk),
+        )
+        values = dict(action=action, queued_at=now())
+        if SearchQueueEntry.objects.filter(**lookup).update(**values):
+            return
+        try:
+            with transaction.atomic():
+                SearchQueueEntry.objects.create(**dict(lookup, **values))
+        except IntegrityError:
+            # Queued by someone else in the meantime
+            SearchQueueEntry.objects.filter(**lookup).update(**values)
+
+    def _enqueue_related(self, instance):
+        '''
+        Queues the objects whose documents are built from instance, as listed
+        by the related_updates method of its search indexes.
+        '''
+        from base.models import SearchQueueEntry
+
+        model = instance._meta.concrete_model
+        for connection in self.connections.all():
+            try:
+                index = connection.get_unified_index().get_index(model)
+            except NotHandled:
+                continue
+            if not hasattr(index, "related_updates"):
+                continue
+            for obj in index.related_updates(instance):
+                if obj is not None and self._is_indexed(type(obj)):
+                    self.enqueue(obj, SearchQueueEntry.UPDATE)
+
+    def handle_save(self, sender, instance, **kwargs):
+        from base.models import SearchQueueEntry
+
+        if kwargs.get("raw") or not self._is_indexed(sender):
+            return
+        self.enqueue(instance, SearchQueueEntry.UPDATE)
+        self._enqueue_related(instance)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        from base.models import SearchQueueEntry
+
+        if not self._is_indexed(sender):
+            return
+        self.enqueue(instance, SearchQueueEntry.DELETE)
+        self._enqueue_related(instance)
+
+
+def _flush_model(model, update_pks, delete_pks):
+    ct = get_model_ct(model)
+    for using in connection_router.for_write(models=[model]):
+        try:
+            index = connections[using].get_unified_index().get_index(model)
+        except NotHandled:
+            continue
+        backend = connections[using].get_backend()
+
+        found = []
+        for start in range(0, len(update_pks), 500):
+            found.extend(
+                index.index_queryset(using=using).filter(
+                    pk__in=update_pks[start:start + 500],
+                )
+            )
+        if found:
+            backend.update(index, found)
+
+        # Objects that were deleted or fell out of the index's queryset
+        found_pks = set(force_text(obj.pk) for obj in found)
+        for pk in delete_pks + [i for i in update_pks if i not in found_pks]:
+            backend.remove("{0}.{1}".format(ct, pk))
+
+
+def flush_search_queue(batch_size=None):
+    '''
+    Applies the queued changes to the search index, batch_size entries at a
+    time. Only changes queued before the flush started are applied, so a busy
+    site cannot keep a flush running forever. Returns the number of entries
+    flushed.
+    '''
+    from django.contrib.contenttypes.models import ContentType
+    from base.models import SearchQueueEntry
+
+    if batch_size is None:
+        batch_size = settings.SEARCH_QUEUE_BATCH_SIZE
+    started = now()
+    flushed = 0
+
+    while True:
+        entries = list(
+            SearchQueueEntry.objects.filter(
+                queued_at__lte=started,
+            ).order_by("pk")[:batch_size]
+        )
+        if not entries:
+            break
+
+        changes = defaultdict(lambda: ([], []))
+        for entry in entries:
+            updates, deletes = changes[entry.content_type_id]
+            if entry.action == SearchQueueEntry.DELETE:
+                deletes.append(entry.object_id)
+            else:
+                updates.append(entry.object_id)
+
+        flushed_models = []
+        for content_type_id, (updates, deletes) in changes.items():
+            model = ContentType.objects.get_for_id(content_type_id) \
+              .model_class()
+            if model is not None:
+                _flush_model(model, updates, deletes)
+                flushed_models.append(model)
+        autocomplete.invalidate(flushed_models)
+
+        # Leave any entry that was queued again while we were indexing
+        SearchQueueEntry.objects.filter(
+            pk__in=[entry.pk for entry in entries],
+            queued_at__lte=started,
+        ).delete()
+        flushed += len(entries)
+
+        if len(entries) < batch_size:
+            break
+
+    return flushed
@@ -0,0 +1,62 @@
+'''
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+The site's search view. Result rows are rendered from the fields stored in the
+search index where possible; the objects behind the remaining rows are loaded
+with one query per model rather than one per result.
+'''
+
+from __future__ import absolute_import
+
+from collections import defaultdict
+
+from haystack import connections
+from haystack.exceptions import NotHandled
+from haystack.views import FacetedSearchView
+
+
+def load_result_objects(results, using="default"):
+    '''
+    Sets the object of each search result, grouped into one in_bulk query per
+    model using the index's read_queryset. Results whose index sets
+    load_object = False are skipped, as their templates only use stored
+    fields.
+    '''
+    unified_index = connections[using].get_unified_index()
+    results_by_model = defaultdict(list)
+    for result in results:
+        if result.model is None:
+            continue
+        try:
+            index = unified_index.get_index(result.model)
+        except NotHandled:
+            continue
+        if getattr(index, "load_object", True):
+            results_by_model[result.model].append(result)
+
+    for model, model_results in results_by_model.items():
+        index = unified_index.get_index(model)
+        objects = index.read_queryset(using=using).in_bulk(
+            [result.pk for result in model_results]
+        )
+        # in_bulk is keyed by the typed primary key, the results by strings
+        objects = dict((str(pk), obj) for pk, obj in objects.items())
+        for result in model_results:
+            result.object = objects.get(str(result.pk))
+
+
+class SearchView(FacetedSearchView):
+    '''
+    FacetedSearchView that loads the objects for a page of results in bulk,
+    instead of letting haystack's load_all fetch every model's objects.
+    '''
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("load_all", False)
+        super(SearchView, self).__init__(*args, **kwargs)
+
+    def build_page(self):
+        paginator, page = super(SearchView, self).build_page()
+        load_result_objects(page.object_list)
+        return paginator, page
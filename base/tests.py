@@ -4,25 +4,51 @@ Project: Farnsworth
 Authors: Karandeep Singh Nagra and Nader Morshed
 """
 
-from datetime import date, timedelta
+from datetime import date, time, timedelta
+import json
+from smtplib import SMTPException
 
 from django.conf import settings
-from django.contrib.auth.models import User
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
 from django.core.management import call_command
 from django.core.urlresolvers import reverse
-from django.test import TestCase
-from django.utils.timezone import now
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.timezone import now, localtime, utc
 
 from notifications import notify
+from notifications.models import Notification
 import haystack
 from haystack.query import SearchQuerySet
 
-from utils.variables import MESSAGES
-from base.models import UserProfile, ProfileRequest
+from utils.variables import ANONYMOUS_USERNAME, MESSAGES
+from base.models import UserProfile, ProfileRequest, SearchQueueEntry, \
+     SearchIndexCheckpoint, QueuedEmail, SiteCounter
+from base.search_queue import flush_search_queue
+from base.search_views import load_result_objects
+from base.ical import get_calendar_token
+from base import fanout
+from base.mail import queue_digests, queue_mail, send_queued_mail
+from base.cron import PruneNotificationsCronJob
+from base import counters
+from base.decorators import president_admin_required, profile_required
+from base.permissions import get_capabilities
+from base.profiling import query_shape, recent_profiles
+from base import autocomplete
+from utils.testing import QueryBudgetMixin
+from threads.forms import EditMessageForm
 from threads.models import Thread, Message
 from managers.models import Manager, Announcement, RequestType, Request, Response
 from events.models import Event
 from rooms.models import Room, PreviousResident
+from wiki.models import Page, Revision
+from workshift.models import Semester, WorkshiftType, WorkshiftPool, \
+     WorkshiftProfile, WorkshiftInstance, InstanceInfo
 
 class TestLogin(TestCase):
     def setUp(self):
@@ -103,7 +129,7 @@ class TestLogin(TestCase):
         response = self.client.get(reverse("homepage"), follow=True)
         self.assertRedirects(response, reverse('external'))
 
-class TestHomepage(TestCase):
+class TestHomepage(QueryBudgetMixin, TestCase):
     def setUp(self):
         self.u = User.objects.create_user(username="u", password="pwd")
 
@@ -142,6 +168,18 @@ class TestHomepage(TestCase):
 
         self.client.login(username="u", password="pwd")
 
+    def get_query_budgets(self):
+        # As on the site, the archive counters have been counted before
+        counters.reconcile()
+        return [
+            (reverse("homepage"), 29),
+            (reverse("my_profile"), 11),
+            (reverse("member_directory"), 13),
+            (reverse("notifications"), 11),
+            (reverse("archives"), 11),
+            (reverse("site_map"), 9),
+        ]
+
     def test_homepage_view(self):
         url = reverse("homepage")
         response = self.client.get(url)
@@ -727,6 +765,33 @@ class TestProfilePages(TestCase):
         self.assertContains(response, "Threads Started")
         self.assertContains(response, "Requests Posted")
 
+    def test_activity_counts(self):
+        thread = Thread.objects.create(subject="Subject", owner=self.oprofile)
+        messages = [
+            Message.objects.create(thread=thread, body="Body", owner=self.oprofile)
+            for i in range(3)
+            ]
+        rt = RequestType.objects.create(name="Food")
+        for i in range(2):
+            Request.objects.create(owner=self.oprofile, request_type=rt)
+        Request.objects.filter(owner=self.oprofile)[0].delete()
+        messages[0].delete()
+        self.oprofile = UserProfile.objects.get(pk=self.oprofile.pk)
+        self.assertEqual(1, self.oprofile.number_of_threads)
+        self.assertEqual(2, self.oprofile.number_of_messages)
+        self.assertEqual(1, self.oprofile.number_of_requests)
+
+        self.client.login(username="u", password="pwd")
+        url = reverse("member_profile", kwargs={"targetUsername": self.ou.username})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(2, response.context["number_of_messages"])
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'COUNT(*) FROM "threads_message"' in query["sql"]
+            ])
+
     def test_change_password(self):
         url = reverse("my_profile")
         response = self.client.post(url, {
@@ -924,6 +989,19 @@ class TestAdminFunctions(TestCase):
 
         self.client.login(username="su", password="pwd")
 
+    def test_recount(self):
+        profile = UserProfile.objects.get(user=self.u)
+        thread = Thread.objects.create(subject="Subject", owner=profile)
+        Message.objects.create(thread=thread, body="Body", owner=profile)
+        UserProfile.objects.filter(pk=profile.pk).update(
+            number_of_threads=5, number_of_messages=0,
+            )
+        self.client.get(reverse("recount"))
+        profile = UserProfile.objects.get(pk=profile.pk)
+        self.assertEqual(1, profile.number_of_threads)
+        self.assertEqual(1, profile.number_of_messages)
+        self.assertEqual(0, profile.number_of_requests)
+
     def test_add_user(self):
         url = reverse("custom_add_user")
         response = self.client.post(url, {
@@ -1116,6 +1194,36 @@ class TestMemberDirectory(TestCase):
         self.auprofile.save()
 
         self.client.login(username="ru", password="pwd")
+        cache.clear()
+
+    def test_directory_cache(self):
+        url = reverse("member_directory")
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        uncached = len(context.captured_queries)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(uncached - 3, len(context.captured_queries))
+        self.assertContains(response, "1 resident, 1 boarder")
+
+        self.buprofile.status = UserProfile.RESIDENT
+        self.buprofile.save()
+        response = self.client.get(url)
+        self.assertContains(response, "2 residents, 0 boarders")
+
+        self.au.first_name = "Alfred"
+        self.au.save()
+        self.assertContains(self.client.get(url), "Alfred")
+
+    @override_settings(MEMBER_DIRECTORY_CACHE_SECONDS=0)
+    def test_directory_changed_elsewhere(self):
+        url = reverse("member_directory")
+        self.assertContains(self.client.get(url), self.bu.email)
+        # Hidden by another process, once this one's copy has expired
+        UserProfile.objects.filter(pk=self.buprofile.pk).update(
+            email_visible=False,
+            )
+        self.assertNotContains(self.client.get(url), self.bu.email)
 
     def test_member_directory_view(self):
         url = reverse("member_directory")
@@ -1156,6 +1264,7 @@ class TestSearch(TestCase):
         self.profile = UserProfile.objects.get(user=self.u)
         self.profile.phone_number = "+15101111111"
         self.profile.save()
+        flush_search_queue()
 
         self.sqs = SearchQuerySet()
 
@@ -1177,6 +1286,226 @@ class TestSearch(TestCase):
         self.assertEqual(self.profile,
                  self.sqs.facet(self.profile.phone_number.as_national)[0].object)
 
+    def test_search_results(self):
+        response = self.client.get("/search/?q={0}".format(self.u.last_name))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "No results found.")
+        self.assertContains(response, self.u.first_name)
+
+        # Words are matched by prefix, as declared by the EdgeNgramFields
+        results = self.sqs.auto_query("Firs")
+        self.assertEqual([self.profile], [i.object for i in results])
+
+        self.assertEqual(0, self.sqs.auto_query("FirstName -LastName").count())
+        self.assertEqual(0, self.sqs.auto_query("Nonexistent").count())
+
+    def test_search_facets(self):
+        other = User.objects.create_user(username="other", password="pwd")
+        other.first_name, other.last_name = "Other", "LastName"
+        other.save()
+        other_profile = UserProfile.objects.get(user=other)
+        other_profile.status = UserProfile.ALUMNUS
+        other_profile.save()
+        flush_search_queue()
+
+        sqs = self.sqs.auto_query("LastName").facet("exact_status")
+        self.assertEqual(2, sqs.count())
+        self.assertEqual(
+            [(UserProfile.ALUMNUS, 1), (UserProfile.RESIDENT, 1)],
+            sqs.facet_counts()["fields"]["exact_status"],
+        )
+
+        sqs = sqs.narrow('exact_status:"{0}"'.format(UserProfile.ALUMNUS))
+        self.assertEqual([other_profile], [i.object for i in sqs])
+
+        response = self.client.get(
+            "/search/?q=LastName&selected_facets=exact_user:other"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [other_profile],
+            [i.object for i in response.context["page"].object_list],
+        )
+
+    def test_search_boost(self):
+        duties = Manager.objects.create(
+            title="Duties Manager",
+            url_title="duties_manager",
+            duties="Gardener",
+        )
+        title = Manager.objects.create(
+            title="Gardener",
+            url_title="gardener",
+        )
+        flush_search_queue()
+        # Manager titles are boosted over their duties
+        results = self.sqs.auto_query("Gardener")
+        self.assertEqual([title, duties], [i.object for i in results])
+
+    def test_search_remove(self):
+        self.assertEqual(1, self.sqs.auto_query("FirstName").count())
+        self.u.delete()
+        flush_search_queue()
+        self.assertEqual(0, self.sqs.auto_query("FirstName").count())
+
+    def test_search_queue(self):
+        self.assertEqual(0, SearchQueueEntry.objects.count())
+
+        # Repeated saves are coalesced into one entry, indexed on flush
+        for first_name in ["Queued", "Coalesced"]:
+            self.u.first_name = first_name
+            self.u.save()
+            self.profile.save()
+        self.assertEqual(1, SearchQueueEntry.objects.count())
+        self.assertEqual(0, self.sqs.auto_query("Coalesced").count())
+
+        self.assertEqual(1, flush_search_queue())
+        self.assertEqual(0, SearchQueueEntry.objects.count())
+        self.assertEqual(1, self.sqs.auto_query("Coalesced").count())
+        self.assertEqual(0, self.sqs.auto_query("Queued").count())
+
+    def _count_search_queries(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/search/?q={0}".format(query))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_search_hydration(self):
+        for i in range(2):
+            Thread.objects.create(owner=self.profile, subject="Hydrated")
+            UserProfile.objects.get(
+                user=User.objects.create_user(
+                    username="hydrated{0}".format(i),
+                    first_name="Hydrated",
+                ),
+            ).save()
+        flush_search_queue()
+        few, response = self._count_search_queries("Hydrated")
+        self.assertEqual(4, len(response.context["page"].object_list))
+        self.assertContains(response, "Thread")
+
+        for i in range(2, 6):
+            Thread.objects.create(owner=self.profile, subject="Hydrated")
+            UserProfile.objects.get(
+                user=User.objects.create_user(
+                    username="hydrated{0}".format(i),
+                    first_name="Hydrated",
+                ),
+            ).save()
+        flush_search_queue()
+        many, response = self._count_search_queries("Hydrated")
+        self.assertEqual(12, len(response.context["page"].object_list))
+        self.assertEqual(few, many)
+
+        # Threads render from stored fields, profiles are loaded in bulk
+        results = list(self.sqs.auto_query("Hydrated"))
+        with self.assertNumQueries(3):
+            load_result_objects(results)
+        for result in results:
+            if result.model is Thread:
+                self.assertIsNone(result._object)
+            else:
+                self.assertIsNotNone(result._object)
+
+    def _clear_index(self):
+        call_command('clear_index', interactive=False, verbosity=0)
+
+    def test_update_search_index(self):
+        thread = Thread.objects.create(owner=self.profile, subject="Stale")
+        self._clear_index()
+        call_command("update_search_index", verbosity=0)
+        self.assertEqual(1, self.sqs.models(UserProfile).auto_query("FirstName").count())
+        self.assertEqual(1, self.sqs.auto_query("Stale").count())
+
+        checkpoint = SearchIndexCheckpoint.objects.get(model="threads.thread")
+        self.assertIsNotNone(checkpoint.indexed_until)
+        self.assertIsNone(checkpoint.run_started)
+
+        # Only threads changed since the last run are reindexed
+        self._clear_index()
+        call_command("update_search_index", verbosity=0)
+        self.assertEqual(0, self.sqs.auto_query("Stale").count())
+        # Models without an updated field are always reindexed
+        self.assertEqual(1, self.sqs.models(UserProfile).auto_query("FirstName").count())
+
+        Thread.objects.filter(pk=thread.pk).update(change_date=now())
+        call_command("update_search_index", verbosity=0)
+        self.assertEqual(1, self.sqs.auto_query("Stale").count())
+
+        self._clear_index()
+        call_command("update_search_index", full=True, verbosity=0)
+        self.assertEqual(1, self.sqs.auto_query("Stale").count())
+
+    def test_update_search_index_resume(self):
+        alpha = Thread.objects.create(owner=self.profile, subject="Alpha")
+        Thread.objects.create(owner=self.profile, subject="Beta")
+        self._clear_index()
+
+        # An interrupted run continues after the last indexed object
+        SearchIndexCheckpoint.objects.create(
+            using="default",
+            model="threads.thread",
+            run_started=now(),
+            last_pk=alpha.pk,
+        )
+        call_command("update_search_index", verbosity=0)
+        self.assertEqual(0, self.sqs.auto_query("Alpha").count())
+        self.assertEqual(1, self.sqs.auto_query("Beta").count())
+
+        checkpoint = SearchIndexCheckpoint.objects.get(model="threads.thread")
+        self.assertIsNone(checkpoint.run_started)
+        self.assertIsNone(checkpoint.last_pk)
+
+    def test_update_search_index_revisions(self):
+        page = Page.objects.create(slug="page")
+        for content in ["OldRevision", "NewRevision"]:
+            Revision.objects.create(
+                page=page, content=content, content_html="",
+                created_ip="0.0.0.0", created_by=self.u,
+            )
+        self._clear_index()
+
+        call_command("update_search_index", full=True, verbosity=0)
+        self.assertEqual(0, self.sqs.auto_query("OldRevision").count())
+        self.assertEqual(1, self.sqs.auto_query("NewRevision").count())
+
+        call_command("update_search_index", full=True, all_revisions=True,
+                     verbosity=0)
+        self.assertEqual(1, self.sqs.auto_query("OldRevision").count())
+
+    def test_revision_queue(self):
+        page = Page.objects.create(slug="page")
+        revisions = []
+        for content in ["OldRevision", "NewRevision"]:
+            revisions.append(Revision.objects.create(
+                page=page, content=content, content_html="",
+                created_ip="0.0.0.0", created_by=self.u,
+            ))
+            flush_search_queue()
+        # Only the latest revision of a page is searchable
+        self.assertEqual(0, self.sqs.auto_query("OldRevision").count())
+        self.assertEqual(1, self.sqs.auto_query("NewRevision").count())
+
+        revisions[1].delete()
+        flush_search_queue()
+        self.assertEqual(1, self.sqs.auto_query("OldRevision").count())
+        self.assertEqual(0, self.sqs.auto_query("NewRevision").count())
+
+    def test_update_search_index_messages(self):
+        thread = Thread.objects.create(owner=self.profile, subject="Subject")
+        message = Message.objects.create(
+            owner=self.profile, thread=thread, body="Original",
+        )
+        call_command("update_search_index", verbosity=0)
+        self._clear_index()
+
+        # Edited messages are reindexed by the next incremental run
+        form = EditMessageForm({"body": "Edited"}, instance=message)
+        self.assertTrue(form.is_valid())
+        form.save()
+        call_command("update_search_index", verbosity=0)
+        self.assertEqual(1, self.sqs.models(Message).auto_query("Edited").count())
+
     # def test_search_results(self):
     #     response = self.client.get("/search/?q={0}".format(self.u.username))
     #     self.assertEqual(response.status_code, 200)
@@ -1197,6 +1526,205 @@ class TestSearch(TestCase):
     #     self.assertEqual(response.status_code, 200)
     #     self.assertContains(response, "No results found.")
 
+class TestAutocomplete(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user(
+            username="u", password="pwd",
+            first_name="Karandeep", last_name="Nagra",
+        )
+        self.profile = UserProfile.objects.get(user=self.u)
+        self.thread = Thread.objects.create(
+            owner=self.profile, subject="Kitchen renovation",
+        )
+        Thread.objects.create(
+            owner=self.profile, subject="Hidden thread", active=False,
+        )
+        self.type = WorkshiftType.objects.create(title="Kitchen Cleaning")
+        Page.objects.create(slug="kitchen-rules")
+        flush_search_queue()
+        autocomplete.invalidate()
+
+        self.client.login(username="u", password="pwd")
+
+    def _autocomplete(self, query):
+        response = self.client.get(
+            reverse("autocomplete"), {"q": query},
+        )
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode())["results"]
+
+    def test_members(self):
+        for query in ["Kar", "nag", "karandeep n", "u"]:
+            results = self._autocomplete(query)
+            self.assertIn(
+                dict(
+                    label="Karandeep Nagra",
+                    type=autocomplete.MEMBER,
+                    url=reverse("member_profile",
+                                kwargs={"targetUsername": "u"}),
+                ),
+                results,
+            )
+        self.assertEqual([], self._autocomplete("Nagrax"))
+
+    def test_ordering(self):
+        results = self._autocomplete("kitch")
+        self.assertEqual(
+            [
+                ("Kitchen renovation", autocomplete.THREAD),
+                ("Kitchen Cleaning", autocomplete.WORKSHIFT_TYPE),
+                ("kitchen-rules", autocomplete.WIKI_PAGE),
+            ],
+            [(i["label"], i["type"]) for i in results],
+        )
+        # Labels starting with the query come before other matches
+        results = self._autocomplete("clean")
+        self.assertEqual(["Kitchen Cleaning"], [i["label"] for i in results])
+        self.assertEqual([], self._autocomplete("hidden"))
+
+    def test_refreshed_by_search_queue(self):
+        self.assertEqual([], self._autocomplete("garden"))
+        Thread.objects.create(owner=self.profile, subject="Garden party")
+        self.assertEqual([], self._autocomplete("garden"))
+        flush_search_queue()
+        self.assertEqual(
+            ["Garden party"],
+            [i["label"] for i in self._autocomplete("garden")],
+        )
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(reverse("autocomplete"), {"q": "kitch"})
+        self.assertRedirects(
+            response, reverse("login") + "?next=" + reverse("autocomplete"),
+        )
+
+    def test_lru_cache(self):
+        lru = autocomplete.LRUCache(2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        self.assertEqual(1, lru.get("a"))
+        lru.set("c", 3)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(1, lru.get("a"))
+        self.assertEqual(3, lru.get("c"))
+
+class TestCalendarFeed(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user(username="u", password="pwd")
+        self.profile = UserProfile.objects.get(user=self.u)
+
+        today = localtime(now()).date()
+        self.semester = Semester.objects.create(
+            year=today.year,
+            start_date=today,
+            end_date=today + timedelta(days=6),
+        )
+        pool = WorkshiftPool.objects.get(
+            is_primary=True,
+            semester=self.semester,
+        )
+        self.instance = WorkshiftInstance.objects.create(
+            info=InstanceInfo.objects.create(
+                title="Clean the kitchen, quickly",
+                pool=pool,
+                start_time=time(23),
+                end_time=time(1),
+            ),
+            date=today,
+            workshifter=WorkshiftProfile.objects.get(
+                user=self.u,
+                semester=self.semester,
+            ),
+        )
+        WorkshiftInstance.objects.create(
+            info=InstanceInfo.objects.create(title="Unassigned", pool=pool),
+            date=today,
+        )
+
+        start = now() + timedelta(days=1)
+        self.event = Event.objects.create(
+            owner=self.profile,
+            title="House Dinner",
+            location="Dining Room",
+            start_time=start,
+            end_time=start + timedelta(hours=2),
+        )
+        self.event.rsvps = [self.profile]
+        Event.objects.create(
+            owner=self.profile,
+            title="Not attending",
+            start_time=start,
+            end_time=start + timedelta(hours=2),
+        )
+
+        self.url = reverse("calendar_feed", kwargs={
+            "targetUsername": "u",
+            "token": get_calendar_token(self.u),
+        })
+
+    def _content(self, response):
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_feed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual("text/calendar; charset=utf-8", response["Content-Type"])
+        content = self._content(response)
+        self.assertTrue(content.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertIn("SUMMARY:Clean the kitchen\\, quickly\r\n", content)
+        self.assertIn("SUMMARY:House Dinner\r\n", content)
+        self.assertIn("LOCATION:Dining Room\r\n", content)
+        self.assertNotIn("Unassigned", content)
+        self.assertNotIn("Not attending", content)
+
+        # The shift runs past midnight
+        self.assertIn(
+            "DTEND:" + (
+                localtime(now()).replace(
+                    hour=1, minute=0, second=0, microsecond=0,
+                ) + timedelta(days=1)
+            ).astimezone(utc).strftime("%Y%m%dT%H%M%SZ"),
+            content,
+        )
+        for line in content.split("\r\n"):
+            self.assertLessEqual(len(line.encode("utf-8")), 75)
+
+    def test_bad_token(self):
+        url = reverse("calendar_feed", kwargs={
+            "targetUsername": "u",
+            "token": "0" * 20,
+        })
+        self.assertEqual(404, self.client.get(url).status_code)
+
+        # Changing the password revokes the old address
+        self.u.set_password("new")
+        self.u.save()
+        self.assertEqual(404, self.client.get(self.url).status_code)
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        last_modified = response["Last-Modified"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified,
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.event.title = "House Brunch"
+        self.event.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(etag, response["ETag"])
+        self.assertIn("House Brunch", self._content(response))
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified,
+        )
+        self.assertEqual(response.status_code, 200)
+
 class TestNotifications(TestCase):
     def setUp(self):
         self.u = User.objects.create_user(username="u", password="pwd")
@@ -1247,3 +1775,424 @@ class TestNotifications(TestCase):
             )
 
         self.assertEqual(0, self.u.notifications.unread().count())
+
+    def test_inbox_pages(self):
+        thread = Thread.objects.create(
+            subject="subject", owner=UserProfile.objects.get(user=self.u),
+            )
+        others = [
+            User.objects.create_user(username="o{0}".format(i))
+            for i in range(4)
+            ]
+        for i in range(7):
+            fanout.notify_many(others[i % 4], [self.u],
+                               verb="edited {0}".format(i), target=thread)
+        url = reverse("notifications")
+
+        with self.settings(MAX_NOTIFICATIONS=5):
+            response = self.client.get(url)
+            first = list(response.context["notifications"])
+            self.assertEqual(5, len(first))
+            self.assertTrue(all(n.unread for n in first))
+            self.assertEqual(
+                sorted(first, key=lambda n: (n.timestamp, n.pk), reverse=True),
+                first,
+                )
+            self.assertEqual(3, self.u.notifications.unread().count())
+
+            response = self.client.get(response.context["next_page"])
+            second = list(response.context["notifications"])
+            self.assertEqual(3, len(second))
+            self.assertFalse(set(first) & set(second))
+            self.assertIsNone(response.context["next_page"])
+            self.assertEqual(0, self.u.notifications.unread().count())
+
+        # Generic relations are loaded per content type, not per row
+        counts = []
+        for size in [2, 5]:
+            with self.settings(MAX_NOTIFICATIONS=size):
+                with CaptureQueriesContext(connection) as context:
+                    self.client.get(url)
+            counts.append(len(context.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_prune(self):
+        old = now() - timedelta(days=settings.NOTIFICATION_READ_LIFE + 1)
+        self.u.notifications.update(timestamp=old)
+        notify.send(self.u, verb="read", recipient=self.u, timestamp=old)
+        notify.send(self.u, verb="recent", recipient=self.u)
+        self.u.notifications.exclude(verb="tested").update(unread=False)
+
+        PruneNotificationsCronJob().do()
+        self.assertEqual(
+            ["recent", "tested"],
+            sorted(self.u.notifications.values_list("verb", flat=True)),
+            )
+
+    def _followed_thread(self, count):
+        up = UserProfile.objects.get(user=self.u)
+        thread = Thread.objects.create(subject="subject", owner=up)
+        thread.followers = [
+            User.objects.create_user(username="f{0}".format(i))
+            for i in range(count)
+            ]
+        return thread
+
+    def test_fanout(self):
+        thread = self._followed_thread(30)
+        message = Message.objects.create(
+            thread=thread, body="Body", owner=UserProfile.objects.get(user=self.u),
+            )
+        with CaptureQueriesContext(connection) as context:
+            fanout.notify_many(self.u, thread.followers.all(), verb="posted",
+                               action_object=message, target=thread)
+        inserts = [
+            query for query in context.captured_queries
+            if "INSERT INTO" in query["sql"]
+            ]
+        self.assertEqual(1, len(inserts))
+        self.assertEqual(
+            30, Notification.objects.filter(verb="posted").count(),
+            )
+
+    def test_fanout_dedupe(self):
+        thread = self._followed_thread(3)
+        follower = thread.followers.all()[0]
+        for i in range(2):
+            # Repeated recipients are notified once
+            fanout.notify_many(self.u, [follower, follower], verb="posted",
+                               target=thread)
+        self.assertEqual(1, follower.notifications.unread().count())
+
+        follower.notifications.mark_all_as_read()
+        fanout.notify_many(self.u, thread.followers.all(), verb="posted",
+                           target=thread)
+        self.assertEqual(1, follower.notifications.unread().count())
+        self.assertEqual(3, Notification.objects.filter(unread=True,
+                                                        verb="posted").count())
+
+        # Notifications about no object are never dropped
+        fanout.notify_many(self.u, [follower], verb="waved")
+        fanout.notify_many(self.u, [follower], verb="waved")
+        self.assertEqual(2, follower.notifications.filter(verb="waved").count())
+
+    def test_fanout_queue(self):
+        thread = self._followed_thread(2)
+        for verb in ["posted", "posted", "edited"]:
+            fanout._queue.put(fanout.FanoutEvent(
+                actor=fanout._reference(self.u),
+                verb=verb,
+                action_object=None,
+                target=fanout._reference(thread),
+                description=None,
+                timestamp=now(),
+                recipient_pks=[user.pk for user in thread.followers.all()],
+                ))
+        fanout.flush()
+        self.assertEqual(4, Notification.objects.filter(
+            target_object_id=str(thread.pk)).count())
+        self.assertTrue(fanout._queue.empty())
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        if any("fail" in message.subject for message in messages):
+            raise SMTPException("Refused")
+        return super(FailingEmailBackend, self).send_messages(messages)
+
+class TestMail(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user(
+            username="u", email="u@example.com", first_name="U",
+            )
+        self.ou = User.objects.create_user(
+            username="ou", email="ou@example.com",
+            )
+
+    def test_queue(self):
+        with self.settings(EMAIL_BLACKLIST=("blocked@example.com",)):
+            self.assertIsNone(
+                queue_mail("Subject", "Body", to=["blocked@example.com"]),
+                )
+            email = queue_mail(
+                "Subject", "Body", bcc=["a@example.com", "blocked@example.com"],
+                html_body="<p>Body</p>",
+                )
+        self.assertEqual("a@example.com", email.bcc)
+        for i in range(4):
+            queue_mail("Subject {0}".format(i), "Body", to=["b@example.com"])
+        self.assertEqual(0, len(mail.outbox))
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(5, send_queued_mail(batch_size=2))
+        self.assertEqual(5, len(mail.outbox))
+        self.assertEqual(["a@example.com"], mail.outbox[0].bcc)
+        self.assertEqual(
+            [("<p>Body</p>", "text/html")], mail.outbox[0].alternatives,
+            )
+        self.assertEqual(0, QueuedEmail.objects.count())
+        # Loading each of the three batches, and deleting what was sent
+        self.assertEqual(9, len(context.captured_queries))
+
+    @override_settings(
+        EMAIL_QUEUE_BACKEND="base.tests.FailingEmailBackend",
+        EMAIL_QUEUE_MAX_ATTEMPTS=2,
+        )
+    def test_retry(self):
+        queue_mail("Will fail", "Body", to=["a@example.com"])
+        queue_mail("Subject", "Body", to=["a@example.com"])
+        self.assertEqual(1, send_queued_mail())
+        self.assertEqual(["Subject"], [m.subject for m in mail.outbox])
+        email = QueuedEmail.objects.get()
+        self.assertEqual(1, email.attempts)
+        self.assertIn("Refused", email.last_error)
+
+        self.assertEqual(0, send_queued_mail())
+        self.assertEqual(0, send_queued_mail())
+        self.assertEqual(2, QueuedEmail.objects.get().attempts)
+
+    def test_digests(self):
+        profile = UserProfile.objects.get(user=self.u)
+        profile.email_thread_notifications = True
+        profile.email_workshift_notifications = False
+        profile.save()
+        oprofile = UserProfile.objects.get(user=self.ou)
+        oprofile.email_thread_notifications = False
+        oprofile.email_workshift_notifications = False
+        oprofile.save()
+
+        thread = Thread.objects.create(subject="Leak in the attic", owner=oprofile)
+        fanout.notify_many(self.ou, [self.u, self.ou], verb="posted in",
+                           target=thread)
+        # Notifications about objects without a preference are not e-mailed
+        fanout.notify_many(self.ou, [self.u], verb="waved at",
+                           target=Event.objects.create(
+                               owner=oprofile, title="Party",
+                               start_time=now(), end_time=now(),
+                               ))
+
+        self.assertEqual(1, queue_digests(profile_url="/profile/"))
+        email = QueuedEmail.objects.get()
+        self.assertEqual("u@example.com", email.to)
+        self.assertIn("Threads", email.body)
+        self.assertIn("ou posted in Leak in the attic", email.body)
+        self.assertNotIn("Party", email.body)
+        self.assertIn("/profile/", email.body)
+
+        # Only notifications received since the last digest are sent
+        self.assertEqual(0, queue_digests(profile_url="/profile/"))
+        fanout.notify_many(self.ou, [self.u], verb="edited", target=thread)
+        self.assertEqual(1, queue_digests(profile_url="/profile/"))
+        self.assertNotIn(
+            "posted", QueuedEmail.objects.order_by("-pk")[0].body,
+            )
+
+class TestCounters(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user(username="u", password="pwd")
+        self.profile = UserProfile.objects.get(user=self.u)
+        self.rt = RequestType.objects.create(name="Super")
+        self.client.login(username="u", password="pwd")
+
+    def test_counts(self):
+        self.assertEqual(counters.reconcile(), counters.get_counts())
+        self.assertEqual(1, counters.get_counts()["members.residents"])
+
+        requests = [
+            Request.objects.create(owner=self.profile, request_type=self.rt)
+            for i in range(3)
+            ]
+        requests[0].status = Request.FILLED
+        requests[0].save()
+        requests[1].delete()
+        alumnus = User.objects.create_user(username="alumnus")
+        UserProfile.objects.filter(user=alumnus).update(status=UserProfile.ALUMNUS)
+        anonymous = User.objects.create_user(username=ANONYMOUS_USERNAME)
+        anonymous_profile = UserProfile.objects.get(user=anonymous)
+        anonymous_profile.status = UserProfile.ALUMNUS
+        anonymous_profile.save()
+
+        counts = counters.get_counts()
+        self.assertEqual(2, counts["requests"])
+        self.assertEqual(1, counts["requests.filled"])
+        self.assertEqual(1, counts["requests.open"])
+        self.assertEqual(2, counts["members.residents"])
+        # Bulk updates are only seen when the counters are reconciled
+        self.assertEqual(0, counts["members.alumni"])
+        self.assertEqual(1, counters.reconcile()["members.alumni"])
+        self.assertEqual(counters.reconcile(), counters.get_counts())
+
+    @override_settings(SITE_COUNTERS_CACHE_SECONDS=0)
+    def test_other_processes(self):
+        counters.reconcile()
+        self.assertEqual(1, counters.get_counts()["members.residents"])
+        # Once the cached counts expire, changes made by other processes, such
+        # as a reconcile run from cron, are seen
+        SiteCounter.objects.filter(name="members.residents").update(value=5)
+        self.assertEqual(5, counters.get_counts()["members.residents"])
+
+    def test_unchanged_saves(self):
+        request = Request.objects.create(owner=self.profile, request_type=self.rt)
+        counters.reconcile()
+        request = Request.objects.get(pk=request.pk)
+        self.profile = UserProfile.objects.get(pk=self.profile.pk)
+
+        # Saves that leave the filtered fields alone do not read the old row
+        with CaptureQueriesContext(connection) as context:
+            request.number_of_responses += 1
+            request.save()
+            self.profile.phone_number = "555-5555"
+            self.profile.save()
+        selects = [
+            query["sql"] for query in context.captured_queries
+            if "SELECT" in query["sql"]
+            ]
+        for table in ["managers_request", "base_userprofile"]:
+            self.assertFalse([
+                sql for sql in selects if 'FROM "{0}"'.format(table) in sql
+                ])
+        self.assertEqual(1, counters.get_counts()["requests.open"])
+
+        request.status = Request.FILLED
+        request.save()
+        request.status = Request.CLOSED
+        request.save()
+        counts = counters.get_counts()
+        self.assertEqual(0, counts["requests.open"])
+        self.assertEqual(0, counts["requests.filled"])
+        self.assertEqual(1, counts["requests.closed"])
+        self.assertEqual(counters.reconcile(), counters.get_counts())
+
+    def test_archives(self):
+        url = reverse("archives")
+        self.client.get(url)
+        Thread.objects.create(subject="Subject", owner=self.profile)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertContains(response, "1 thread")
+        # None of the archived tables are counted
+        for table in ["threads_thread", "threads_message", "events_event",
+                      "wiki_revision", "managers_response",
+                      "workshift_workshiftinstance"]:
+            self.assertFalse([
+                query for query in context.captured_queries
+                if 'COUNT(*) FROM "{0}"'.format(table) in query["sql"]
+                ])
+
+        response = self.client.get(reverse("archives_statistics"))
+        self.assertEqual("application/json", response["content-type"])
+        statistics = json.loads(response.content)
+        self.assertEqual(1, statistics["threads"])
+        self.assertEqual(0, statistics["requests"])
+
+class TestCapabilities(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user(username="u", password="pwd")
+        self.profile = UserProfile.objects.get(user=self.u)
+        self.rt = RequestType.objects.create(name="Food")
+        self.manager = Manager.objects.create(
+            title="Kitchen Manager", incumbent=self.profile, president=True,
+        )
+        self.rt.managers = [self.manager]
+
+    def test_capabilities(self):
+        capabilities = get_capabilities(self.u)
+        self.assertIs(capabilities, get_capabilities(self.u))
+        with self.assertNumQueries(3):
+            for i in range(2):
+                self.assertEqual(self.profile, capabilities.profile)
+                self.assertTrue(capabilities.is_president)
+                self.assertTrue(capabilities.is_manager)
+                self.assertFalse(capabilities.is_workshift_manager)
+                self.assertEqual(set([self.rt.pk]),
+                                 capabilities.active_request_types)
+
+        self.manager.active = False
+        self.manager.save()
+        capabilities = get_capabilities(User.objects.get(pk=self.u.pk))
+        self.assertEqual([], capabilities.active_positions)
+        self.assertEqual(set([self.rt.pk]), capabilities.managed_request_types)
+        self.assertEqual(set(), capabilities.active_request_types)
+
+        anonymous = get_capabilities(AnonymousUser())
+        with self.assertNumQueries(0):
+            self.assertEqual(None, anonymous.profile)
+            self.assertFalse(anonymous.is_manager)
+            self.assertEqual(set(), anonymous.managed_request_types)
+
+    def test_request(self):
+        self.client.login(username="u", password="pwd")
+        response = self.client.get(reverse("homepage"))
+        self.assertTrue(response.context["PRESIDENT"])
+        self.assertEqual(
+            [self.rt], [rt for rt, _ in response.context["REQUEST_TYPES"]],
+        )
+        # The manager positions are only loaded once
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse("homepage"))
+        self.assertEqual(1, len([
+            query for query in context.captured_queries
+            if 'FROM "managers_manager"' in query["sql"]
+            and '"managers_manager"."incumbent_id"' in query["sql"]
+            and "INNER JOIN" in query["sql"]
+            ]))
+
+    def test_decorators(self):
+        # Requests built without the middleware are still checked
+        view = lambda request: HttpResponse("Passed")
+        request = RequestFactory().get("/")
+        request.user = self.u
+        self.assertContains(profile_required(view)(request), "Passed")
+        self.assertContains(president_admin_required(view)(request), "Passed")
+
+class TestQueryProfile(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user(username="u", password="pwd")
+        self.su = User.objects.create_user(username="su", password="pwd")
+        self.su.is_superuser = True
+        self.su.save()
+        self.client.login(username="u", password="pwd")
+
+    def test_query_shape(self):
+        self.assertEqual(
+            query_shape('''SELECT "a" FROM "t" WHERE "b" IN (?, ?, ?)'''),
+            query_shape('''SELECT "a" FROM "t" WHERE "b" IN (1, 22, 'x')'''),
+        )
+        self.assertEqual(
+            '''SELECT "a1" FROM "t" WHERE "b" = ? AND "c" IN (...)''',
+            query_shape('''SELECT "a1" FROM "t" WHERE "b" = 'it''s' AND "c" IN (4)'''),
+        )
+
+    def test_budget(self):
+        with self.assertMaxQueries(2):
+            User.objects.count()
+        with self.assertRaises(AssertionError) as context:
+            with self.assertMaxQueries(1, label="Profiles"):
+                for user in User.objects.all():
+                    UserProfile.objects.get(user=user)
+        self.assertIn("Profiles ran 3 queries, over its budget of 1.",
+                      str(context.exception))
+        self.assertIn("Repeated 2 times:", str(context.exception))
+
+    def test_off(self):
+        response = self.client.get(reverse("homepage"))
+        self.assertNotIn("X-Query-Count", response)
+
+    @override_settings(QUERY_PROFILE=True)
+    def test_profile(self):
+        url = reverse("homepage")
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(str(len(context)), response["X-Query-Count"])
+        for header in ["X-Query-Time", "X-Query-Duplicates", "X-View-Time"]:
+            self.assertIn(header, response)
+        profile = recent_profiles()[0]
+        self.assertEqual(url, profile.path)
+        self.assertEqual("homepage", profile.view_name)
+        self.assertEqual(len(context), profile.query_count)
+
+        url = reverse("query_profile")
+        self.assertRedirects(self.client.get(url), reverse("homepage"))
+        self.client.logout()
+        self.client.login(username="su", password="pwd")
+        self.assertContains(self.client.get(url), "GET {0}".format(url))
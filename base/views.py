@@ -7,9 +7,10 @@ Authors: Karandeep Singh Nagra and Nader Morshed
 Views for base application.
 """
 
+from collections import defaultdict
 from datetime import timedelta
+from hashlib import sha1
 from importlib import import_module
-from smtplib import SMTPException
 import json
 
 from django.conf import settings
@@ -19,12 +20,19 @@ from django.contrib.auth.forms import PasswordChangeForm, \
     AdminPasswordChangeForm
 from django.contrib.auth.models import User
 from django.contrib.auth.views import password_reset, password_reset_confirm
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
-from django.core.mail import send_mail
-from django.db.models import Q
-from django.http import HttpResponseRedirect, HttpResponse, Http404
+from django.db.models import Count, Q
+from django.http import HttpResponseRedirect, HttpResponse, Http404, \
+     HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import render_to_response, render, get_object_or_404
 from django.template import RequestContext
+from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.safestring import mark_safe
 from django.utils.timezone import now
 
 import inflect
@@ -34,7 +42,16 @@ from utils.funcs import form_add_error
 from utils.variables import ANONYMOUS_USERNAME, MESSAGES, APPROVAL_SUBJECT, \
     APPROVAL_EMAIL, DELETION_SUBJECT, DELETION_EMAIL, SUBMISSION_SUBJECT, \
     SUBMISSION_EMAIL
-from base.models import UserProfile, ProfileRequest
+from base.autocomplete import autocomplete
+from base.counters import get_counts, reconcile
+from base.ical import get_calendar_token, check_calendar_token, \
+     get_feed_items, get_feed_version, is_not_modified, iter_calendar, \
+     timestamp
+from base.mail import queue_mail
+from base.models import UserProfile, ProfileRequest, \
+     LANDING_CACHE_KEY, MEMBER_DIRECTORY_CACHE_KEY
+from base.permissions import get_capabilities
+from base.profiling import recent_profiles
 from base.redirects import red_ext, red_home
 from base.decorators import profile_required, admin_required
 from base.forms import ProfileRequestForm, AddUserForm, \
@@ -43,26 +60,18 @@ from base.forms import ProfileRequestForm, AddUserForm, \
     UpdateEmailForm, UpdateProfileForm, DeleteUserForm
 from threads.models import Thread, Message
 from threads.forms import ThreadForm
-from managers.models import RequestType, Manager, Request, Response, Announcement
+from managers.models import RequestType, Request, Response, Announcement
 from managers.forms import AnnouncementForm, ManagerResponseForm, VoteForm, PinForm
 from managers.ajax import build_ajax_votes
 from events.models import Event
 from events.forms import RsvpForm
-from events.ajax import build_ajax_rsvps
+from events.ajax import build_rsvp_list, get_rsvp_links, is_rsvpd
 from rooms.models import Room, PreviousResident
 
 def add_context(request):
     ''' Add variables to all dictionaries passed to templates. '''
-    PRESIDENT = False # whether the user has president privileges
-    try:
-        userProfile = UserProfile.objects.get(user=request.user)
-    except (UserProfile.DoesNotExist, TypeError):
-        pass
-    else:
-        for pos in Manager.objects.filter(incumbent=userProfile):
-            if pos.president:
-                PRESIDENT = True
-                break
+    # whether the user has president privileges
+    PRESIDENT = get_capabilities(request.user).is_president
     if request.user.username == ANONYMOUS_USERNAME:
         request.session['ANONYMOUS_SESSION'] = True
     ANONYMOUS_SESSION = request.session.get('ANONYMOUS_SESSION', False)
@@ -71,7 +80,7 @@ def add_context(request):
     if request.user.is_authenticated():
         for request_type in RequestType.objects.filter(enabled=True):
             requests = Request.objects.filter(request_type=request_type, status=Request.OPEN)
-            if not request_type.managers.filter(incumbent__user=request.user):
+            if request_type.pk not in get_capabilities(request.user).managed_request_types:
                 requests = requests.exclude(
                     ~Q(owner__user=request.user), private=True,
                     )
@@ -87,8 +96,37 @@ def add_context(request):
         'PRESIDENT': PRESIDENT,
         }
 
+def _is_public_request(request):
+    '''
+    Whether request is a plain GET from a visitor with no session or pending
+    messages, whose page does not depend on who they are.
+    '''
+    return request.method in ("GET", "HEAD") and \
+      settings.SESSION_COOKIE_NAME not in request.COOKIES and \
+      CookieStorage.cookie_name not in request.COOKIES
+
+def _landing_response(request, etag, content):
+    if is_not_modified(request, etag, None):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content)
+    response["ETag"] = quote_etag(etag)
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
 def landing_view(request):
-    ''' The external landing.'''
+    '''
+    The external landing. Visitors who are not logged in are served a copy
+    from the cache, which is cleared whenever the landing wiki page changes.
+    Other processes only see that once their copy is LANDING_CACHE_SECONDS
+    old, unless they share a cache backend.
+    '''
+    public = _is_public_request(request)
+    if public:
+        landing = cache.get(LANDING_CACHE_KEY)
+        if landing is not None:
+            return _landing_response(request, *landing)
+
     revision = None
     can_edit = False
     edit_url = None
@@ -111,25 +149,29 @@ def landing_view(request):
             can_edit = hookset.can_edit_page(page, request.user)
             edit_url = page.get_edit_url()
 
-    return render_to_response('external.html', {
+    response = render_to_response('external.html', {
         "page_name": "Landing",
         "revision": revision,
         "can_edit": can_edit,
         "edit_url": edit_url,
         }, context_instance=RequestContext(request))
+    if public:
+        landing = (
+            "landing-{0}".format(sha1(response.content).hexdigest()),
+            response.content,
+        )
+        cache.set(LANDING_CACHE_KEY, landing, settings.LANDING_CACHE_SECONDS)
+        response = _landing_response(request, *landing)
+    return response
 
 @profile_required(redirect_no_user='external', redirect_profile=red_ext)
 def homepage_view(request, message=None):
     ''' The view of the homepage. '''
-    userProfile = UserProfile.objects.get(user=request.user)
-    request_types = RequestType.objects.filter(enabled=True)
+    userProfile = get_capabilities(request.user).profile
     # List of request types for which the user is a relevant manager
-    manager_request_types = list()
-    for request_type in request_types:
-        for position in request_type.managers.filter(active=True):
-            if userProfile == position.incumbent:
-                manager_request_types.append(request_type)
-                break
+    manager_request_types = list(RequestType.objects.filter(
+        enabled=True, pk__in=get_capabilities(request.user).active_request_types,
+    ))
     # Pseudo-dictionary, list with items of form (request_type, (request,
     # [list_of_request_responses], response_form))
     requests_dict = list()
@@ -202,7 +244,7 @@ def homepage_view(request, message=None):
                 return HttpResponseRedirect(reverse('homepage'))
         announcements_dict.append((a, pin_form))
 
-    if Manager.objects.filter(incumbent=userProfile, active=True).count():
+    if get_capabilities(request.user).active_positions:
         announcement_form = AnnouncementForm(
             request.POST if "post_announcement" in request.POST else None,
             profile=userProfile,
@@ -218,16 +260,18 @@ def homepage_view(request, message=None):
     ### Events
     week_from_now = now() + timedelta(days=7)
     # Get only next 7 days of events:
-    events_list = Event.objects.exclude(
+    events_list = list(Event.objects.exclude(
         start_time__gte=week_from_now
     ).exclude(
         end_time__lte=now(),
-    )
+    ).select_related("owner__user", "as_manager"))
+    rsvp_links = get_rsvp_links(events_list)
     # Pseudo-dictionary, list with items of form (event, ongoing, rsvpd, rsvp_form)
     events_dict = list()
     for event in events_list:
         ongoing = ((event.start_time <= now()) and (event.end_time >= now()))
-        rsvpd = (userProfile in event.rsvps.all())
+        rsvpd = is_rsvpd(rsvp_links[event.pk], request.user)
+        event.rsvp_list = build_rsvp_list(rsvp_links[event.pk], request.user)
 
         rsvp_form = RsvpForm(
             request.POST if "rsvp-{0}".format(event.pk) in request.POST else None,
@@ -322,25 +366,61 @@ def my_profile_view(request):
         messages.add_message(request, messages.SUCCESS,
                              "Your profile has been successfully updated.")
         return HttpResponseRedirect(reverse('my_profile'))
+    calendar_url = request.build_absolute_uri(reverse("calendar_feed", kwargs={
+        "targetUsername": request.user.username,
+        "token": get_calendar_token(request.user),
+        }))
     return render_to_response('my_profile.html', {
         'page_name': page_name,
         "update_email_form": update_email_form,
         'update_profile_form': update_profile_form,
         'change_password_form': change_password_form,
+        "calendar_url": calendar_url,
         }, context_instance=RequestContext(request))
 
 @profile_required
 def notifications_view(request):
     """
-    Show a user their notifications.
+    Show a user their notifications, newest first.  Pages hold
+    MAX_NOTIFICATIONS notifications each, and are addressed by the last
+    notification of the page before them.  The notifications shown are marked
+    as read.
     """
     page_name = "Your Notifications"
-    # Copy the notifications so that they are still unread when we render the page
-    notifications = list(request.user.notifications.all())
-    request.user.notifications.mark_all_as_read()
+    notifications = request.user.notifications.all()
+    before = request.GET.get("before", "")
+    if before.isdigit():
+        try:
+            timestamp = notifications.values_list("timestamp", flat=True) \
+              .get(pk=before)
+        except ObjectDoesNotExist:
+            pass
+        else:
+            notifications = notifications.filter(
+                Q(timestamp__lt=timestamp) |
+                Q(timestamp=timestamp, pk__lt=before)
+                )
+    # Generic relations are loaded with one query for each content type
+    notifications = list(
+        notifications.order_by("-timestamp", "-pk")
+        .prefetch_related("actor", "action_object", "target")
+        [:settings.MAX_NOTIFICATIONS + 1]
+        )
+    next_page = None
+    if len(notifications) > settings.MAX_NOTIFICATIONS:
+        notifications = notifications[:settings.MAX_NOTIFICATIONS]
+        next_page = "{0}?before={1}".format(
+            reverse("notifications"), notifications[-1].pk,
+            )
+    # The copies loaded above are still unread when we render the page
+    unread = [notification.pk for notification in notifications
+              if notification.unread]
+    if unread:
+        request.user.notifications.filter(pk__in=unread).update(unread=False)
     return render_to_response("list_notifications.html", {
         "page_name": page_name,
         "notifications": notifications,
+        "next_page": next_page,
         }, context_instance=RequestContext(request))
 
 def login_view(request):
@@ -416,17 +496,30 @@ def logout_view(request):
 
 @profile_required
 def member_directory_view(request):
-    ''' View of member directory. '''
+    '''
+    View of member directory. The tables are cached until a user or profile
+    changes, or for MEMBER_DIRECTORY_CACHE_SECONDS in processes that did not
+    see the change.
+    '''
     page_name = "Member Directory"
-    residents = UserProfile.objects.filter(status=UserProfile.RESIDENT)
-    boarders = UserProfile.objects.filter(status=UserProfile.BOARDER)
-    alumni = UserProfile.objects.filter(status=UserProfile.ALUMNUS) \
-      .exclude(user__username=ANONYMOUS_USERNAME)
+    directory = cache.get(MEMBER_DIRECTORY_CACHE_KEY)
+    if directory is None:
+        profiles = UserProfile.objects.select_related("user")
+        residents = list(profiles.filter(status=UserProfile.RESIDENT))
+        boarders = list(profiles.filter(status=UserProfile.BOARDER))
+        alumni = list(profiles.filter(status=UserProfile.ALUMNUS)
+                      .exclude(user__username=ANONYMOUS_USERNAME))
+        directory = render_to_string("member_directory_tables.html", {
+            'residents': residents,
+            'boarders': boarders,
+            'alumni': alumni,
+            'total': len(residents) + len(boarders) + len(alumni),
+            })
+        cache.set(MEMBER_DIRECTORY_CACHE_KEY, directory,
+                  settings.MEMBER_DIRECTORY_CACHE_SECONDS)
     return render_to_response('member_directory.html', {
         'page_name': page_name,
-        'residents': residents,
-        'boarders': boarders,
-        'alumni': alumni,
+        'directory': mark_safe(directory),
         }, context_instance=RequestContext(request))
 
 @profile_required
@@ -435,20 +528,21 @@ def member_profile_view(request, targetUsername):
     if targetUsername == request.user.username and targetUsername != ANONYMOUS_USERNAME:
         return HttpResponseRedirect(reverse('my_profile'))
     page_name = "{0}'s Profile".format(targetUsername)
-    targetUser = get_object_or_404(User, username=targetUsername)
-    targetProfile = get_object_or_404(UserProfile, user=targetUser)
-    number_of_threads = Thread.objects.filter(owner=targetProfile).count()
-    number_of_messages = Message.objects.filter(owner=targetProfile).count()
-    number_of_requests = Request.objects.filter(owner=targetProfile).count()
+    targetProfile = get_object_or_404(
+        UserProfile.objects.select_related("user"),
+        user__username=targetUsername,
+        )
+    targetUser = targetProfile.user
     rooms = Room.objects.filter(current_residents=targetProfile)
-    prev_rooms = PreviousResident.objects.filter(resident=targetProfile)
+    prev_rooms = PreviousResident.objects.filter(resident=targetProfile) \
+      .select_related("room")
     return render_to_response('member_profile.html', {
         'page_name': page_name,
         'targetUser': targetUser,
         'targetProfile': targetProfile,
-        'number_of_threads': number_of_threads,
-        'number_of_messages': number_of_messages,
-        'number_of_requests': number_of_requests,
+        'number_of_threads': targetProfile.number_of_threads,
+        'number_of_messages': targetProfile.number_of_messages,
+        'number_of_requests': targetProfile.number_of_requests,
         "rooms": rooms,
         "prev_rooms": prev_rooms,
         }, context_instance=RequestContext(request))
@@ -493,11 +587,7 @@ def request_profile_view(request):
                 submission_subject = SUBMISSION_SUBJECT.format(house=settings.HOUSE_NAME)
                 submission_email = SUBMISSION_EMAIL.format(house=settings.HOUSE_NAME, full_name=first_name + " " + last_name, admin_name=settings.ADMINS[0][0],
                     admin_email=settings.ADMINS[0][1])
-                try:
-                    send_mail(submission_subject, submission_email, settings.EMAIL_HOST_USER, [email], fail_silently=False)
-                    # Add logging here
-                except SMTPException:
-                    pass # Add logging here
+                queue_mail(submission_subject, submission_email, to=[email])
             return HttpResponseRedirect(redirect_to)
     return render(request, 'request_profile.html', {
         'form': form,
@@ -532,13 +622,9 @@ def modify_profile_request_view(request, request_pk):
             deletion_subject = DELETION_SUBJECT.format(house=settings.HOUSE_NAME)
             deletion_email = DELETION_EMAIL.format(house=settings.HOUSE_NAME, full_name=profile_request.first_name + " " + profile_request.last_name,
                 admin_name=settings.ADMINS[0][0], admin_email=settings.ADMINS[0][1])
-            try:
-                send_mail(deletion_subject, deletion_email, settings.EMAIL_HOST_USER, [profile_request.email], fail_silently=False)
-                addendum = MESSAGES['PROFILE_REQUEST_DELETION_EMAIL'].format(full_name=profile_request.first_name + ' ' + profile_request.last_name,
-                    email=profile_request.email)
-            except SMTPException as e:
-                message = MESSAGES['EMAIL_FAIL'].format(email=profile_request.email, error=e)
-                messages.add_message(request, messages.ERROR, message)
+            queue_mail(deletion_subject, deletion_email, to=[profile_request.email])
+            addendum = MESSAGES['PROFILE_REQUEST_DELETION_EMAIL'].format(full_name=profile_request.first_name + ' ' + profile_request.last_name,
+                email=profile_request.email)
         profile_request.delete()
         message = MESSAGES['PREQ_DEL'].format(first_name=profile_request.first_name, last_name=profile_request.last_name, username=profile_request.username)
         messages.add_message(request, messages.SUCCESS, message + addendum)
@@ -556,13 +642,9 @@ def modify_profile_request_view(request, request_pk):
             login_url = request.build_absolute_uri(reverse('login'))
             approval_email = APPROVAL_EMAIL.format(house=settings.HOUSE_NAME, full_name=new_user.get_full_name(), admin_name=settings.ADMINS[0][0],
                 admin_email=settings.ADMINS[0][1], login_url=login_url, username_bit=username_bit, request_date=profile_request.request_date)
-            try:
-                send_mail(approval_subject, approval_email, settings.EMAIL_HOST_USER, [new_user.email], fail_silently=False)
-                addendum = MESSAGES['PROFILE_REQUEST_APPROVAL_EMAIL'].format(full_name="{0} {1}".format(new_user.first_name, new_user.last_name),
-                    email=new_user.email)
-            except SMTPException as e:
-                message = MESSAGES['EMAIL_FAIL'].format(email=new_user.email, error=e)
-                messages.add_message(request, messages.ERROR, message)
+            queue_mail(approval_subject, approval_email, to=[new_user.email])
+            addendum = MESSAGES['PROFILE_REQUEST_APPROVAL_EMAIL'].format(full_name="{0} {1}".format(new_user.first_name, new_user.last_name),
+                email=new_user.email)
         message = MESSAGES['USER_ADDED'].format(username=new_user.username)
         messages.add_message(request, messages.SUCCESS, message + addendum)
         return HttpResponseRedirect(reverse('manage_profile_requests'))
@@ -704,6 +786,18 @@ def utilities_view(request):
         'page_name': "Admin - Site Utilities",
         }, context_instance=RequestContext(request))
 
+@admin_required
+def query_profile_view(request):
+    '''
+    View for an admin to see how many queries the latest requests ran, when
+    QUERY_PROFILE is set.
+    '''
+    return render_to_response('query_profile.html', {
+        'page_name': "Admin - Query Profile",
+        'enabled': settings.QUERY_PROFILE,
+        'profiles': recent_profiles(),
+        }, context_instance=RequestContext(request))
+
 def reset_pw_view(request):
     """ View to send an e-mail to reset password. """
     return password_reset(request,
@@ -718,12 +812,30 @@ def reset_pw_confirm_view(request, uidb64=None, token=None):
         template_name="reset_confirmation.html",
         uidb64=uidb64, token=token, post_reset_redirect=reverse('login'))
 
+def _recount_profile_activity():
+    ''' Recount the threads, messages and requests of every profile. '''
+    counts = defaultdict(dict)
+    for model, field in [
+            (Thread, "number_of_threads"),
+            (Message, "number_of_messages"),
+            (Request, "number_of_requests"),
+    ]:
+        for owner_pk, count in model.objects.values_list("owner") \
+          .annotate(count=Count("pk")).order_by():
+            counts[owner_pk][field] = count
+    fields = ("number_of_threads", "number_of_messages", "number_of_requests")
+    for profile in UserProfile.objects.values_list("pk", *fields):
+        values = dict((field, counts[profile[0]].get(field, 0)) for field in fields)
+        if profile[1:] != tuple(values[field] for field in fields):
+            UserProfile.objects.filter(pk=profile[0]).update(**values)
+
 @admin_required
 def recount_view(request):
     """
     Recount number_of_messages for all threads and number_of_responses for all requests.
     Also set the change_date for every thread to the post_date of the latest message
-    associated with that thread.
+    associated with that thread, and recount each profile's activity and the
+    site statistics.
     """
     requests_changed = 0
     for req in Request.objects.all():
@@ -745,6 +857,8 @@ def recount_view(request):
             thread.change_date = thread.message_set.latest('post_date').post_date
             thread.save()
             dates_changed += 1
+    _recount_profile_activity()
+    reconcile()
     messages.add_message(request, messages.SUCCESS, MESSAGES['RECOUNTED'].format(
         requests_changed=requests_changed,
         request_count=Request.objects.all().count(),
@@ -755,10 +869,10 @@ def recount_view(request):
     return HttpResponseRedirect(reverse('utilities'))
 
 def add_archive_context(request):
-    resident_count = UserProfile.objects.filter(status=UserProfile.RESIDENT).count()
-    boarder_count = UserProfile.objects.filter(status=UserProfile.BOARDER).count()
-    alumni_count = UserProfile.objects.filter(status=UserProfile.ALUMNUS) \
-      .exclude(user__username=ANONYMOUS_USERNAME).count()
+    counts = get_counts()
+    resident_count = counts["members.residents"]
+    boarder_count = counts["members.boarders"]
+    alumni_count = counts["members.alumni"]
     member_count = resident_count + boarder_count + alumni_count
     nodes = [
         "{} {}".format(member_count, p.plural("total members", member_count)),
@@ -789,6 +903,14 @@ def archives_view(request):
         "nodes": nodes,
         }, context_instance=RequestContext(request))
 
+@profile_required
+def archives_statistics_view(request):
+    """ The site statistics shown on the archives page, as JSON. """
+    return HttpResponse(
+        json.dumps(get_counts(), sort_keys=True),
+        content_type="application/json",
+        )
+
 def get_updates_view(request):
     """Return a user's updates. AJAX."""
     if not request.is_ajax():
@@ -920,19 +1042,18 @@ def get_updates_view(request):
 
     event_pk_list = request.GET.get('event_pk_list', False)
     if event_pk_list:
-        event_pk_list = event_pk_list.split(',')
-        for event_pk in event_pk_list:
-            try:
-                event = Event.objects.get(pk=event_pk)
-            except Event.DoesNotExist:
-                continue
-
+        event_pk_list = [
+            event_pk for event_pk in event_pk_list.split(',')
+            if event_pk.isdigit()
+        ]
+        events = Event.objects.filter(pk__in=event_pk_list[:500])
+        rsvp_links = get_rsvp_links(events)
+        for event in events:
             link_string = 'rsvp_link_{pk}'.format(pk=event.pk)
             list_string = 'rsvp_list_{pk}'.format(pk=event.pk)
-            response[link_string], response[list_string] = build_ajax_rsvps(
-                event,
-                user_profile
-            )
+            links = rsvp_links[event.pk]
+            response[link_string] = is_rsvpd(links, request.user)
+            response[list_string] = build_rsvp_list(links, request.user)
 
     thread_pk = request.GET.get('thread_pk', False)
     if thread_pk:
@@ -946,3 +1067,32 @@ def get_updates_view(request):
 
     return HttpResponse(json.dumps(response),
                         content_type="application/json")
+
+@profile_required
+def autocomplete_view(request):
+    """ Return the members, threads, workshift types and wiki pages matching a
+    partial search query. JSON. """
+    query = request.GET.get("q", "")
+    return HttpResponse(json.dumps(dict(results=autocomplete(query))),
+                        content_type="application/json")
+
+def calendar_feed_view(request, targetUsername, token):
+    """ iCalendar feed of a member's workshifts and the events they have
+    RSVP'd to. Authenticated by the token in the URL rather than a session,
+    so that calendar clients can subscribe to it. """
+    user = get_object_or_404(User, username=targetUsername)
+    if not check_calendar_token(user, token):
+        raise Http404
+    instances, events = get_feed_items(user)
+    etag, last_modified = get_feed_version(user, instances, events)
+    if is_not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        response = StreamingHttpResponse(
+            iter_calendar(instances, events, last_modified,
+                          request.build_absolute_uri),
+            content_type="text/calendar; charset=utf-8",
+        )
+    response["ETag"] = quote_etag(etag)
+    response["Last-Modified"] = http_date(timestamp(last_modified))
+    return response
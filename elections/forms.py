@@ -9,7 +9,8 @@ from django.forms.models import BaseModelFormSet, modelformset_factory
 
 from elections.models import Petition, PetitionComment, \
     Poll, PollSettings, PollQuestion, PollChoice, \
-    PollAnswer, PollRanks
+    PollAnswer, PollRanks, Ballot
+from elections.tally import pack_ballot
 
 class PetitionForm(forms.ModelForm):
     class Meta:
@@ -57,7 +58,7 @@ class PetitionSignatureForm(forms.Form):
         self.petition.save()
         return self.petition
 
-class PollForm(form.ModelForm):
+class PollForm(forms.ModelForm):
     class Meta:
         model = Poll
         fields = (
@@ -85,7 +86,7 @@ class PollForm(form.ModelForm):
             poll.anonymity_allowed = True
         poll.save()
 
-class PollQuestionForm(models.Model):
+class PollQuestionForm(forms.ModelForm):
     choices = forms.CharField(
         widget=forms.Textarea,
         required=False,
@@ -98,23 +99,23 @@ class PollQuestionForm(models.Model):
 
     def __init__(self, *args, **kwargs):
         super(PollQuestionForm, self).__init__(*args, **kwargs)
-        self.fields['ranger_upper_limit'].required = False
+        self.fields['range_upper_limit'].required = False
         self.fields['write_ins_allowed'].required = False
 
     def is_valid(self):
         if not super(PollQuestionForm, self).is_valid():
             return False
         if self.cleaned_data['question_type'] != PollQuestion.TEXT:
-            if not self.cleaned_data['choice_text']:
+            if not self.cleaned_data['choices']:
                 self._errors['choices'] = self.error_class(
                     [u"No choices entered.  Choices are required for a {0} type question.".format(
-                        dict(self.fields['question_type'].choices)[self.cleaned_data['question_type']
-                        )
+                        dict(self.fields['question_type'].choices)[self.cleaned_data['question_type']]
+                        )]
                     )
                 return False
-            if not self.cleaned_data['choice_text'].endswith('\n'):
-                self.cleaned_data['choice_text'] += '\n'
-            if self.cleaned_data['choice_text'].count('\n') < 2:
+            if not self.cleaned_data['choices'].endswith('\n'):
+                self.cleaned_data['choices'] += '\n'
+            if self.cleaned_data['choices'].count('\n') < 2:
                 self._errors['choices'] = self.error_class(
                     [u"Only one choice entered. Maybe this should be a yes/no question?"]
                     )
@@ -137,13 +138,13 @@ class PollQuestionForm(models.Model):
         if self.cleaned_data['question_type'] in [PollQuestion.CHOICE,
           PollQuestion.RANK, PollQuestion.CHECKBOXES]:
             for choice_string in self.cleaned_data['choices'].split('\n'):
-                choice = Choice(question=question, body=choice_string)
+                choice = PollChoice(question=question, body=choice_string)
                 choice.save()
         return question
 
 class BasePollQuestionFormSet(BaseModelFormSet):
     def save(self, poll):
-        questions = super(BasePollQuestionFormSet, self).save(commit=False):
+        questions = super(BasePollQuestionFormSet, self).save(commit=False)
         for question in questions:
             question.poll = poll
             question.save()
@@ -181,7 +182,7 @@ class QuestionAnswerForm(forms.Form):
         elif self.question.question_type == PollQuestion.RANK:
             for c in PollChoice.objects.filter(question=self.question):
                 self.fields['rank_{0}'.format(c.pk)] = forms.IntegerField(required=False)
-                self.fields['rank_{0}'.format(c.pk)].label = c.name
+                self.fields['rank_{0}'.format(c.pk)].label = c.body
         elif self.question.question_type == PollQuestion.RANGE:
             for c in PollChoice.objects.filter(question=self.question):
                 self.fields['range_{0}'.format(c.pk)] = forms.ChoiceField(
@@ -189,24 +190,22 @@ class QuestionAnswerForm(forms.Form):
                     required=self.question.required,
                     )
 
+    def _cast_ballot(self, pairs):
+        Ballot.objects.update_or_create(
+            question=self.question,
+            owner=self.profile.user,
+            defaults=dict(data=pack_ballot(pairs)),
+            )
+
     def save(self):
         if self.question.question_type == PollQuestion.CHOICE:
-            for c in self.question.poll_choice_set.all():
-                if self.profile.user in c.voters.all():
-                    c.voters.remove(self.profile.user)
-                    c.save()
-            poll_choice = self.cleaned_data['answer']
-            poll_choice.voters.add(self.profile.user)
-            poll_choice.save()
+            self._cast_ballot([(self.cleaned_data['answer'].pk, 1)])
         elif self.question.question_type == PollQuestion.CHECKBOXES:
-            for c in self.question.poll_choice_set.all():
-                if self.profile.user in c.voters.all():
-                    c.voters.remove(self.profile.user)
-                    c.save()
-            for poll_choice in self.cleaned_data['answer']:
-                poll_choice.voters.add(self.profile.user)
-                poll_choice.save()
-        elif self.question.question_type == PollQuestion.TEXT:
+            self._cast_ballot([
+                (poll_choice.pk, 1)
+                for poll_choice in self.cleaned_data['answer']
+                ])
+        elif self.question.question_type == PollQuestion.TEXT \
           and self.cleaned_data['answer']:
             poll_answer = PollAnswer(
                 question=self.question,
@@ -215,19 +214,15 @@ class QuestionAnswerForm(forms.Form):
                 )
             poll_answer.save()
         elif self.question.question_type == PollQuestion.RANK:
-            choice_rankings = [(c, self.cleaned_data['rank_{}'.format(c.pk)]) for c in self.question.poll_choice_set.all()]
+            choice_rankings = [
+                (c, self.cleaned_data['rank_{}'.format(c.pk)])
+                for c in self.question.pollchoice_set.all()
+                if self.cleaned_data['rank_{}'.format(c.pk)] is not None
+                ]
             choice_rankings = PollRanks.normalize_ranking(choice_rankings)
-            poll_ranks = PollRanks(
-                question=self.question,
-                rankings=PollRanks.create_ranking(choice_rankings),
-                owner=self.profile.user,
-                )
-            poll_ranks.save()
+            self._cast_ballot([(c.pk, r) for c, r in choice_rankings])
         elif self.question.question_type == PollQuestion.RANGE:
-            choice_rankings = [(c, self.cleaned_data['rank_{}'.format(c.pk)]) for c in self.question.poll_choice_set.all()]
-            poll_ranks = PollRanks(
-                question=self.question,
-                rankings=PollRanks.create_ranking(choice_rankings),
-                owner=self.profile.user,
-                )
-            poll_ranks.save()
+            self._cast_ballot([
+                (c.pk, self.cleaned_data['range_{}'.format(c.pk)])
+                for c in self.question.pollchoice_set.all()
+                ])
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Petition',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('title', models.CharField(help_text=b'The title for this petition.', max_length=255)),
+                ('description', models.TextField(help_text=b'Description of this petition and what it entails.')),
+                ('post_date', models.DateTimeField(help_text=b'Date this petition was posted.')),
+                ('end_date', models.DateTimeField(help_text=b'Date when this petition ends.')),
+                ('closed', models.BooleanField(default=False, help_text=b'Whether this petition is closed to signatures.')),
+                ('number_or_comments', models.PositiveIntegerField(default=0, help_text=b'Number of comments on this petition.')),
+                ('owner', models.ForeignKey(help_text=b'Person who initiated this petition.', to=settings.AUTH_USER_MODEL)),
+                ('signatures', models.ManyToManyField(help_text=b'Members who have signed onto this petition.', related_name='signatures', null=True, to=settings.AUTH_USER_MODEL, blank=True)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='PetitionComment',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('body', models.TextField(help_text=b'The body of this comment.')),
+                ('post_date', models.DateTimeField(help_text=b'When this comment was posted.')),
+                ('owner', models.ForeignKey(help_text=b'Person who posted this comment.', to=settings.AUTH_USER_MODEL)),
+                ('petition', models.ForeignKey(help_text=b'The corresponding petition.', to='elections.Petition')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='Poll',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('title', models.CharField(help_text=b'The title for this poll.', max_length=255)),
+                ('description', models.TextField(help_text=b'A description for this poll.', null=True, blank=True)),
+                ('post_date', models.DateTimeField(help_text=b'When this poll was posted.')),
+                ('close_date', models.DateTimeField(help_text=b'When this poll closes.')),
+                ('closed', models.BooleanField(default=False, help_text=b'Whether this poll has closed.')),
+                ('anonymity_allowed', models.BooleanField(default=False, help_text=b'Whether anonymity is allowed.')),
+                ('alumni_allowed', models.BooleanField(default=False, help_text=b'Whether alumni are allowed to participate.')),
+                ('election', models.BooleanField(default=False, help_text=b'Treat this poll as a formal election.')),
+                ('voc', models.BooleanField(default=False, help_text=b'Treat this poll as a "Votes of Confidence" election.')),
+                ('owner', models.ForeignKey(help_text=b'Person who posted this poll.', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='PollAnswer',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('body', models.TextField(help_text=b'Text body for this poll answer.')),
+                ('owner', models.ForeignKey(help_text=b'User who posted this answer.', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='PollChoice',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('body', models.CharField(help_text=b'The text body for this choice.', max_length=255)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='PollQuestion',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('body', models.CharField(help_text=b'The body of this question.', max_length=511)),
+                ('question_type', models.CharField(default=b'T', help_text=b'The type of question this is.', max_length=1, choices=[(b'C', b'Multiple Choice, Select One'), (b'B', b'Checkboxes, Select Multiple'), (b'T', b'Text Input'), (b'R', b'Rank Choices in Comparison to Each Other'), (b'G', b'0 to n Range for Each Choice')])),
+                ('range_upper_limit', models.PositiveIntegerField(default=10, help_text=b'Upper limit if this is a range type question.', null=True, blank=True)),
+                ('required', models.BooleanField(default=True, help_text=b'Whether an answer to this question is required.')),
+                ('write_ins_allowed', models.BooleanField(default=False, help_text=b'Whether write-ins are allowed, if this is a multiple choice question.')),
+                ('poll', models.ForeignKey(help_text=b'The corresponding poll.', to='elections.Poll')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='PollRanks',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('rankings', models.CommaSeparatedIntegerField(help_text=b'Rankings for the choices for this question.', max_length=1023)),
+                ('owner', models.ForeignKey(help_text=b'User who posted this ranking.', to=settings.AUTH_USER_MODEL)),
+                ('question', models.ForeignKey(help_text=b'The question being answered.', to='elections.PollQuestion')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='PollSettings',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('anonymous', models.BooleanField(default=False, help_text=b'Whether this user decided to be anonymous for this poll.')),
+                ('complete_date', models.DateTimeField(help_text=b'When this user finished the poll.', auto_now_add=True)),
+                ('updated', models.DateTimeField(help_text=b'When this user last updated her/his input for this poll.', auto_now=True, auto_now_add=True)),
+                ('owner', models.ForeignKey(help_text=b'The user whose settings these are.', to=settings.AUTH_USER_MODEL)),
+                ('poll', models.ForeignKey(help_text=b'The relevant poll.', to='elections.Poll')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AddField(
+            model_name='pollchoice',
+            name='question',
+            field=models.ForeignKey(help_text=b'The corresponding question.', to='elections.PollQuestion'),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='pollchoice',
+            name='voters',
+            field=models.ManyToManyField(help_text=b'Those who have voted for this choice.', to=settings.AUTH_USER_MODEL, null=True, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='pollanswer',
+            name='question',
+            field=models.ForeignKey(help_text=b'The question being answered.', to='elections.PollQuestion'),
+            preserve_default=True,
+        ),
+    ]
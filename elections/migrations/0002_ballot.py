@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('elections', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ballot',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('data', models.BinaryField(help_text=b'Packed (choice, value) pairs for this ballot.')),
+                ('cast_date', models.DateTimeField(help_text=b'When this ballot was last cast.', auto_now=True)),
+                ('owner', models.ForeignKey(help_text=b'User who cast this ballot.', to=settings.AUTH_USER_MODEL)),
+                ('question', models.ForeignKey(help_text=b'The question being answered.', to='elections.PollQuestion')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ballot',
+            unique_together=set([('question', 'owner')]),
+        ),
+    ]
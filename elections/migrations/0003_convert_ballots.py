@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db import models, migrations
+
+from elections.tally import pack_ballot
+
+
+def convert_ballots(apps, schema_editor):
+    '''
+    Copies PollRanks rankings, and PollChoice votes for CHOICE and CHECKBOXES
+    questions, into Ballot rows.
+    '''
+    Ballot = apps.get_model("elections", "Ballot")
+    PollChoice = apps.get_model("elections", "PollChoice")
+    PollRanks = apps.get_model("elections", "PollRanks")
+
+    choice_pks = defaultdict(list)
+    for pk, question_pk in PollChoice.objects.order_by("pk") \
+      .values_list("pk", "question"):
+        choice_pks[question_pk].append(pk)
+
+    # Rankings were saved anew each time they were changed, keep the latest
+    ballots = {}
+    for question_pk, owner_pk, rankings in PollRanks.objects.order_by("pk") \
+      .values_list("question", "owner", "rankings"):
+        ballots[question_pk, owner_pk] = [
+            (pk, int(value))
+            for pk, value in zip(choice_pks[question_pk], rankings.split(","))
+            if value.strip()
+        ]
+
+    for choice_pk, question_pk, owner_pk in \
+      PollChoice.voters.through.objects.values_list(
+          "pollchoice", "pollchoice__question", "user"):
+        ballots.setdefault((question_pk, owner_pk), []).append((choice_pk, 1))
+
+    Ballot.objects.bulk_create([
+        Ballot(question_id=question_pk, owner_id=owner_pk,
+               data=pack_ballot(pairs))
+        for (question_pk, owner_pk), pairs in ballots.items()
+    ], batch_size=500)
+
+
+def delete_ballots(apps, schema_editor):
+    apps.get_model("elections", "Ballot").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0002_ballot'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_ballots, delete_ballots),
+    ]
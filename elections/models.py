@@ -5,9 +5,13 @@ Authors: Karandeep Singh Nagra and Nader Morshed
 """
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from managers.models import Manager
+from elections.tally import pack_ballot, tally_cache_key, unpack_ballot
 
 class Petition(models.Model):
     """ Petition model. """
@@ -230,6 +234,10 @@ class PollQuestion(models.Model):
     def is_poll_question(self):
         return True
 
+    def has_answered(self, user):
+        """ Whether user has cast a ballot for this question. """
+        return Ballot.objects.filter(question=self, owner=user).exists()
+
 class PollChoice(models.Model):
     """ A possible choice to a CHOICE or CHECKBOXES type question. """
     question = models.ForeignKey(
@@ -293,7 +301,7 @@ class PollRanks(models.Model):
     with integer position in the list representing
     the relative primary key of the question choices.
     
-    This class's rankings property returns a list of
+    This class's get_rankings method returns a list of
     tuples of form (choice, ranking) for the user who
     submitted this ranking.
     
@@ -328,11 +336,18 @@ class PollRanks(models.Model):
     def __unicode__(self):
         return self.owner
 
-    @property
-    def rankings(self):
-        rankings_list = [int(s) for x in self.rankings.split(',')]
-        return [(choice, rankings_list.pop(0)) for choice in self.question.choice_set.order_by('pk')]
+    def get_rankings(self):
+        rankings_list = self.rankings.split(',')
+        return [
+            (choice, int(ranking))
+            for choice, ranking in zip(
+                self.question.pollchoice_set.order_by('pk'),
+                rankings_list,
+                )
+            if ranking.strip()
+            ]
 
+    @staticmethod
     def create_ranking(ranking_tuples):
         """
         Create and return a string suitable for the rankings
@@ -345,6 +360,7 @@ class PollRanks(models.Model):
                 key=lambda x: x[0].pk
                 )])
 
+    @staticmethod
     def normalize_ranking(ranking_tuples):
         """
         Normalize rankings by reducing them to the simplest
@@ -357,13 +373,64 @@ class PollRanks(models.Model):
         Return a list of tuples of form (choice, ranking), with
         the ranking normalized.
         """
-        ranking_tuples = sorted(ranking_tuples, key=lambda x: x[1])
-        normalized = [(ranking_tuples.pop(0)[0], 0)]
-        while ranking_tuples:
-            current = ranking_tuples.pop(0)
-            normalized.append((
-                current[0],
-                normalized[-1][1] if current[1] == normalized[-1][1] \
-                    else normalized[-1][1] + 1,
-                ))
+        normalized = []
+        for choice, ranking in sorted(ranking_tuples, key=lambda x: x[1]):
+            if not normalized:
+                level = 0
+            elif ranking != previous:
+                level += 1
+            previous = ranking
+            normalized.append((choice, level))
         return normalized
+
+class Ballot(models.Model):
+    """
+    A member's answer to a CHOICE, CHECKBOXES, RANK or RANGE type question.
+    The answer is a packed array of (choice primary key, value) pairs, see
+    elections.tally.pack_ballot. For RANK and RANGE questions the value is
+    the choice's ranking or score, with choices left unranked omitted; for
+    CHOICE and CHECKBOXES questions the selected choices have a value of 1.
+    """
+    question = models.ForeignKey(
+        PollQuestion,
+        null=False,
+        blank=False,
+        help_text="The question being answered."
+        )
+    owner = models.ForeignKey(
+        User,
+        null=False,
+        blank=False,
+        help_text="User who cast this ballot."
+        )
+    data = models.BinaryField(
+        help_text="Packed (choice, value) pairs for this ballot."
+        )
+    cast_date = models.DateTimeField(
+        auto_now=True,
+        help_text="When this ballot was last cast."
+        )
+
+    class Meta:
+        unique_together = ("question", "owner")
+
+    def __str__(self):
+        return self.__unicode__()
+
+    def __unicode__(self):
+        return "{0} ballot".format(self.owner)
+
+    def get_pairs(self):
+        """ The (choice pk, value) pairs of this ballot, by choice pk. """
+        return unpack_ballot(self.data)
+
+    def set_pairs(self, pairs):
+        self.data = pack_ballot(pairs)
+
+@receiver(post_save, sender=Ballot)
+@receiver(post_delete, sender=Ballot)
+@receiver(post_delete, sender=PollRanks)
+@receiver(post_save, sender=PollChoice)
+@receiver(post_delete, sender=PollChoice)
+def invalidate_tally(sender, instance, **kwargs):
+    cache.delete(tally_cache_key(instance.question_id))
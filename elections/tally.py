@@ -0,0 +1,315 @@
+"""
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+Tallying of RANK and RANGE poll questions. All of a question's ballots are
+loaded in one query and parsed into a matrix with a row for each ballot and a
+column for each choice, from which instant-runoff, Borda and range results
+are computed. NumPy is used for the matrix when it is installed; otherwise the
+same results are computed with plain lists.
+
+Ballots are stored in the Ballot table as packed arrays of (choice primary key,
+value) pairs, see pack_ballot. A higher value on a ballot indicates a
+preference over a lower one. A choice missing from a ballot was not ranked on
+it.
+"""
+
+from __future__ import absolute_import, division
+
+from bisect import bisect_left
+import random
+import struct
+from time import time
+
+from django.core.cache import cache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+UNRANKED = float("-inf")
+
+# Rows of the ballot matrix compared at a time for Borda counts, which compare
+# every pair of choices on each ballot
+BORDA_CHUNK_SIZE = 1000
+
+
+# Each pair is a big-endian signed 32 bit choice pk and value
+PAIR = struct.Struct(">ii")
+
+
+def tally_cache_key(question_pk):
+    return "poll_tally_{0}".format(question_pk)
+
+
+def pack_ballot(pairs):
+    """ Packs (choice pk, value) pairs into bytes for Ballot.data. """
+    pairs = sorted((int(pk), int(value)) for pk, value in pairs)
+    return struct.pack(
+        ">{0}i".format(2 * len(pairs)),
+        *[number for pair in pairs for number in pair]
+    )
+
+
+def unpack_ballot(data):
+    data = bytes(data)
+    return [
+        PAIR.unpack_from(data, offset)
+        for offset in range(0, len(data), PAIR.size)
+    ]
+
+
+def parse_ballots(rankings, choice_count):
+    """
+    Parses PollRanks.rankings strings into rows of choice_count floats. Values
+    past the last choice are dropped, and choices added after a ballot was
+    cast are unranked on it.
+    """
+    rows = []
+    for ranking in rankings:
+        values = ranking.split(",")[:choice_count]
+        row = [float(value) if value.strip() else UNRANKED for value in values]
+        row.extend([UNRANKED] * (choice_count - len(row)))
+        rows.append(row)
+    if numpy is not None:
+        return numpy.array(rows, dtype=float).reshape(len(rows), choice_count)
+    return rows
+
+
+def parse_packed(ballots, choice_pks):
+    """
+    Parses packed Ballot.data values into rows with a column for each of
+    choice_pks, which must be in ascending order. Pairs for other choices are
+    ignored.
+    """
+    choice_count = len(choice_pks)
+    if numpy is not None:
+        datas, lengths = [], []
+        for data in ballots:
+            data = bytes(data)
+            datas.append(data)
+            lengths.append(len(data) // PAIR.size)
+        matrix = numpy.full((len(lengths), choice_count), UNRANKED)
+        if not choice_count:
+            return matrix
+        pairs = numpy.frombuffer(b"".join(datas), dtype=">i4").reshape(-1, 2)
+        rows = numpy.repeat(numpy.arange(len(lengths)), lengths)
+        pks = numpy.array(choice_pks)
+        columns = numpy.searchsorted(pks, pairs[:, 0]).clip(max=choice_count - 1)
+        known = pks[columns] == pairs[:, 0]
+        matrix[rows[known], columns[known]] = pairs[known, 1]
+        return matrix
+    columns = dict((pk, column) for column, pk in enumerate(choice_pks))
+    rows = []
+    for data in ballots:
+        row = [UNRANKED] * choice_count
+        for pk, value in unpack_ballot(data):
+            if pk in columns:
+                row[columns[pk]] = float(value)
+        rows.append(row)
+    return rows
+
+
+def _close(a, b):
+    return abs(a - b) <= 1e-9 * max(1, abs(a), abs(b))
+
+
+def _instant_runoff_numpy(matrix):
+    remaining = numpy.ones(matrix.shape[1], dtype=bool)
+    rounds = []
+    while True:
+        scores = numpy.where(remaining, matrix, UNRANKED)
+        best = scores.max(axis=1)[:, None]
+        # A ballot's vote is split between the choices it ranks equally first
+        top = (scores == best) & (best > UNRANKED)
+        counts = (top / top.sum(axis=1, keepdims=True).clip(min=1)).sum(axis=0)
+        rounds.append(counts.tolist())
+
+        leader = counts[remaining].max()
+        if leader * 2 > counts.sum():
+            return rounds, numpy.flatnonzero(
+                remaining & numpy.isclose(counts, leader)
+            ).tolist()
+        lowest = remaining & numpy.isclose(counts, counts[remaining].min())
+        if (lowest == remaining).all():
+            return rounds, numpy.flatnonzero(remaining).tolist()
+        remaining &= ~lowest
+
+
+def _instant_runoff_python(rows, choice_count):
+    remaining = set(range(choice_count))
+    rounds = []
+    while True:
+        counts = [0.0] * choice_count
+        for row in rows:
+            best = max(row[i] for i in remaining)
+            if best == UNRANKED:
+                continue
+            top = [i for i in remaining if row[i] == best]
+            for i in top:
+                counts[i] += 1 / len(top)
+        rounds.append(counts)
+
+        leader = max(counts[i] for i in remaining)
+        if leader * 2 > sum(counts):
+            return rounds, sorted(
+                i for i in remaining if _close(counts[i], leader)
+            )
+        lowest_count = min(counts[i] for i in remaining)
+        lowest = set(i for i in remaining if _close(counts[i], lowest_count))
+        if lowest == remaining:
+            return rounds, sorted(remaining)
+        remaining -= lowest
+
+
+def instant_runoff(matrix, choice_count):
+    """
+    Returns the first choice counts of each round, and the columns of the
+    winners. The choices with the fewest votes are eliminated each round until
+    one has a majority of the ballots that still rank a remaining choice. If
+    all the remaining choices are tied, they all win.
+    """
+    if numpy is not None:
+        return _instant_runoff_numpy(matrix)
+    return _instant_runoff_python(matrix, choice_count)
+
+
+def borda(matrix, choice_count):
+    """
+    Each choice scores a point for every choice it is ranked above on a ballot.
+    Unranked choices are ranked below every ranked choice.
+    """
+    if numpy is not None:
+        points = numpy.zeros(choice_count)
+        for start in range(0, len(matrix), BORDA_CHUNK_SIZE):
+            chunk = matrix[start:start + BORDA_CHUNK_SIZE]
+            points += (chunk[:, :, None] > chunk[:, None, :]).sum(axis=(0, 2))
+        return points.tolist()
+    points = [0.0] * choice_count
+    for row in matrix:
+        ordered = sorted(row)
+        for i, value in enumerate(row):
+            # The number of values strictly below this one
+            points[i] += bisect_left(ordered, value)
+    return points
+
+
+def range_scores(matrix, choice_count):
+    """
+    Returns the total and the mean score of each choice, over the ballots that
+    scored it.
+    """
+    if numpy is not None:
+        scored = matrix > UNRANKED
+        totals = numpy.where(scored, matrix, 0).sum(axis=0)
+        counts = scored.sum(axis=0)
+        means = numpy.where(counts, totals / counts.clip(min=1), 0)
+        return totals.tolist(), means.tolist()
+    totals, counts = [0.0] * choice_count, [0] * choice_count
+    for row in matrix:
+        for i, value in enumerate(row):
+            if value > UNRANKED:
+                totals[i] += value
+                counts[i] += 1
+    means = [
+        total / count if count else 0.0
+        for total, count in zip(totals, counts)
+    ]
+    return totals, means
+
+
+def tally(rankings, choice_pks):
+    """
+    Tallies ballots given as PollRanks.rankings strings, for the choices with
+    choice_pks in primary key order.
+    """
+    return tally_matrix(parse_ballots(rankings, len(choice_pks)), choice_pks)
+
+
+def tally_matrix(matrix, choice_pks):
+    """
+    Tallies a matrix of ballots, with a column for each of choice_pks. Results
+    are listed in the same order as choice_pks.
+    """
+    choice_count = len(choice_pks)
+    result = dict(choices=list(choice_pks), ballots=len(matrix))
+    if not choice_count:
+        result.update(
+            instant_runoff=dict(rounds=[], winners=[]),
+            borda=[],
+            range=dict(totals=[], means=[]),
+        )
+        return result
+    rounds, winners = instant_runoff(matrix, choice_count)
+    totals, means = range_scores(matrix, choice_count)
+    result.update(
+        instant_runoff=dict(
+            rounds=rounds,
+            winners=[choice_pks[i] for i in winners],
+        ),
+        borda=borda(matrix, choice_count),
+        range=dict(totals=totals, means=means),
+    )
+    return result
+
+
+def tally_question(question):
+    """
+    The tally of a question's ballots, cached until one of them, or one of the
+    question's choices, changes.
+    """
+    from elections.models import Ballot, PollChoice
+
+    key = tally_cache_key(question.pk)
+    result = cache.get(key)
+    if result is None:
+        choice_pks = list(
+            PollChoice.objects.filter(question=question)
+            .order_by("pk").values_list("pk", flat=True)
+        )
+        ballots = Ballot.objects.filter(question=question) \
+          .values_list("data", flat=True).iterator()
+        result = tally_matrix(parse_packed(ballots, choice_pks), choice_pks)
+        cache.set(key, result, None)
+    return result
+
+
+def synthetic_rankings(ballots, choices, seed=0):
+    """
+    Random ballots ranking every choice, with choice 0 placed first on a third
+    of them so that it wins under every method.
+    """
+    generator = random.Random(seed)
+    rankings = []
+    for number in range(ballots):
+        values = list(range(choices))
+        generator.shuffle(values)
+        if number % 3 == 0:
+            first = values.index(choices - 1)
+            values[0], values[first] = values[first], values[0]
+        rankings.append(",".join(str(value) for value in values))
+    return rankings
+
+
+def benchmark(ballots=10000, choices=8, seed=0):
+    """
+    Tallies synthetic ballots and returns the result with the seconds taken by
+    each step.
+    """
+    rankings = synthetic_rankings(ballots, choices, seed)
+    timings = []
+    start = time()
+    matrix = parse_ballots(rankings, choices)
+    timings.append(("parse", time() - start))
+    result = {}
+    for name, method in [
+            ("instant_runoff", instant_runoff),
+            ("borda", borda),
+            ("range", range_scores),
+    ]:
+        start = time()
+        result[name] = method(matrix, choices)
+        timings.append((name, time() - start))
+    return result, timings
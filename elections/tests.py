@@ -4,6 +4,251 @@ Project: Farnsworth
 Authors: Karandeep Singh Nagra and Nader Morshed
 """
 
+from unittest import skipIf
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.utils.timezone import now
+
+from base.models import UserProfile
+from elections import tally
+from elections.forms import QuestionAnswerForm
+from elections.models import Ballot, Poll, PollAnswer, PollChoice, \
+    PollQuestion, PollRanks
+
+# 4 ballots prefer A > B > C, 3 prefer B > C > A and 2 prefer C > B > A
+RANKINGS = ["2,1,0"] * 4 + ["0,2,1"] * 3 + ["0,1,2"] * 2
+
+
+def _both(function, *args):
+    ''' Returns function's result with and without NumPy. '''
+    results = [function(*args)]
+    numpy, tally.numpy = tally.numpy, None
+    try:
+        results.append(function(*args))
+    finally:
+        tally.numpy = numpy
+    return results
+
+
+class TestTally(TestCase):
+    def test_parse(self):
+        for matrix in _both(tally.parse_ballots, ["1,,3,4", "2"], 3):
+            self.assertEqual(
+                [[1, tally.UNRANKED, 3], [2, tally.UNRANKED, tally.UNRANKED]],
+                [list(row) for row in matrix],
+            )
+
+    def test_tally(self):
+        for result in _both(tally.tally, RANKINGS, [10, 20, 30]):
+            self.assertEqual(9, result["ballots"])
+            self.assertEqual(
+                [[4, 3, 2], [4, 5, 0]],
+                result["instant_runoff"]["rounds"],
+            )
+            self.assertEqual([20], result["instant_runoff"]["winners"])
+            self.assertEqual([8, 12, 7], result["borda"])
+            self.assertEqual([8, 12, 7], result["range"]["totals"])
+            self.assertAlmostEqual(12 / 9.0, result["range"]["means"][1])
+
+    def test_ties_and_unranked(self):
+        rankings = ["1,0", "0,1", ",", "3,"]
+        for result in _both(tally.tally, rankings, [1, 2]):
+            # The empty ballot does not count towards a majority
+            self.assertEqual([[2, 1]], result["instant_runoff"]["rounds"])
+            self.assertEqual([1], result["instant_runoff"]["winners"])
+            self.assertEqual([2, 1], result["borda"])
+            self.assertAlmostEqual(4 / 3.0, result["range"]["means"][0])
+            self.assertEqual(0.5, result["range"]["means"][1])
+
+        for result in _both(tally.tally, ["1,1,0", "0,1,1"], [1, 2, 3]):
+            self.assertEqual(
+                [[0.5, 1, 0.5], [0, 2, 0]],
+                result["instant_runoff"]["rounds"],
+            )
+            self.assertEqual([2], result["instant_runoff"]["winners"])
+
+        for result in _both(tally.tally, ["1,0", "0,1"], [1, 2]):
+            self.assertEqual([1, 2], result["instant_runoff"]["winners"])
+
+        for result in _both(tally.tally, [], [1, 2]):
+            self.assertEqual([1, 2], result["instant_runoff"]["winners"])
+            self.assertEqual([0, 0], result["range"]["means"])
+
+    @skipIf(tally.numpy is None, "NumPy is not installed")
+    def test_backends_agree(self):
+        rankings = tally.synthetic_rankings(500, 6, seed=1)
+        with_numpy, without_numpy = _both(
+            tally.tally, rankings, list(range(6)),
+        )
+        self.assertEqual(with_numpy, without_numpy)
+
+    def test_benchmark(self):
+        result, timings = tally.benchmark(ballots=10000, choices=8)
+        self.assertEqual(
+            ["parse", "instant_runoff", "borda", "range"],
+            [name for name, _ in timings],
+        )
+        self.assertEqual([0], result["instant_runoff"][1])
+        points = result["borda"]
+        self.assertEqual(0, points.index(max(points)))
+        means = result["range"][1]
+        self.assertEqual(0, means.index(max(means)))
+
+    def test_normalize_ranking(self):
+        choices = [PollChoice(pk=pk) for pk in range(1, 5)]
+        normalized = PollRanks.normalize_ranking(
+            zip(choices, [4, -244, 4, 7]),
+        )
+        self.assertEqual(
+            [(choices[1], 0), (choices[0], 1), (choices[2], 1),
+             (choices[3], 2)],
+            normalized,
+        )
+        self.assertEqual(
+            "1,0,1,2",
+            PollRanks.create_ranking(reversed(normalized)),
+        )
+        self.assertEqual([], PollRanks.normalize_ranking([]))
+
+class TestBallots(TestCase):
+    def test_pack(self):
+        data = tally.pack_ballot([(12, 3), (4, -1), (7, 0)])
+        self.assertEqual(24, len(data))
+        self.assertEqual([(4, -1), (7, 0), (12, 3)], tally.unpack_ballot(data))
+        self.assertEqual([], tally.unpack_ballot(tally.pack_ballot([])))
+
+    def test_parse_packed(self):
+        ballots = [
+            tally.pack_ballot([(10, 2), (20, 1), (30, 0)]),
+            tally.pack_ballot([(30, 5), (99, 1)]),
+            tally.pack_ballot([]),
+            ]
+        for matrix in _both(tally.parse_packed, ballots, [10, 20, 30]):
+            self.assertEqual(
+                [[2, 1, 0],
+                 [tally.UNRANKED, tally.UNRANKED, 5],
+                 [tally.UNRANKED] * 3],
+                [list(row) for row in matrix],
+                )
+        for matrix in _both(tally.parse_packed, ballots, []):
+            self.assertEqual(3, len(matrix))
+
+    def test_tally_packed(self):
+        choice_pks = [10, 20, 30]
+        ballots = [
+            tally.pack_ballot(zip(choice_pks, map(int, ranking.split(","))))
+            for ranking in RANKINGS
+            ]
+        self.assertEqual(
+            tally.tally(RANKINGS, choice_pks),
+            tally.tally_matrix(
+                tally.parse_packed(ballots, choice_pks), choice_pks,
+                ),
+            )
+
+class TestQuestionAnswerForm(TestCase):
+    def setUp(self):
+        # elections is not in INSTALLED_APPS, so its tables are created here
+        # and rolled back with the rest of the test
+        with connection.schema_editor() as editor:
+            for model in [Poll, PollQuestion, PollChoice, PollAnswer, Ballot]:
+                editor.create_model(model)
+
+        self.u = User.objects.create_user(username="u", password="pwd")
+        self.ou = User.objects.create_user(username="ou", password="pwd")
+        self.profile = UserProfile.objects.get(user=self.u)
+        self.oprofile = UserProfile.objects.get(user=self.ou)
+        self.poll = Poll.objects.create(
+            title="Poll", owner=self.u, post_date=now(), close_date=now(),
+            )
+
+    def _question(self, question_type, choices=3):
+        question = PollQuestion.objects.create(
+            poll=self.poll, body="Question", question_type=question_type,
+            range_upper_limit=5,
+            )
+        return question, [
+            PollChoice.objects.create(question=question, body=str(number))
+            for number in range(choices)
+            ]
+
+    def _answer(self, profile, question, data):
+        form = QuestionAnswerForm(data, profile=profile, question=question)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+    def test_choice(self):
+        question, (a, b, c) = self._question(PollQuestion.CHOICE)
+        self._answer(self.profile, question, {"answer": a.pk})
+        self._answer(self.oprofile, question, {"answer": b.pk})
+        # Answering again replaces the first ballot
+        self._answer(self.profile, question, {"answer": b.pk})
+
+        ballot = Ballot.objects.get(question=question, owner=self.u)
+        self.assertEqual([(b.pk, 1)], ballot.get_pairs())
+        self.assertEqual(2, Ballot.objects.filter(question=question).count())
+        self.assertTrue(question.has_answered(self.u))
+        self.assertEqual([0, 2, 0], tally.tally_question(question)["range"]["totals"])
+
+    def test_checkboxes(self):
+        question, (a, b, c) = self._question(PollQuestion.CHECKBOXES)
+        self._answer(self.profile, question, {"answer": [a.pk, c.pk]})
+        self._answer(self.oprofile, question, {"answer": [c.pk]})
+
+        self.assertEqual(
+            [(a.pk, 1), (c.pk, 1)],
+            Ballot.objects.get(question=question, owner=self.u).get_pairs(),
+            )
+        self.assertEqual([1, 0, 2], tally.tally_question(question)["range"]["totals"])
+
+    def test_text(self):
+        question, _ = self._question(PollQuestion.TEXT, choices=0)
+        self._answer(self.profile, question, {"answer": "An answer"})
+
+        self.assertEqual(
+            ["An answer"],
+            [answer.body for answer in PollAnswer.objects.filter(question=question)],
+            )
+        self.assertFalse(Ballot.objects.filter(question=question).exists())
+
+    def test_rank(self):
+        question, (a, b, c) = self._question(PollQuestion.RANK)
+        # Ranks are normalized and unranked choices are left off the ballot
+        self._answer(self.profile, question, {
+            "rank_{0}".format(a.pk): 10,
+            "rank_{0}".format(b.pk): -4,
+            })
+        self._answer(self.oprofile, question, {
+            "rank_{0}".format(a.pk): 1,
+            "rank_{0}".format(b.pk): 2,
+            "rank_{0}".format(c.pk): 3,
+            })
+
+        self.assertEqual(
+            [(a.pk, 1), (b.pk, 0)],
+            Ballot.objects.get(question=question, owner=self.u).get_pairs(),
+            )
+        result = tally.tally_question(question)
+        self.assertEqual(2, result["ballots"])
+        self.assertEqual([1, 1, 2], result["range"]["totals"])
 
+    def test_range(self):
+        question, (a, b, c) = self._question(PollQuestion.RANGE)
+        self._answer(self.profile, question, {
+            "range_{0}".format(a.pk): 4,
+            "range_{0}".format(b.pk): 0,
+            "range_{0}".format(c.pk): 2,
+            })
+        self._answer(self.oprofile, question, {
+            "range_{0}".format(a.pk): 1,
+            "range_{0}".format(b.pk): 3,
+            "range_{0}".format(c.pk): 2,
+            })
 
+        self.assertEqual(
+            [(a.pk, 4), (b.pk, 0), (c.pk, 2)],
+            Ballot.objects.get(question=question, owner=self.u).get_pairs(),
+            )
+        self.assertEqual([5, 3, 4], tally.tally_question(question)["range"]["totals"])
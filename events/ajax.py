@@ -6,32 +6,84 @@ Authors: Karandeep Singh Nagra and Nader Morshed
 AJAX utilities for the events package.
 """
 
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from utils.variables import ANONYMOUS_USERNAME
+
+RSVP_LINK = u'<a class="page_link" title="View Profile" href="{0}">{1}</a>'
+
+
+def rsvp_cache_key(event_pk):
+    return "event_rsvps_{0}".format(event_pk)
+
+
+def _rsvp_link(username, name):
+    return format_html(
+        RSVP_LINK,
+        reverse('member_profile', kwargs={'targetUsername': username}),
+        name,
+    )
+
+
+def get_rsvp_links(events):
+    """
+    Returns a dictionary from each event's pk to the (username, link) pairs of
+    its attendees, where link is the HTML of a link to their profile. The lists
+    are cached until the event's RSVPs change; those that are not are loaded
+    together in one query.
+    """
+    from events.models import Event
+
+    keys = dict((rsvp_cache_key(event.pk), event.pk) for event in events)
+    cached = cache.get_many(keys.keys())
+    links = dict((keys[key], value) for key, value in cached.items())
+    missing = [pk for key, pk in keys.items() if key not in cached]
+    if missing:
+        loaded = dict((pk, []) for pk in missing)
+        rsvps = Event.rsvps.through.objects.filter(
+            event__in=missing,
+        ).select_related("userprofile__user").order_by("pk")
+        for rsvp in rsvps:
+            user = rsvp.userprofile.user
+            loaded[rsvp.event_id].append(
+                (user.username, _rsvp_link(user.username, user.get_full_name()))
+            )
+        cache.set_many(
+            dict((rsvp_cache_key(pk), value) for pk, value in loaded.items()),
+            None,
+        )
+        links.update(loaded)
+    return links
+
+
+def invalidate_rsvps(event_pks):
+    cache.delete_many([rsvp_cache_key(pk) for pk in event_pks])
+
+
+def build_rsvp_list(links, user):
+    """
+    The HTML of an event's attendee list, from its get_rsvp_links entry, as
+    seen by user.
+    """
+    if not links:
+        return 'No RSVPs.'
+    return mark_safe('RSVPs: ' + ', '.join(
+        _rsvp_link(username, 'You')
+        if username == user.username and username != ANONYMOUS_USERNAME
+        else link
+        for username, link in links
+    ))
+
+
+def is_rsvpd(links, user):
+    return any(username == user.username for username, _ in links)
 
 
 def build_ajax_rsvps(event, user_profile):
     """Return link and list strings for a given event."""
-    if user_profile in event.rsvps.all():
-        link_string = True
-    else:
-        link_string = False
-
-    if not event.rsvps.all().count():
-        list_string = 'No RSVPs.'
-    else:
-        list_string = 'RSVPs:'
-        for counter, profile in enumerate(event.rsvps.all()):
-            if counter > 0:
-                list_string += ','
-
-            list_string += \
-                ' <a class="page_link" title="View Profile" href="{url}">' \
-                    '{name}</a>'.format(
-                        url=reverse(
-                            'member_profile',
-                            kwargs={'targetUsername': profile.user.username}
-                        ),
-                        name='You' if profile.user == user_profile.user \
-                            else profile.user.get_full_name(),
-                    )
-    return (link_string, list_string)
+    links = get_rsvp_links([event])[event.pk]
+    user = user_profile.user
+    return (is_rsvpd(links, user), build_rsvp_list(links, user))
@@ -8,7 +8,7 @@ from django import forms
 from django.conf import settings
 from django.utils.timezone import now
 
-from notifications import notify
+from base.fanout import notify_many
 
 from utils.variables import time_formats, ANONYMOUS_USERNAME, MESSAGES
 from managers.models import Manager
@@ -124,11 +124,15 @@ class EventForm(forms.Form):
             event.as_manager = None
         event.save()
 
-        for profile in event.rsvps.all():
-            if profile.user == self.profile.user:
-                continue
-            notify.send(self.profile.user, verb="updated", action=event,
-                        recipient=profile.user)
+        notify_many(
+            self.profile.user,
+            [
+                profile.user
+                for profile in event.rsvps.exclude(pk=self.profile.pk)
+                .select_related("user")
+            ],
+            verb="updated", action_object=event,
+            )
         return event
 
 class RsvpForm(forms.Form):
@@ -144,7 +148,7 @@ class RsvpForm(forms.Form):
         return self.cleaned_data
 
     def save(self):
-        if self.profile in self.instance.rsvps.all():
+        if self.instance.rsvps.filter(pk=self.profile.pk).exists():
             self.instance.rsvps.remove(self.profile)
             rsvpd = False
         else:
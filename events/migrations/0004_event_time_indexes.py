@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_auto_20141123_1011'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='end_time',
+            field=models.DateTimeField(help_text=b'When this event ends.', db_index=True),
+            preserve_default=True,
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='start_time',
+            field=models.DateTimeField(help_text=b'When this event starts.', db_index=True),
+            preserve_default=True,
+        ),
+    ]
@@ -4,8 +4,14 @@ Project: Farnsworth
 Author: Karandeep Singh Nagra
 '''
 
+from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from base import counters
 from base.models import UserProfile
+from events.ajax import invalidate_rsvps
 from managers.models import Manager
 
 class Event(models.Model):
@@ -37,11 +43,13 @@ class Event(models.Model):
     start_time = models.DateTimeField(
         blank=False,
         null=False,
+        db_index=True,
         help_text="When this event starts.",
         )
     end_time = models.DateTimeField(
         blank=False,
         null=False,
+        db_index=True,
         help_text="When this event ends.",
         )
     post_date = models.DateTimeField(
@@ -85,3 +93,33 @@ class Event(models.Model):
 
     def is_event(self):
         return True
+
+@receiver(m2m_changed, sender=Event.rsvps.through)
+def invalidate_event_rsvps(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        invalidate_rsvps([instance.pk])
+    elif pk_set is not None:
+        invalidate_rsvps(pk_set)
+    else:
+        invalidate_rsvps(instance.rsvps.values_list("pk", flat=True))
+
+@receiver(post_delete, sender=Event)
+def invalidate_deleted_event_rsvps(sender, instance, **kwargs):
+    # The database may give a later event the same pk
+    invalidate_rsvps([instance.pk])
+
+@receiver(post_save, sender=User)
+def invalidate_user_rsvps(sender, instance, **kwargs):
+    # Attendee lists show members' full names
+    update_fields = kwargs.get("update_fields")
+    if kwargs.get("raw") or (update_fields is not None and
+                             not {"first_name", "last_name"} & update_fields):
+        return
+    invalidate_rsvps(
+        Event.objects.filter(rsvps__user=instance).values_list("pk", flat=True)
+    )
+
+counters.register("events", Event)
@@ -11,7 +11,9 @@ from haystack import indexes
 from events.models import Event
 
 class EventIndex(indexes.SearchIndex, indexes.Indexable):
-    ''' Index for Events. '''
+    ''' Index for Events. Results render from the stored fields alone. '''
+    load_object = False
+
     text = indexes.EdgeNgramField(document=True, use_template=True)
     owner = indexes.EdgeNgramField(model_attr='owner')
     exact_user = indexes.CharField(model_attr='owner', faceted=True)
@@ -23,9 +25,14 @@ class EventIndex(indexes.SearchIndex, indexes.Indexable):
     end_time = indexes.DateTimeField(model_attr='end_time')
     as_manager = indexes.EdgeNgramField(model_attr='as_manager', null=True)
     exact_manager = indexes.CharField(model_attr='as_manager', null=True, faceted=True)
+    cancelled = indexes.BooleanField(model_attr='cancelled', indexed=False)
 
     def get_model(self):
         return Event
 
+    def get_updated_field(self):
+        return 'change_date'
+
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.all() \
+          .select_related('owner__user', 'as_manager')
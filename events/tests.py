@@ -8,8 +8,12 @@ from datetime import timedelta
 from django import forms
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
 from django.http import QueryDict
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import now, utc
 
 import pytz
@@ -19,9 +23,13 @@ from base.models import UserProfile
 from events.models import Event
 from events.forms import RsvpForm
 from managers.models import Manager
+from utils.testing import QueryBudgetMixin
 
-class TestEvent(TestCase):
+UNRSVP_BUTTON = 'title="Un-RSVP to this event">Un-RSVP</button>'
+
+class TestEvent(QueryBudgetMixin, TestCase):
     def setUp(self):
+        cache.clear()
         self.u = User.objects.create_user(username="u", password="pwd")
         self.ou = User.objects.create_user(username="ou", password="pwd")
         self.su = User.objects.create_user(username="su", password="pwd")
@@ -49,6 +57,13 @@ class TestEvent(TestCase):
 
         self.client.login(username="u", password="pwd")
 
+    def get_query_budgets(self):
+        return [
+            (reverse("events:list"), 14),
+            (reverse("events:view", kwargs={"event_pk": self.ev.pk}), 13),
+            (reverse("events:all"), 14),
+        ]
+
     def test_event_views(self):
         urls = [
             "/events/",
@@ -218,3 +233,86 @@ class TestEvent(TestCase):
 
         response = self.client.get("/events/{0}/edit/".format(self.ev.pk))
         self.assertEqual(response.status_code, 200)
+
+    def test_rsvp_list_cache(self):
+        ou_profile = UserProfile.objects.get(user=self.ou)
+        self.ou.first_name, self.ou.last_name = "Other", "User"
+        self.ou.save()
+        self.ev.rsvps = [ou_profile]
+
+        response = self.client.get("/events/")
+        self.assertContains(response, "Other User")
+        self.assertNotContains(response, UNRSVP_BUTTON)
+
+        self.ev.rsvps.add(self.profile)
+        response = self.client.get("/events/")
+        self.assertContains(response, "Other User")
+        self.assertContains(response, UNRSVP_BUTTON)
+        self.assertContains(response, ">You</a>")
+
+        self.ou.first_name = "Renamed"
+        self.ou.save()
+        response = self.client.get("/events/")
+        self.assertContains(response, "Renamed User")
+
+        ou_profile.rsvps.clear()
+        response = self.client.get("/events/")
+        self.assertNotContains(response, "Renamed User")
+
+    def test_list_queries(self):
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get("/events/")
+            self.assertEqual(response.status_code, 200)
+            return len(context)
+
+        start = now()
+        for i in range(5):
+            event = Event.objects.create(
+                owner=self.profile,
+                title="Event {0}".format(i),
+                description="Event Description",
+                start_time=start,
+                end_time=start + timedelta(hours=i + 1),
+                )
+            event.rsvps = [UserProfile.objects.get(user=self.ou)]
+        few = count_queries()
+        for i in range(5):
+            event = Event.objects.create(
+                owner=UserProfile.objects.get(user=self.ou),
+                title="Event {0}".format(i + 5),
+                description="Event Description",
+                start_time=start,
+                end_time=start + timedelta(hours=i + 1),
+                )
+            event.rsvps = [self.profile]
+        self.assertEqual(few, count_queries())
+
+    def test_archive_pages(self):
+        start = now() - timedelta(days=30)
+        for i in range(5):
+            Event.objects.create(
+                owner=self.profile,
+                title="Old Event {0}".format(i),
+                description="Event Description",
+                start_time=start - timedelta(days=i),
+                end_time=start - timedelta(days=i) + timedelta(hours=1),
+                )
+
+        titles = []
+        url = reverse("events:all")
+        with self.settings(MAX_EVENTS=2):
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                titles.extend(
+                    event.title
+                    for event, _, _, _ in response.context["events_dict"]
+                    )
+                url = response.context["next_page"]
+        self.assertEqual(
+            [self.ev.title] +
+            ["Old Event {0}".format(i) for i in range(5)],
+            titles,
+            )
@@ -6,8 +6,10 @@ Author: Karandeep Singh Nagra
 
 import json
 
+from django.conf import settings
 from django.contrib import messages
 from django.core.urlresolvers import reverse
+from django.db.models import Q
 from django.http import HttpResponseRedirect, Http404, HttpResponse
 from django.shortcuts import render_to_response, get_object_or_404
 from django.template import RequestContext
@@ -18,13 +20,15 @@ p = inflect.engine()
 
 from utils.variables import MESSAGES
 from base.decorators import profile_required, ajax_capable
+from base.counters import get_counts
 from base.models import UserProfile
 from events.models import Event
 from events.forms import EventForm, RsvpForm
-from events.ajax import build_ajax_rsvps
+from events.ajax import build_ajax_rsvps, build_rsvp_list, get_rsvp_links, \
+     is_rsvpd
 
 def add_archive_context(request):
-    event_count = Event.objects.all().count()
+    event_count = get_counts()["events"]
     nodes = [
         "{} {}".format(event_count, p.plural("event", event_count)),
     ]
@@ -38,6 +42,41 @@ def add_archive_context(request):
     ]
     return nodes, render_list
 
+def _build_events_dict(request, events, profile, redirect_name):
+    '''
+    Returns the (event, ongoing, rsvpd, rsvp_form) items for a list of events,
+    or a redirect if one of the RSVP forms was submitted. Attendee lists come
+    from the RSVP cache, so whether the user has RSVP'd is known without
+    querying each event.
+    '''
+    events = list(events)
+    rsvp_links = get_rsvp_links(events)
+    moment = now()
+    events_dict = list()
+    for event in events:
+        links = rsvp_links[event.pk]
+        event.rsvp_list = build_rsvp_list(links, request.user)
+        rsvp_form = None
+        if event.end_time > moment:
+            rsvp_form = RsvpForm(
+                request.POST if "rsvp-{0}".format(event.pk) in request.POST else None,
+                instance=event,
+                profile=profile,
+                )
+            if rsvp_form.is_valid():
+                rsvpd = rsvp_form.save()
+                if rsvpd:
+                    message = MESSAGES['RSVP_ADD'].format(event=event.title)
+                else:
+                    message = MESSAGES['RSVP_REMOVE'].format(event=event.title)
+                messages.add_message(request, messages.SUCCESS, message)
+                return None, HttpResponseRedirect(reverse(redirect_name))
+
+        ongoing = event.start_time <= moment and event.end_time >= moment
+        rsvpd = is_rsvpd(links, request.user)
+        events_dict.append((event, ongoing, rsvpd, rsvp_form))
+    return events_dict, None
+
 @profile_required
 def list_events_view(request):
     ''' A list view of upcoming events. '''
@@ -54,25 +93,15 @@ def list_events_view(request):
     # rsvpd, rsvp_form), where ongoing is a boolean of whether the event is
     # currently ongoing, rsvpd is a boolean of whether the user has rsvp'd to
     # the event
-    events_dict = list()
-    for event in Event.objects.filter(end_time__gte=now()):
-        rsvp_form = RsvpForm(
-            request.POST if "rsvp-{0}".format(event.pk) in request.POST else None,
-            instance=event,
-            profile=profile,
-            )
-        if rsvp_form.is_valid():
-            rsvpd = rsvp_form.save()
-            if rsvpd:
-                message = MESSAGES['RSVP_ADD'].format(event=event.title)
-            else:
-                message = MESSAGES['RSVP_REMOVE'].format(event=event.title)
-            messages.add_message(request, messages.SUCCESS, message)
-            return HttpResponseRedirect(reverse('events:list'))
-
-        ongoing = ((event.start_time <= now()) and (event.end_time >= now()))
-        rsvpd = (profile in event.rsvps.all())
-        events_dict.append((event, ongoing, rsvpd, rsvp_form))
+    events_dict, response = _build_events_dict(
+        request,
+        Event.objects.filter(end_time__gte=now())
+        .select_related("owner__user", "as_manager"),
+        profile,
+        'events:list',
+        )
+    if response:
+        return response
 
     if request.method == "POST":
         messages.add_message(request, messages.ERROR, MESSAGES["EVENT_ERROR"])
@@ -86,7 +115,11 @@ def list_events_view(request):
 
 @profile_required
 def list_all_events_view(request):
-    ''' A list view of all events.  Part of archives. '''
+    '''
+    A list view of all events.  Part of archives. Pages hold MAX_EVENTS
+    events each, and are addressed by the last event of the page before
+    them, so that later pages are as quick to load as the first.
+    '''
     page_name = "Archives - All Events"
     profile = UserProfile.objects.get(user=request.user)
 
@@ -99,34 +132,40 @@ def list_all_events_view(request):
         event_form.save()
         return HttpResponseRedirect(reverse('events:all'))
 
-    # a pseudo-dictionary, actually a list with items of form (event, ongoing,
-    # rsvpd, rsvp_form, already_past), where ongoing is a boolean of whether the
-    # event is currently ongoing, rsvpd is a boolean of whether the user has
-    # rsvp'd to the event
-    events_dict = list()
-    for event in Event.objects.all():
-        rsvp_form = None
-        if event.end_time > now():
-            rsvp_form = RsvpForm(
-                request.POST if "rsvp-{0}".format(event.pk) in request.POST else None,
-                instance=event,
-                profile=profile,
+    events = Event.objects.all()
+    before = request.GET.get("before", "")
+    if before.isdigit():
+        try:
+            start_time = Event.objects.values_list("start_time", flat=True) \
+              .get(pk=before)
+        except Event.DoesNotExist:
+            pass
+        else:
+            events = events.filter(
+                Q(start_time__lt=start_time) |
+                Q(start_time=start_time, pk__lt=before)
                 )
-            if rsvp_form.is_valid():
-                rsvpd = rsvp_form.save()
-                if rsvpd:
-                    message = MESSAGES['RSVP_ADD'].format(event=event.title)
-                else:
-                    message = MESSAGES['RSVP_REMOVE'].format(event=event.title)
-                messages.add_message(request, messages.SUCCESS, message)
-                return HttpResponseRedirect(reverse('events:all'))
-
-        ongoing = event.start_time <= now() and event.end_time >= now()
-        rsvpd = profile in event.rsvps.all()
-        events_dict.append(
-            (event, ongoing, rsvpd, rsvp_form)
+    events = list(
+        events.order_by("-start_time", "-pk")
+        .select_related("owner__user", "as_manager")[:settings.MAX_EVENTS + 1]
+        )
+    next_page = None
+    if len(events) > settings.MAX_EVENTS:
+        events = events[:settings.MAX_EVENTS]
+        next_page = "{0}?before={1}".format(
+            reverse('events:all'), events[-1].pk,
             )
 
+    # a pseudo-dictionary, actually a list with items of form (event, ongoing,
+    # rsvpd, rsvp_form), where ongoing is a boolean of whether the event is
+    # currently ongoing, rsvpd is a boolean of whether the user has rsvp'd to
+    # the event
+    events_dict, response = _build_events_dict(
+        request, events, profile, 'events:all',
+        )
+    if response:
+        return response
+
     if request.method == "POST":
         messages.add_message(request, messages.ERROR, MESSAGES["EVENT_ERROR"])
 
@@ -135,6 +174,8 @@ def list_all_events_view(request):
         'events_dict': events_dict,
         'now': now(),
         'event_form': event_form,
+        'paginated': True,
+        'next_page': next_page,
         }, context_instance=RequestContext(request))
 
 @profile_required
@@ -184,7 +225,9 @@ def event_view(request, event_pk):
     already_passed = event.end_time <= now()
     can_edit = event.owner == profile or request.user.is_superuser
     ongoing = event.start_time <= now() and event.end_time >= now()
-    rsvpd = profile in event.rsvps.all()
+    links = get_rsvp_links([event])[event.pk]
+    rsvpd = is_rsvpd(links, request.user)
+    event.rsvp_list = build_rsvp_list(links, request.user)
 
     return render_to_response('view_event.html', {
         'page_name': event.title,
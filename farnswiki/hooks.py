@@ -4,7 +4,7 @@ This module is deprecated and marked for replacement.
 """
 from wiki.hooks import WikiDefaultHookset
 
-from managers.models import Manager
+from base.permissions import get_capabilities
 
 from utils.variables import ANONYMOUS_USERNAME
 
@@ -15,9 +15,9 @@ class ProjectWikiHookset(WikiDefaultHookset):
           user.username != ANONYMOUS_USERNAME
 
     def _manager_check(self, user):
-        return Manager.objects.filter(incumbent__user=user).count() > 0 or \
-          user.is_staff or \
-          user.is_superuser
+        return user.is_staff or \
+          user.is_superuser or \
+          get_capabilities(user).is_manager
 
     def _check_landing(self, slug, user):
         return slug != "landing" or \
@@ -1,3 +1,48 @@
+from hashlib import sha1
+
+from django.core.cache import cache
 from django.db import models
+from django.utils.encoding import force_bytes
+
+from wiki.models import Page, Revision
+
+from base import counters
+from base.models import LANDING_CACHE_KEY
+
+counters.register("wiki.pages", Page)
+counters.register("wiki.revisions", Revision)
+
+
+def revision_cache_key(revision):
+    '''
+    The cache key for the rendered HTML of a revision. It includes a digest of
+    the revision's HTML, so that a revision edited in place is rendered again
+    by every process, not only the one whose cache was cleared.
+    '''
+    return "wiki_revision_{0}_{1}_{2}".format(
+        revision.page_id, revision.pk,
+        sha1(force_bytes(revision.content_html)).hexdigest(),
+    )
+
+
+def diff_cache_key(old, new):
+    '''
+    The cache key for the differences between two revisions. It includes a
+    digest of both contents, so that every process compares revisions again
+    once either is edited. old is None for the differences from an empty page.
+    '''
+    digest = sha1(force_bytes(old.content if old else ""))
+    digest.update(b"\0")
+    digest.update(force_bytes(new.content))
+    return "wiki_diff_{0}_{1}_{2}".format(
+        old.pk if old else 0, new.pk, digest.hexdigest(),
+    )
+
+
+def invalidate_landing(sender, **kwargs):
+    cache.delete(LANDING_CACHE_KEY)
 
-# Create your models here.
+models.signals.post_save.connect(invalidate_landing, sender=Revision)
+models.signals.post_delete.connect(invalidate_landing, sender=Revision)
+models.signals.post_save.connect(invalidate_landing, sender=Page)
+models.signals.post_delete.connect(invalidate_landing, sender=Page)
@@ -9,29 +9,67 @@ XXX:
 This module is deprecated and marked for replacement.
 """
 
+from django.db.models import Max
+
 from haystack import indexes
 
 from wiki.models import Page, Revision
 
 class PageIndex(indexes.SearchIndex, indexes.Indexable):
-    """ Index for wiki pages. """
+    """ Index for wiki pages. Results render from the stored fields alone. """
+    load_object = False
+
     text = indexes.EdgeNgramField(document=True, use_template=True)
     slug = indexes.EdgeNgramField(model_attr='slug', boost=2)
+    url = indexes.CharField(model_attr='get_absolute_url', indexed=False)
+    latest_content = indexes.CharField(indexed=False, null=True)
 
     def get_model(self):
         return Page
 
+    def prepare_latest_content(self, obj):
+        try:
+            return obj.revisions.latest().content
+        except Revision.DoesNotExist:
+            return None
+
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.all().select_related('wiki')
 
 class RevisionIndex(indexes.SearchIndex, indexes.Indexable):
-    """ Index for wiki revisions. """
+    """
+    Index for wiki revisions. Only the latest revision of each page is indexed
+    unless all_revisions is set. Results render from the stored fields alone.
+    """
+    all_revisions = False
+    load_object = False
+
     text = indexes.EdgeNgramField(document=True, use_template=True)
     content = indexes.EdgeNgramField(model_attr='content', boost=2)
     created_by = indexes.EdgeNgramField(model_attr='created_by')
+    page_slug = indexes.CharField(model_attr='page__slug', indexed=False)
+    page_url = indexes.CharField(model_attr='page__get_absolute_url', indexed=False)
 
     def get_model(self):
         return Revision
 
+    def get_updated_field(self):
+        return 'created_at'
+
+    def related_updates(self, obj):
+        """
+        The page stores the content of its latest revision. The revision before
+        obj is dropped from the index when obj is added, or indexed in its
+        place when obj is deleted.
+        """
+        previous = obj.page.revisions.filter(pk__lt=obj.pk) \
+          .order_by('-pk').first()
+        return [obj.page, previous]
+
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        revisions = self.get_model().objects.all() \
+          .select_related('page__wiki', 'created_by')
+        if self.all_revisions:
+            return revisions
+        latest = revisions.values('page').annotate(latest=Max('pk'))
+        return revisions.filter(pk__in=latest.values('latest'))
@@ -7,14 +7,22 @@ XXX:
 This module is deprecated and marked for replacement.
 """
 
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.utils.timezone import now
 from django.test import TestCase
+from django.test.utils import override_settings
 
+from wiki.hooks import hookset
 from wiki.models import Wiki, Page, Revision, MediaFile
 
+from farnswiki.models import diff_cache_key
+from utils.testing import QueryBudgetMixin
+
 
 class TestListPage(TestCase):
     """ Test list page. """
@@ -49,6 +57,107 @@ class TestListPage(TestCase):
         for x in ('Page', 'Last Edited', 'page'):
             self.assertContains(response, x)
 
+    @override_settings(MAX_WIKI_PAGES=2)
+    def test_pages(self):
+        self.client.login(username="u", password="pwd")
+        for days, slug in enumerate(["third", "second", "first"]):
+            Revision.objects.create(
+                page=Page.objects.create(slug=slug), content=slug,
+                content_html=slug, created_ip="0.0.0.0",
+                created_at=now() - timedelta(days=days), created_by=self.u,
+            )
+
+        response = self.client.get(self.addr)
+        self.assertContains(response, "Page 1 of 2.")
+        self.assertEqual(
+            ["third", "second"],
+            [page.slug for page in response.context["pages"]],
+        )
+        response = self.client.get(self.addr + "?page=2")
+        self.assertEqual(
+            ["first"],
+            [page.slug for page in response.context["pages"]],
+        )
+
+class TestHooks(TestCase):
+    """ Test the wiki permission checks. """
+
+    def test_manager_check(self):
+        user = User.objects.create_user(username="u", password="pwd")
+        page = Page.objects.create(slug="landing")
+        with self.assertNumQueries(1):
+            self.assertFalse(hookset.can_edit_page(page, user))
+            self.assertFalse(hookset.can_delete_page(page, user))
+            self.assertFalse(hookset.can_create_page(None, user, slug="landing"))
+
+class TestHistory(TestCase):
+    """ Test the history and diff pages. """
+
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user(username="u", password="pwd")
+        self.page = Page.objects.create(slug="page")
+        self.revisions = [
+            Revision.objects.create(
+                page=self.page, content=content, content_html=content,
+                message="Version {0}".format(number), created_ip="0.0.0.0",
+                created_at=now(), created_by=self.u,
+            )
+            for number, content in enumerate([
+                "Kitchen\nLaundry", "Kitchen\nLaundry\nGarden",
+                "Kitchen\nRoof\nGarden",
+            ])
+        ]
+        self.client.login(username="u", password="pwd")
+
+    @override_settings(MAX_WIKI_REVISIONS=2)
+    def test_history(self):
+        url = reverse("wiki_history", kwargs={"slug": "page"})
+        response = self.client.get(url)
+        self.assertEqual(
+            self.revisions[:0:-1], list(response.context["revisions"]),
+        )
+        self.assertContains(response, "Page 1 of 2.")
+        response = self.client.get(url + "?page=2")
+        self.assertEqual(
+            self.revisions[:1], list(response.context["revisions"]),
+        )
+
+    def test_diff(self):
+        url = reverse("wiki_diff", kwargs={"slug": "page"})
+        response = self.client.get(url)
+        self.assertEqual(self.revisions[1], response.context["old"])
+        self.assertEqual(self.revisions[2], response.context["new"])
+        self.assertContains(response, "Roof")
+        self.assertNotEqual(
+            None, cache.get(diff_cache_key(*self.revisions[1:])),
+        )
+
+        # Cached diffs are cleared when a revision is changed
+        self.revisions[2].content = "Kitchen\nAttic\nGarden"
+        self.revisions[2].save()
+        response = self.client.get(url)
+        self.assertContains(response, "Attic")
+        self.assertNotContains(response, "Roof")
+
+        # Including by other processes, whose signals do not reach this one
+        Revision.objects.filter(pk=self.revisions[2].pk).update(
+            content="Kitchen\nCellar\nGarden",
+        )
+        self.assertContains(self.client.get(url), "Cellar")
+
+        response = self.client.get(url + "?from={0}&to={1}".format(
+            self.revisions[0].pk, self.revisions[1].pk,
+        ))
+        self.assertContains(response, "Garden")
+        self.assertNotContains(response, "Roof")
+
+        response = self.client.get(url + "?to={0}".format(self.revisions[0].pk))
+        self.assertEqual(None, response.context["old"])
+        self.assertContains(response, "From an empty page")
+
+        self.assertEqual(404, self.client.get(url + "?to=junk").status_code)
+
 class TestAddPage(TestCase):
     """ Test the add page. """
 
@@ -70,9 +179,59 @@ class TestAddPage(TestCase):
         for x in ('Add page', 'Back', 'Message', 'Save'):
             self.assertContains(response, x)
 
+class TestPage(QueryBudgetMixin, TestCase):
+    """ Test the page view. """
+
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user(username="u", password="pwd")
+        self.page = Page.objects.create(slug="page")
+        self.revision = Revision.objects.create(
+            page=self.page, content="page", content_html="First version",
+            message="First", created_ip="0.0.0.0", created_at=now(),
+            created_by=self.u,
+        )
+        self.addr = reverse(settings.WIKI_BINDERS[0].page_url_name,
+                            kwargs={"slug": "page"})
+        self.client.login(username="u", password="pwd")
+
+    def get_query_budgets(self):
+        return [
+            (self.addr, 12),
+            (reverse("wiki_history", kwargs={"slug": "page"}), 11),
+            (reverse("wiki_diff", kwargs={"slug": "page"}), 11),
+            (reverse("wiki_all"), 10),
+        ]
+
+    def test_cached_revision(self):
+        response = self.client.get(self.addr)
+        self.assertContains(response, "First version")
+        # The navbar around the revision may change, so members always get
+        # the whole page
+        self.assertNotIn("ETag", response)
+
+        # Rendered revisions are cached, but still cleared if they are changed
+        self.revision.content_html = "Changed version"
+        self.revision.save()
+        self.assertContains(self.client.get(self.addr), "Changed version")
+
+        # Including by other processes, whose signals do not reach this one
+        Revision.objects.filter(pk=self.revision.pk).update(
+            content_html="Changed elsewhere",
+        )
+        self.assertContains(self.client.get(self.addr), "Changed elsewhere")
+
+        Revision.objects.create(
+            page=self.page, content="page", content_html="Second version",
+            message="Second", created_ip="0.0.0.0", created_at=now(),
+            created_by=self.u,
+        )
+        self.assertContains(self.client.get(self.addr), "Second version")
+
 class TestLanding(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.u = User.objects.create_user(username="u", password="pwd")
         self.su = User.objects.create_user(username="su", password="pwd")
         self.su.is_superuser = True
@@ -123,3 +282,53 @@ class TestLanding(TestCase):
             response,
             content,
             )
+
+    def test_cached_landing(self):
+        page = Page.objects.create(slug="landing")
+        Revision.objects.create(
+            page=page, content="landing", content_html="Welcome, visitors",
+            created_ip="0.0.0.0", created_at=now(), created_by=self.u,
+        )
+        response = self.client.get(reverse("external"))
+        self.assertContains(response, "Welcome, visitors")
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("external"))
+        self.assertContains(response, "Welcome, visitors")
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("external"),
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+        Revision.objects.create(
+            page=page, content="landing", content_html="Welcome back",
+            created_ip="0.0.0.0", created_at=now(), created_by=self.u,
+        )
+        response = self.client.get(reverse("external"),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Welcome back")
+
+        # Members are not served the visitors' copy
+        self.client.login(username="u", password="pwd")
+        self.assertNotIn(
+            "ETag", self.client.get(reverse("external")),
+        )
+
+    @override_settings(LANDING_CACHE_SECONDS=0)
+    def test_landing_edited_elsewhere(self):
+        page = Page.objects.create(slug="landing")
+        revision = Revision.objects.create(
+            page=page, content="landing", content_html="Welcome, visitors",
+            created_ip="0.0.0.0", created_at=now(), created_by=self.u,
+        )
+        etag = self.client.get(reverse("external"))["ETag"]
+
+        # An edit saved by another process, once this one's copy has expired
+        Revision.objects.filter(pk=revision.pk).update(
+            content_html="Welcome back",
+        )
+        response = self.client.get(reverse("external"),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Welcome back")
+        self.assertNotEqual(etag, response["ETag"])
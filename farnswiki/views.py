@@ -3,13 +3,21 @@ XXX:
 This module is deprecated and marked for replacement.
 """
 
+from difflib import HtmlDiff
 
 from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db.models import Max, Q
 from django.http import HttpResponseRedirect, Http404
 from django.shortcuts import render_to_response
 from django.template import RequestContext
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.dateformat import format as format_date
+from django.utils.safestring import mark_safe
+from django.utils.timezone import localtime
 
 import inflect
 p = inflect.engine()
@@ -18,7 +26,10 @@ from wiki.forms import RevisionForm
 from wiki.hooks import hookset
 from wiki.models import Page, Revision
 
+from base.counters import get_counts
 from base.decorators import profile_required
+from farnswiki.models import diff_cache_key, revision_cache_key
+from utils.funcs import get_page
 
 def add_wiki_context(request):
     return {
@@ -26,8 +37,9 @@ def add_wiki_context(request):
         }
 
 def add_archive_context(request):
-    page_count = Page.objects.all().count()
-    revision_count = Revision.objects.all().count()
+    counts = get_counts()
+    page_count = counts["wiki.pages"]
+    revision_count = counts["wiki.revisions"]
     nodes = [
         "{} wiki {}".format(page_count, p.plural("page", page_count)),
         "{} wiki {}".format(revision_count, p.plural("revision", revision_count)),
@@ -35,6 +47,43 @@ def add_archive_context(request):
     render_list = []
     return nodes, render_list
 
+def render_revision(revision):
+    '''
+    The HTML of a revision's content and of its edit information, rendered
+    once and cached until the revision changes.
+    '''
+    key = revision_cache_key(revision)
+    html = cache.get(key)
+    if html is None:
+        context = {"revision": revision}
+        html = {
+            "content": render_to_string("wiki/revision_content.html", context),
+            "info": render_to_string("wiki/revision_info.html", context),
+        }
+        cache.set(key, html, None)
+    return dict((name, mark_safe(part)) for name, part in html.items())
+
+def _describe(revision):
+    return format_date(localtime(revision.created_at), "m/d/Y, h:i A")
+
+def render_diff(old, new):
+    '''
+    A table of the lines changed between the contents of two revisions, or
+    from an empty page if old is None. Each pair is only compared once.
+    '''
+    key = diff_cache_key(old, new)
+    html = cache.get(key)
+    if html is None:
+        html = HtmlDiff(wrapcolumn=80).make_table(
+            old.content.splitlines() if old else [],
+            new.content.splitlines(),
+            fromdesc=_describe(old) if old else "",
+            todesc=_describe(new),
+            context=True,
+        )
+        cache.set(key, html, None)
+    return mark_safe(html)
+
 @profile_required
 def page(request, slug, binder, *args, **kwargs):
     wiki = binder.lookup(*args, **kwargs)
@@ -53,10 +102,15 @@ def page(request, slug, binder, *args, **kwargs):
     except Page.DoesNotExist:
         return HttpResponseRedirect(binder.edit_url(wiki, slug))
 
-    return render_to_response("wiki/page.html", {
+    # No ETag, as the navbar and edit links around the revision change
+    # without it changing
+    response = render_to_response("wiki/page.html", {
         "revision": rev,
+        "revision_html": render_revision(rev),
         "can_edit": hookset.can_edit_page(page, request.user),
     }, context_instance=RequestContext(request))
+    patch_cache_control(response, private=True)
+    return response
 
 @profile_required
 def edit(request, slug, binder, *args, **kwargs):
@@ -161,16 +215,65 @@ def history_view(request, slug, binder, *args, **kwargs):
             page = wiki.pages.get(slug=slug)
         else:
             page = Page.objects.get(slug=slug)
-        rev = page.revisions.latest()
         if not hookset.can_view_page(page, request.user):
             raise Http404()
     except Page.DoesNotExist:
         raise Http404()
 
+    revisions = get_page(
+        page.revisions.select_related("created_by")
+        .order_by("-created_at", "-pk"),
+        settings.MAX_WIKI_REVISIONS,
+        request.GET.get("page"),
+    )
+
     page_name = "History for {0}".format(page.slug)
     return render_to_response("wiki/history.html", {
         "page_name": page_name,
         "page": page,
+        "revisions": revisions,
+    }, context_instance=RequestContext(request))
+
+@profile_required
+def diff_view(request, slug, binder, *args, **kwargs):
+    '''
+    The changes between two revisions of a page, from and to, by pk. to
+    defaults to the latest revision and from to the one before to.
+    '''
+    wiki = binder.lookup(*args, **kwargs)
+    try:
+        if wiki:
+            page = wiki.pages.get(slug=slug)
+        else:
+            page = Page.objects.get(slug=slug)
+        if not hookset.can_view_page(page, request.user):
+            raise Http404()
+    except Page.DoesNotExist:
+        raise Http404()
+
+    revisions = page.revisions.select_related("created_by")
+    try:
+        if "to" in request.GET:
+            new = revisions.get(pk=request.GET["to"])
+        else:
+            new = revisions.latest()
+        if "from" in request.GET:
+            old = revisions.get(pk=request.GET["from"])
+        else:
+            old = revisions.filter(
+                Q(created_at__lt=new.created_at) |
+                Q(created_at=new.created_at, pk__lt=new.pk)
+            ).order_by("-created_at", "-pk").first()
+    except (Revision.DoesNotExist, ValueError):
+        raise Http404()
+
+    page_name = "Changes to {0}".format(page.slug)
+    return render_to_response("wiki/diff.html", {
+        "page_name": page_name,
+        "page": page,
+        "old": old,
+        "new": new,
+        "diff": render_diff(old, new),
     }, context_instance=RequestContext(request))
 
 @profile_required
@@ -181,9 +284,15 @@ def all_pages_view(request, binder, *args, **kwargs):
     else:
         pages = Page.objects.all()
 
-    pages = [
+    pages = get_page(
+        pages.annotate(last_edited=Max("revisions__created_at"))
+        .order_by("-last_edited", "slug"),
+        settings.MAX_WIKI_PAGES,
+        request.GET.get("page"),
+    )
+    pages.object_list = [
         page
-        for page in pages
+        for page in pages.object_list
         if hookset.can_view_page(page, request.user)
     ]
 
@@ -184,6 +184,7 @@ TEMPLATE_LOADERS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    "base.profiling.QueryProfileMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -233,6 +234,11 @@ INSTALLED_APPS = (
 )
 
 CRON_CLASSES = (
+    "base.cron.FlushSearchQueueCronJob",
+    "base.cron.SendQueuedMailCronJob",
+    "base.cron.QueueDigestsCronJob",
+    "base.cron.PruneNotificationsCronJob",
+    "base.cron.ReconcileCountersCronJob",
     "managers.cron.ExpireRequestsCronJob",
     "workshift.cron.CollectBlownCronJob",
     "workshift.cron.UpdateWeeklyStandings",
@@ -241,6 +247,12 @@ CRON_CLASSES = (
 WIKI_HOOKSET = "farnswiki.hooks.ProjectWikiHookset"
 WIKI_PARSE = "farnswiki.hooks.parse"
 
+# Max number of wiki pages listed on each page of all_pages_view.
+MAX_WIKI_PAGES = 50
+
+# Max number of revisions listed on each page of history_view.
+MAX_WIKI_REVISIONS = 50
+
 ### Farnsworth-specific hooks
 BASE_ARCHIVE_FUNCTIONS = (
     "base.views.add_archive_context",
@@ -358,15 +370,77 @@ AUTO_RENDER_SELECT2_STATICS = False
 # Haystack search backend setting.
 HAYSTACK_CONNECTIONS = {
     "default": {
-        "ENGINE": "haystack.backends.simple_backend.SimpleEngine",
+        "ENGINE": "base.search_backend.SQLiteSearchEngine",
+        "PATH": os.path.join(os.path.dirname(__file__), "search_index.db").replace("\\", "/"),
     },
 }
 
-HAYSTACK_SIGNAL_PROCESSOR = "haystack.signals.RealtimeSignalProcessor"
+HAYSTACK_SIGNAL_PROCESSOR = "base.search_queue.QueuedSignalProcessor"
 HAYSTACK_SEARCH_RESULTS_PER_PAGE = 50
 
+# Max number of queued search index changes applied at once by the flush job.
+SEARCH_QUEUE_BATCH_SIZE = 500
+
+# Max number of results returned by the search-as-you-type endpoint.
+AUTOCOMPLETE_MAX_RESULTS = 10
+
+# Number of recent autocomplete queries each process keeps the results of.
+AUTOCOMPLETE_CACHE_SIZE = 1000
+
+# Max age, in seconds, of a process's autocomplete index. Flushing the search
+# queue refreshes it sooner when processes share a cache backend.
+AUTOCOMPLETE_MAX_AGE = 300
+
 TEST_RUNNER = "django.test.runner.DiscoverRunner"
 
+# Number of days of past workshifts and events kept in members' calendar feeds.
+ICAL_PAST_DAYS = 30
+
+# Whether notifications are written by a background thread, off the request
+# path. When False, they are written before the request continues.
+NOTIFICATION_FANOUT_ASYNC = True
+
+# How long, in seconds, browsers may keep pages of legacy records.
+LEGACY_CACHE_MAX_AGE = 24 * 60 * 60
+
+# How long, in seconds, each process may show the site statistics it last read.
+# Changes are seen at once by the process that made them, or by every process
+# when they share a cache backend.
+SITE_COUNTERS_CACHE_SECONDS = 60
+
+# How long, in seconds, each process may serve visitors its cached copy of the
+# landing page after the landing wiki page changes.
+LANDING_CACHE_SECONDS = 60
+
+# How long, in seconds, each process may show its cached member directory after
+# a member changes their details, such as hiding their e-mail address.
+MEMBER_DIRECTORY_CACHE_SECONDS = 60
+
+# Max number of notifications shown on each page of notifications_view.
+MAX_NOTIFICATIONS = 50
+
+# How old, in days, a read notification should be before it is deleted.
+# None keeps notifications forever.
+NOTIFICATION_READ_LIFE = 180
+
+# The e-mail backend used to send queued e-mails. None uses EMAIL_BACKEND.
+EMAIL_QUEUE_BACKEND = None
+
+# Max number of queued e-mails sent over one connection to the mail server.
+EMAIL_QUEUE_BATCH_SIZE = 100
+
+# Number of failed attempts after which a queued e-mail is no longer retried.
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+
+# How often, in minutes, members are e-mailed a digest of their notifications.
+EMAIL_DIGEST_MINS = 24 * 60
+
+# Whether to record the queries run by each request, see base/profiling.py.
+QUERY_PROFILE = False
+
+# Number of requests whose query profiles each process keeps for admins.
+QUERY_PROFILE_SIZE = 200
+
 ### Threads Settings
 # Max number of threads loaded in member_forums.
 MAX_THREADS = 20
@@ -377,6 +451,10 @@ MAX_MESSAGES = 4
 # Max number of threads loaded for home page.
 HOME_MAX_THREADS = 30
 
+### Events settings
+# Max number of events loaded on each page of list_all_events_view.
+MAX_EVENTS = 50
+
 ### Managers settings
 # Max number of requests loaded in requests_view.
 MAX_REQUESTS = 30
@@ -424,9 +502,14 @@ DEFAULT_WARNING_HOURS = 10
 DEFAULT_EMAIL_HOURS = 15
 EMAIL_TARGET = "...@bsc.coop"
 
+# Number of rows read from the database at a time by the workshift exports
+EXPORT_CHUNK_SIZE = 1000
+
 ########################################################################
 
 if "test" in sys.argv:
     PASSWORD_HASHERS = (
         "django.contrib.auth.hashers.MD5PasswordHasher",
     )
+    HAYSTACK_CONNECTIONS["default"]["PATH"] = ":memory:"
+    NOTIFICATION_FANOUT_ASYNC = False
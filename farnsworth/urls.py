@@ -11,10 +11,11 @@ from django.contrib.auth.decorators import login_required
 
 from haystack.forms import FacetedSearchForm
 from haystack.query import SearchQuerySet
-from haystack.views import FacetedSearchView
 
 import notifications
 
+from base.search_views import SearchView
+
 admin.autodiscover()
 
 sqs = SearchQuerySet().facet('exact_user').facet('exact_location').facet('exact_manager').facet('exact_status')
@@ -23,7 +24,7 @@ urlpatterns = patterns(
     '',
     url(r'^admin/doc/', include('django.contrib.admindocs.urls')),
     url(r'^admin/', include(admin.site.urls)),
-    url(r'^search/$', login_required(FacetedSearchView(form_class=FacetedSearchForm, searchqueryset=sqs)), name='haystack_search'),
+    url(r'^search/$', login_required(SearchView(form_class=FacetedSearchForm, searchqueryset=sqs)), name='haystack_search'),
     url(r'', include('social.apps.django_app.urls', namespace='social')),
     url(r'^select2/', include('django_select2.urls')),
     url(r'', include('workshift.urls', namespace="workshift")),
@@ -61,10 +62,15 @@ urlpatterns += patterns(
     url(r'^custom_admin/manage_user/(?P<targetUsername>[-\w]+)/$', 'custom_modify_user_view', name='custom_modify_user'),
     url(r'^custom_admin/add_user/$', 'custom_add_user_view', name='custom_add_user'),
     url(r'^custom_admin/utilities/$', 'utilities_view', name='utilities'),
+    url(r'^custom_admin/queries/$', 'query_profile_view', name='query_profile'),
     url(r'^reset/$', 'reset_pw_view', name='reset_pw'),
     url(r'^reset/(?P<uidb64>[0-9A-Za-z_\-]+)/(?P<token>[0-9A-Za-z]{1,13}-[0-9A-Za-z]{1,20})/$',
         'reset_pw_confirm_view', name='reset_pw_confirm'),
     url(r'^recount/$', "recount_view", name="recount"),
     url(r'^archives/$', 'archives_view', name='archives'),
+    url(r'^archives/statistics\.json$', 'archives_statistics_view',
+        name='archives_statistics'),
     url(r'^get_updates/$', 'get_updates_view', name='get_updates'),
+    url(r'^search/autocomplete/$', 'autocomplete_view', name='autocomplete'),
+    url(r'^calendar/(?P<targetUsername>[-\w]+)/(?P<token>[0-9a-f]+)\.ics$', 'calendar_feed_view', name='calendar_feed'),
 )
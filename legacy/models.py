@@ -6,9 +6,31 @@ Author: Karandeep Singh Nagra
 Legacy Kingman site data.
 """
 
+from time import time
 
+from django.core.cache import cache
 from django.db import models
 
+from base import counters
+
+LEGACY_VERSION_KEY = "legacy_version"
+
+
+def legacy_cache_key(*parts):
+    """
+    A cache key for a rendering of legacy records, which changes whenever any
+    of the records do.
+    """
+    version = cache.get(LEGACY_VERSION_KEY)
+    if version is None:
+        version = repr(time())
+        cache.set(LEGACY_VERSION_KEY, version, None)
+    return "legacy_{0}_{1}".format(version, "_".join(parts))
+
+
+def invalidate_legacy_pages(sender, **kwargs):
+    cache.delete(LEGACY_VERSION_KEY)
+
 
 class TeacherRequest(models.Model):
     """
@@ -142,3 +164,13 @@ class TeacherEvent(models.Model):
 
     class Meta:
         ordering = ['-date']
+
+counters.register("legacy.notes", TeacherNote)
+counters.register("legacy.events", TeacherEvent)
+counters.register("legacy.food", TeacherRequest, request_type="food")
+counters.register("legacy.maintenance", TeacherRequest,
+                  request_type="maintenance")
+
+for model in (TeacherRequest, TeacherResponse, TeacherNote, TeacherEvent):
+    models.signals.post_save.connect(invalidate_legacy_pages, sender=model)
+    models.signals.post_delete.connect(invalidate_legacy_pages, sender=model)
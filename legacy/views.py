@@ -7,26 +7,31 @@ Legacy Kingman site views.
 """
 
 
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.http import Http404
 from django.shortcuts import render_to_response
 from django.template import RequestContext
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.safestring import mark_safe
 
 import inflect
 p = inflect.engine()
 
+from base.counters import get_counts
 from base.decorators import profile_required
-from legacy.models import TeacherRequest, TeacherResponse, TeacherNote, \
-    TeacherEvent
+from legacy.models import TeacherRequest, TeacherNote, TeacherEvent, \
+    legacy_cache_key
+from utils.funcs import get_page
 
 def add_archive_context(request):
-    note_count = TeacherNote.objects.all().count()
-    event_count = TeacherEvent.objects.all().count()
-    food_count = TeacherRequest.objects \
-      .filter(request_type="food").count()
-    maint_count = TeacherRequest.objects \
-     .filter(request_type="maintenance").count()
+    counts = get_counts()
+    note_count = counts["legacy.notes"]
+    event_count = counts["legacy.events"]
+    food_count = counts["legacy.food"]
+    maint_count = counts["legacy.maintenance"]
     total_count = note_count + event_count + food_count + maint_count
     nodes = [
         "{} legacy {}".format(total_count, p.plural("post", total_count)),
@@ -65,53 +70,72 @@ def add_archive_context(request):
     ]
     return nodes, render_list
 
-@profile_required
-def legacy_notes_view(request):
+def _page_number(request, count, per_page):
     """
-    View to see legacy notes.
+    The page of a listing of count records requested by ?page=, resolved the
+    way get_page would resolve it, so that each page is only cached once.
     """
-    notes = TeacherNote.objects.all()
-    note_count = notes.count()
-    paginator = Paginator(notes, 100)
-
-    page = request.GET.get('page')
+    pages = max(1, (count + per_page - 1) // per_page)
     try:
-        notes = paginator.page(page)
-    except PageNotAnInteger:
-        notes = paginator.page(1)
-    except EmptyPage:
-        notes = paginator.page(paginator.num_pages)
-    return render_to_response(
-        'teacher_notes.html',
-        {'page_name': "Legacy Notes",
-         'notes': notes,
-         'note_count': note_count,},
+        number = int(request.GET.get('page', 1))
+    except ValueError:
+        return 1
+    return number if 1 <= number <= pages else pages
+
+def _render_cached(request, template, page_name, key, count, per_page,
+                   build_context):
+    """
+    Renders template around a listing from template_list.html. The legacy
+    records never change, so each page of a listing of count records,
+    per_page at a time, is rendered once, from the context returned by
+    build_context, and kept in the cache until they do.  Browsers may keep the
+    page for LEGACY_CACHE_MAX_AGE seconds.
+    """
+    page = _page_number(request, count, per_page)
+    key = legacy_cache_key(key, str(page))
+    content = cache.get(key)
+    if content is None:
+        content = render_to_string(
+            template.replace('.html', '_list.html'),
+            build_context(page),
+        )
+        cache.set(key, content, None)
+    response = render_to_response(
+        template,
+        {'page_name': page_name,
+         'content': mark_safe(content),},
         context_instance=RequestContext(request)
     )
+    patch_cache_control(
+        response, private=True, max_age=settings.LEGACY_CACHE_MAX_AGE,
+    )
+    return response
+
+@profile_required
+def legacy_notes_view(request):
+    """
+    View to see legacy notes.
+    """
+    def build_context(page):
+        notes = get_page(TeacherNote.objects.all(), 100, page)
+        return {'notes': notes,
+                'note_count': notes.paginator.count,}
+    return _render_cached(request, 'teacher_notes.html', "Legacy Notes",
+                          'notes', get_counts()["legacy.notes"], 100,
+                          build_context)
 
 @profile_required
 def legacy_events_view(request):
     """
     View to see legacy events.
     """
-    events = TeacherEvent.objects.all()
-    event_count = events.count()
-    paginator = Paginator(events, 100)
-
-    page = request.GET.get('page')
-    try:
-        events = paginator.page(page)
-    except PageNotAnInteger:
-        events = paginator.page(1)
-    except EmptyPage:
-        events = paginator.page(paginator.num_pages)
-    return render_to_response(
-        'teacher_events.html',
-        {'page_name': "Legacy Events",
-         'events': events,
-         'event_count': event_count,},
-        context_instance=RequestContext(request)
-    )
+    def build_context(page):
+        events = get_page(TeacherEvent.objects.all(), 100, page)
+        return {'events': events,
+                'event_count': events.paginator.count,}
+    return _render_cached(request, 'teacher_events.html', "Legacy Events",
+                          'events', get_counts()["legacy.events"], 100,
+                          build_context)
 
 @profile_required
 def legacy_requests_view(request, rtype):
@@ -121,28 +145,23 @@ def legacy_requests_view(request, rtype):
     """
     if not rtype in ['food', 'maintenance']:
         raise Http404
-    requests_dict = [] # [(req, [req_responses]), (req2, [req2_responses]), ...]
-    requests = TeacherRequest.objects.filter(request_type=rtype)
-    request_count = requests.count()
-    paginator = Paginator(requests, 50)
-
-    page = request.GET.get('page')
-    try:
-        requests = paginator.page(page)
-    except PageNotAnInteger:
-        requests = paginator.page(1)
-    except EmptyPage:
-        requests = paginator.page(paginator.num_pages)
-    for req in requests:
-        requests_dict.append(
-            (req, TeacherResponse.objects.filter(request=req),)
+    def build_context(page):
+        requests = get_page(
+            TeacherRequest.objects.filter(request_type=rtype)
+            .prefetch_related('teacherresponse_set'),
+            50, page,
         )
-    return render_to_response(
-        'teacher_requests.html',
-        {'page_name': "Legacy {rtype} Requests".format(rtype=rtype.title()),
-         'requests_dict': requests_dict,
-         'requests': requests,
-         'request_type': rtype.title(),
-         'request_count': request_count,},
-        context_instance=RequestContext(request)
+        # [(req, [req_responses]), (req2, [req2_responses]), ...]
+        requests_dict = [
+            (req, req.teacherresponse_set.all())
+            for req in requests
+        ]
+        return {'requests_dict': requests_dict,
+                'requests': requests,
+                'request_type': rtype.title(),
+                'request_count': requests.paginator.count,}
+    return _render_cached(
+        request, 'teacher_requests.html',
+        "Legacy {rtype} Requests".format(rtype=rtype.title()),
+        rtype, get_counts()["legacy.{0}".format(rtype)], 50, build_context,
     )
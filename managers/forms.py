@@ -4,15 +4,13 @@ Project: Farnsworth
 Author: Karandeep Singh Nagra
 '''
 
-from smtplib import SMTPException
-
 from django import forms
 from django.conf import settings
 from django.contrib import messages
 from django.core.urlresolvers import reverse
-from django.core.mail import EmailMultiAlternatives
 
-from notifications import notify
+from base.fanout import notify_many
+from base.mail import queue_mail
 
 from utils.variables import ANNOUNCEMENT_SUBJECT, ANNOUNCEMENT_EMAIL, \
     MESSAGES
@@ -107,10 +105,15 @@ class RequestForm(forms.ModelForm):
         request.owner = self.profile
         request.request_type = self.request_type
         request.save()
-        for manager in request.request_type.managers.all():
-            if manager.incumbent:
-                notify.send(self.profile.user, verb="posted", action_object=request,
-                            target=self.request_type, recipient=manager.incumbent.user)
+        notify_many(
+            self.profile.user,
+            [
+                manager.incumbent.user
+                for manager in request.request_type.managers
+                .filter(incumbent__isnull=False).select_related("incumbent__user")
+            ],
+            verb="posted", action_object=request, target=self.request_type,
+            )
         return request
 
 class ResponseForm(forms.ModelForm):
@@ -133,9 +136,8 @@ class ResponseForm(forms.ModelForm):
         response.request = self.request
         response.save()
 
-        for follower in self.request.followers.all():
-            notify.send(self.profile.user, verb="posted", action_object=response,
-                        target=self.request, recipient=follower.user)
+        notify_many(self.profile.user, self.request.followers.all(),
+                    verb="posted", action_object=response, target=self.request)
 
         self.request.number_of_responses += 1
         self.request.save()
@@ -267,29 +269,20 @@ class AnnouncementForm(forms.ModelForm):
                 if member != self.profile \
                         and member.email_announcement_notifications:
                     email_to.append(member.user.email)
-        try:
-            email_msg = EmailMultiAlternatives(
-                subject=ANNOUNCEMENT_SUBJECT.format(
-                    house=settings.HOUSE,
-                    manager=announcement.manager,
-                ),
-                body=email_body,
-                from_email=settings.EMAIL_HOST_USER,
-                bcc=email_to,
-            )
-            email_msg.attach_alternative(email_body, 'text/html')
-            email_msg.send(fail_silently=False,)
-            messages.add_message(
-                request,
-                messages.SUCCESS,
-                MESSAGES['ANNOUNCEMENT_SUCCESS'],
-            )
-        except SMTPException as e:
-            messages.add_message(
-                request,
-                messages.ERROR,
-                MESSAGES['ANNOUNCEMENT_FAIL'],
-            )
+        queue_mail(
+            subject=ANNOUNCEMENT_SUBJECT.format(
+                house=settings.HOUSE,
+                manager=announcement.manager,
+            ),
+            body=email_body,
+            html_body=email_body,
+            bcc=email_to,
+        )
+        messages.add_message(
+            request,
+            messages.SUCCESS,
+            MESSAGES['ANNOUNCEMENT_SUCCESS'],
+        )
         return announcement
 
 class PinForm(forms.ModelForm):
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managers', '0003_status'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='request',
+            index_together=set([('request_type', 'status')]),
+        ),
+    ]
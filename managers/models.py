@@ -11,7 +11,8 @@ from django.core.urlresolvers import reverse
 from django.db import models
 
 from utils.funcs import convert_to_url
-from base.models import UserProfile
+from base import counters
+from base.models import UserProfile, count_activity
 
 class Manager(models.Model):
     '''
@@ -236,6 +237,9 @@ class Request(models.Model):
 
     class Meta:
         ordering = ['-post_date']
+        index_together = [
+            ("request_type", "status"),
+        ]
 
     def is_request(self):
         return True
@@ -353,6 +357,13 @@ class Announcement(models.Model):
 def update_request(sender, instance, **kwargs):
     instance.number_of_responses = instance.response_set.count()
 
+def count_request(sender, instance, created, **kwargs):
+    if created:
+        count_activity(instance.owner_id, "number_of_requests", 1)
+
+def uncount_request(sender, instance, **kwargs):
+    count_activity(instance.owner_id, "number_of_requests", -1)
+
 def update_response(sender, instance, created, **kwargs):
     response = instance
     if created:
@@ -368,4 +379,14 @@ def update_response(sender, instance, created, **kwargs):
     response.request.save()
 
 models.signals.pre_save.connect(update_request, sender=Request)
+models.signals.post_save.connect(count_request, sender=Request)
+models.signals.post_delete.connect(uncount_request, sender=Request)
 models.signals.post_save.connect(update_response, sender=Response)
+
+counters.register("requests", Request)
+counters.register("requests.expired", Request, status=Request.EXPIRED)
+counters.register("requests.filled", Request, status=Request.FILLED)
+counters.register("requests.closed", Request, status=Request.CLOSED)
+counters.register("requests.open", Request, status=Request.OPEN)
+counters.register("responses", Response)
+counters.register("announcements", Announcement)
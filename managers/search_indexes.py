@@ -26,51 +26,83 @@ class ManagerIndex(indexes.SearchIndex, indexes.Indexable):
         return Manager
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.filter(active=True)
+        return self.get_model().objects.filter(active=True) \
+          .select_related('incumbent__user')
 
 class RequestIndex(indexes.SearchIndex, indexes.Indexable):
-    ''' Index for Requests. '''
+    ''' Index for Requests. Results render from the stored fields alone. '''
+    load_object = False
+
     text = indexes.EdgeNgramField(document=True, use_template=True)
     owner = indexes.EdgeNgramField(model_attr='owner')
+    owner_username = indexes.CharField(model_attr='owner__user__username', indexed=False)
     exact_user = indexes.CharField(model_attr='owner', faceted=True)
     body = indexes.EdgeNgramField(model_attr='body')
     post_date = indexes.DateTimeField(model_attr='post_date')
     change_date = indexes.DateTimeField(model_attr='change_date')
+    request_type_name = indexes.CharField(model_attr='request_type__name', indexed=False)
+    request_status = indexes.CharField(model_attr='get_status_display', indexed=False)
 
     def get_model(self):
         return Request
 
+    def get_updated_field(self):
+        return 'change_date'
+
+    def related_updates(self, obj):
+        ''' Responses store the status and type of their request. '''
+        return obj.response_set.all()
+
     def index_queryset(self, using=None):
-        return self.get_model().objects.filter(private=False)
+        return self.get_model().objects.filter(private=False) \
+          .select_related('owner__user', 'request_type')
 
 class ResponseIndex(indexes.SearchIndex, indexes.Indexable):
-    ''' Index for Responses. '''
+    ''' Index for Responses. Results render from the stored fields alone. '''
+    load_object = False
+
     text = indexes.EdgeNgramField(document=True, use_template = True)
     owner = indexes.EdgeNgramField(model_attr='owner')
     exact_user = indexes.CharField(model_attr='owner', faceted=True)
     body = indexes.EdgeNgramField(model_attr='body')
     post_date = indexes.DateTimeField(model_attr='post_date')
     request = indexes.EdgeNgramField(model_attr='request')
+    request_pk = indexes.IntegerField(model_attr='request__pk', indexed=False)
+    request_type_name = indexes.CharField(model_attr='request__request_type__name', indexed=False)
+    request_status = indexes.CharField(model_attr='request__get_status_display', indexed=False)
 
     def get_model(self):
         return Response
 
+    def get_updated_field(self):
+        return 'post_date'
+
     def index_queryset(self, using=None):
-        return self.get_model().objects.filter(request__private=False)
+        return self.get_model().objects.filter(request__private=False) \
+          .select_related('owner__user', 'request__owner__user',
+                          'request__request_type')
 
 class AnnouncementIndex(indexes.SearchIndex, indexes.Indexable):
-    ''' Index for Announcements. '''
+    ''' Index for Announcements. Results render from the stored fields alone. '''
+    load_object = False
+
     text = indexes.EdgeNgramField(document=True, use_template = True)
     manager = indexes.EdgeNgramField(model_attr='manager')
     exact_manager = indexes.CharField(model_attr='manager', faceted=True)
     incumbent = indexes.EdgeNgramField(model_attr='incumbent')
+    incumbent_username = indexes.CharField(model_attr='incumbent__user__username', indexed=False)
     exact_user = indexes.CharField(model_attr='incumbent', faceted=True)
     body = indexes.EdgeNgramField(model_attr='body')
     post_date = indexes.DateTimeField(model_attr='post_date')
     change_date = indexes.DateTimeField(model_attr='change_date')
+    pinned = indexes.BooleanField(model_attr='pinned', indexed=False)
 
     def get_model(self):
         return Announcement
 
+    def get_updated_field(self):
+        return 'change_date'
+
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.all() \
+          .select_related('manager', 'incumbent__user')
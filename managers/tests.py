@@ -19,6 +19,7 @@ from utils.funcs import convert_to_url
 from utils.variables import ANONYMOUS_USERNAME, MESSAGES
 from managers.cron import ExpireRequestsCronJob
 from managers.models import Manager, RequestType, Request, Response, Announcement
+from utils.testing import QueryBudgetMixin
 
 class TestPermissions(TestCase):
     def setUp(self):
@@ -334,7 +335,7 @@ class TestAnonymousUser(TestCase):
         response = self.client.get(reverse("homepage"))
         self.assertEqual(response.status_code, 200)
 
-class TestRequestPages(TestCase):
+class TestRequestPages(QueryBudgetMixin, TestCase):
     def setUp(self):
         self.u = User.objects.create_user(username="u", password="pwd")
         self.pu = User.objects.create_user(username="pu", password="pwd")
@@ -367,6 +368,20 @@ class TestRequestPages(TestCase):
             manager=True,
             )
 
+    def get_query_budgets(self):
+        self.client.login(username="pu", password="pwd")
+        return [
+            (reverse("managers:requests",
+                     kwargs={"requestType": self.rt.url_name}), 25),
+            (reverse("managers:list_all_requests",
+                     kwargs={"requestType": self.rt.url_name}), 16),
+            (reverse("managers:view_request",
+                     kwargs={"request_pk": self.request.pk}), 25),
+            (reverse("managers:my_requests"), 16),
+            (reverse("managers:list_managers"), 13),
+            (reverse("managers:announcements"), 14),
+        ]
+
     def test_cron(self):
         expired_time = now() - timedelta(hours=settings.REQUEST_EXPIRATION_HOURS + 24)
         exp_req_1 = Request.objects.create(
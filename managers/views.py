@@ -25,7 +25,9 @@ p = inflect.engine()
 from utils.variables import ANONYMOUS_USERNAME, MESSAGES
 from base.decorators import admin_required, profile_required, \
     president_admin_required, ajax_capable
+from base.counters import get_counts
 from base.models import UserProfile
+from base.permissions import get_capabilities
 from base.redirects import red_home
 from managers.models import Manager, RequestType, Request, Response, Announcement
 from managers.forms import ManagerForm, RequestTypeForm, RequestForm, ResponseForm, \
@@ -34,13 +36,14 @@ from managers.ajax import build_ajax_votes
 from threads.models import Thread, Message
 
 def add_archive_context(request):
-    request_count = Request.objects.all().count()
-    expired_count = Request.objects.filter(status=Request.EXPIRED).count()
-    filled_count = Request.objects.filter(status=Request.FILLED).count()
-    closed_count = Request.objects.filter(status=Request.CLOSED).count()
-    open_count = Request.objects.filter(status=Request.OPEN).count()
-    response_count = Response.objects.all().count()
-    announcement_count = Announcement.objects.all().count()
+    counts = get_counts()
+    request_count = counts["requests"]
+    expired_count = counts["requests.expired"]
+    filled_count = counts["requests.filled"]
+    closed_count = counts["requests.closed"]
+    open_count = counts["requests.open"]
+    response_count = counts["responses"]
+    announcement_count = counts["announcements"]
     nodes = [
         "{} total {}".format(request_count, p.plural("request", request_count)),
         [
@@ -57,13 +60,13 @@ def add_archive_context(request):
             "All Requests",
             reverse("managers:all_requests"),
             "glyphicon-inbox",
-            Request.objects.all().count(),
+            request_count,
         ),
         (
             "All Announcements",
             reverse("managers:all_announcements"),
             "glyphicon-bullhorn",
-            Announcement.objects.all().count(),
+            announcement_count,
         ),
     ]
     return nodes, render_list
@@ -611,9 +614,9 @@ def edit_announcement_view(request, announcement_pk):
 def announcements_view(request):
     ''' The view of manager announcements. '''
     page_name = "Manager Announcements"
-    userProfile = UserProfile.objects.get(user=request.user)
+    userProfile = get_capabilities(request.user).profile
     announcement_form = None
-    manager_positions = Manager.objects.filter(incumbent=userProfile)
+    manager_positions = get_capabilities(request.user).positions
     if manager_positions:
         announcement_form = AnnouncementForm(
             request.POST if "post_announcement" in request.POST else None,
@@ -658,9 +661,9 @@ def announcements_view(request):
 def all_announcements_view(request):
     ''' The view of manager announcements. '''
     page_name = "Archives - All Announcements"
-    userProfile = UserProfile.objects.get(user=request.user)
+    userProfile = get_capabilities(request.user).profile
     announcement_form = None
-    manager_positions = Manager.objects.filter(incumbent=userProfile)
+    manager_positions = get_capabilities(request.user).positions
     if manager_positions:
         announcement_form = AnnouncementForm(
             request.POST if "post_announcement" in request.POST else None,
@@ -4,8 +4,9 @@ from django.test import TestCase
 
 from base.models import User, UserProfile
 from rooms.models import Room
+from utils.testing import QueryBudgetMixin
 
-class TestViews(TestCase):
+class TestViews(QueryBudgetMixin, TestCase):
     def setUp(self):
         self.su = User.objects.create_user(username="su", password="pwd")
 
@@ -20,6 +21,12 @@ class TestViews(TestCase):
 
         self.client.login(username="su", password="pwd")
 
+    def get_query_budgets(self):
+        return [
+            (reverse("rooms:list"), 11),
+            (reverse("rooms:view", kwargs={"room_title": self.r.title}), 12),
+        ]
+
     def test_list(self):
         url = reverse("rooms:list")
         response = self.client.get(url)
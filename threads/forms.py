@@ -6,7 +6,7 @@ Author: Karandeep Singh Nagra
 
 from django import forms
 
-from notifications import notify
+from base.fanout import notify_many
 
 from threads.models import Thread, Message
 
@@ -56,9 +56,8 @@ class MessageForm(forms.ModelForm):
         message.thread = self.thread
         message.save()
 
-        for follower in self.thread.followers.all():
-            notify.send(self.profile.user, verb="posted", action_object=message,
-                        target=self.thread, recipient=follower)
+        notify_many(self.profile.user, self.thread.followers.all(),
+                    verb="posted", action_object=message, target=self.thread)
 
         return message
 
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.db.models import F
+import django.utils.timezone
+
+def forwards_func(apps, schema_editor):
+    Message = apps.get_model("threads", "Message")
+    db_alias = schema_editor.connection.alias
+    Message.objects.using(db_alias).update(change_date=F("post_date"))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('threads', '0003_message_edited'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='change_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text=b'The date this message was last posted or edited.', auto_now=True),
+            preserve_default=False,
+        ),
+        migrations.RunPython(
+            forwards_func,
+        ),
+    ]
@@ -8,7 +8,8 @@ from django.contrib.auth.models import User, Group, Permission
 from django.core.urlresolvers import reverse
 from django.db import models
 
-from base.models import UserProfile
+from base import counters
+from base.models import UserProfile, count_activity
 
 class Thread(models.Model):
     '''
@@ -88,6 +89,10 @@ class Message(models.Model):
     edited = models.BooleanField(
         default=False,
         )
+    change_date = models.DateTimeField(
+        auto_now=True,
+        help_text="The date this message was last posted or edited.",
+        )
 
     def __str__(self):
         return self.__unicode__()
@@ -107,20 +112,27 @@ def pre_save_thread(sender, instance, **kwargs):
 
 def post_save_thread(sender, instance, created, **kwargs):
     thread = instance
-    if not created and thread.number_of_messages == 0:
+    if created:
+        count_activity(thread.owner_id, "number_of_threads", 1)
+    elif thread.number_of_messages == 0:
         thread.delete()
 
+def post_delete_thread(sender, instance, **kwargs):
+    count_activity(instance.owner_id, "number_of_threads", -1)
+
 def post_save_message(sender, instance, created, **kwargs):
     message = instance
     thread = message.thread
 
     if created:
         thread.change_date = message.post_date
+        count_activity(message.owner_id, "number_of_messages", 1)
 
     thread.save()
 
 def post_delete_message(sender, instance, **kwargs):
     message = instance
+    count_activity(message.owner_id, "number_of_messages", -1)
     message.thread.save()
 
 # Connect signals with their respective functions from above.
@@ -129,3 +141,7 @@ models.signals.post_save.connect(post_save_message, sender=Message)
 models.signals.post_delete.connect(post_delete_message, sender=Message)
 models.signals.pre_save.connect(pre_save_thread, sender=Thread)
 models.signals.post_save.connect(post_save_thread, sender=Thread)
+models.signals.post_delete.connect(post_delete_thread, sender=Thread)
+
+counters.register("threads", Thread)
+counters.register("messages", Message)
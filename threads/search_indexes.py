@@ -12,30 +12,46 @@ from haystack import indexes
 from threads.models import Thread, Message
 
 class ThreadIndex(indexes.SearchIndex, indexes.Indexable):
-    ''' Index for Threads. '''
+    ''' Index for Threads. Results render from the stored fields alone. '''
+    load_object = False
+
     text = indexes.EdgeNgramField(document=True, use_template=True)
     owner = indexes.EdgeNgramField(model_attr='owner')
+    owner_username = indexes.CharField(model_attr='owner__user__username', indexed=False)
     exact_user = indexes.CharField(model_attr='owner', faceted=True)
     subject = indexes.EdgeNgramField(model_attr='subject', boost=1.125)
     start_date = indexes.DateTimeField(model_attr='start_date')
     change_date = indexes.DateTimeField(model_attr='change_date')
+    number_of_messages = indexes.IntegerField(model_attr='number_of_messages', indexed=False)
     
     def get_model(self):
         return Thread
     
+    def get_updated_field(self):
+        return 'change_date'
+    
     def index_queryset(self, using=None):
-        return self.get_model().objects.filter(active=True)
+        return self.get_model().objects.filter(active=True) \
+          .select_related('owner__user')
 
 class MessageIndex(indexes.SearchIndex, indexes.Indexable):
-    ''' Index for Messages. '''
+    ''' Index for Messages. Results render from the stored fields alone. '''
+    load_object = False
+
     text = indexes.EdgeNgramField(document=True, use_template = True)
     owner = indexes.EdgeNgramField(model_attr='owner')
     exact_user = indexes.CharField(model_attr='owner', faceted=True)
     body = indexes.EdgeNgramField(model_attr='body')
     post_date = indexes.DateTimeField(model_attr='post_date')
+    thread_pk = indexes.IntegerField(model_attr='thread__pk', indexed=False)
+    thread_subject = indexes.CharField(model_attr='thread__subject', indexed=False)
     
     def get_model(self):
         return Message
     
+    def get_updated_field(self):
+        return 'change_date'
+    
     def index_queryset(self, using=None):
-        return self.get_model().objects.filter(thread__active=True)
+        return self.get_model().objects.filter(thread__active=True) \
+          .select_related('owner__user', 'thread')
@@ -25,6 +25,17 @@ def display_user(value, arg):
     else:
         return value.user.get_full_name()
 
+@register.filter
+def is_logged_in_user(value, arg):
+    ''' Return whether display_user would show 'You' for this username.
+        Parameters:
+            value should be a username
+            arg should be another user.
+        Used with search results, which store the owner's username rather than
+        the profile.
+    '''
+    return value == arg.username and arg.username != ANONYMOUS_USERNAME
+
 @register.filter
 def show_404_subtext(value):
     ''' Return a random string to show underneath the 404 title in the 404 page.
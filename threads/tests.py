@@ -10,8 +10,9 @@ from django.core.urlresolvers import reverse
 from utils.variables import MESSAGES
 from base.models import UserProfile
 from threads.models import Thread, Message
+from utils.testing import QueryBudgetMixin
 
-class VerifyThread(TestCase):
+class VerifyThread(QueryBudgetMixin, TestCase):
     def setUp(self):
         self.u = User.objects.create_user(username="u", password="pwd")
 
@@ -30,6 +31,16 @@ class VerifyThread(TestCase):
 
         self.client.login(username="u", password="pwd")
 
+    def get_query_budgets(self):
+        return [
+            (reverse("threads:list_all_threads"), 10),
+            (reverse("threads:view_thread", kwargs={"pk": self.thread.pk}), 20),
+            (reverse("threads:list_user_threads",
+                     kwargs={"targetUsername": self.u.username}), 12),
+            (reverse("threads:list_user_messages",
+                     kwargs={"targetUsername": self.u.username}), 13),
+        ]
+
     def test_thread_created(self):
         self.assertEqual(1, Thread.objects.all().count())
         self.assertEqual(self.thread, Thread.objects.get(pk=self.thread.pk))
@@ -16,6 +16,7 @@ from django.template import RequestContext
 import inflect
 p = inflect.engine()
 
+from base.counters import get_counts
 from base.models import UserProfile
 from utils.variables import MESSAGES
 from base.decorators import profile_required, ajax_capable
@@ -24,8 +25,9 @@ from threads.forms import ThreadForm, MessageForm, EditMessageForm, \
     EditThreadForm, DeleteMessageForm, FollowThreadForm
 
 def add_archive_context(request):
-    thread_count = Thread.objects.all().count()
-    message_count = Message.objects.all().count()
+    counts = get_counts()
+    thread_count = counts["threads"]
+    message_count = counts["messages"]
     nodes = [
         "{} {}".format(thread_count, p.plural("thread", thread_count)),
         "{} {}".format(message_count, p.plural("message", message_count)),
@@ -35,7 +37,7 @@ def add_archive_context(request):
             "All Threads",
             reverse("threads:list_all_threads"),
             "glyphicon-comment",
-            Thread.objects.all().count()
+            thread_count,
         ),
     ]
     return nodes, render_list
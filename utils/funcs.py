@@ -9,6 +9,7 @@ A collection of functions used elsewhere in Farnsworth.
 import re
 
 from django import forms
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 def form_add_error(form, field, error):
     try:
@@ -51,3 +52,14 @@ def convert_to_url(actual):
         replace the character & by the string 'and'
     '''
     return re.sub("['?$^%@!#*()=+;:|/.,]", '', actual.lower().replace(' ', '_').replace('&', 'and'))
+
+def get_page(objects, per_page, page):
+    ''' The page numbered page of objects, the first if page is not a number
+    or the last if it is out of range. '''
+    paginator = Paginator(objects, per_page)
+    try:
+        return paginator.page(page)
+    except PageNotAnInteger:
+        return paginator.page(1)
+    except EmptyPage:
+        return paginator.page(paginator.num_pages)
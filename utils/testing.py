@@ -0,0 +1,67 @@
+'''
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+Query budgets for test cases, so that a change that makes a view run more
+queries fails the tests instead of slowing the site down.
+'''
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from base.profiling import duplicate_shapes
+
+
+class _AssertMaxQueriesContext(CaptureQueriesContext):
+    def __init__(self, test_case, budget, label):
+        self.test_case = test_case
+        self.budget = budget
+        self.label = label
+        super(_AssertMaxQueriesContext, self).__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super(_AssertMaxQueriesContext, self).__exit__(
+            exc_type, exc_value, traceback,
+        )
+        if exc_type is not None or len(self) <= self.budget:
+            return
+        lines = [
+            "{0} ran {1} queries, over its budget of {2}.".format(
+                self.label, len(self), self.budget,
+            ),
+        ]
+        lines.extend(
+            "Repeated {0} times: {1}".format(count, shape)
+            for shape, count in duplicate_shapes(self.captured_queries)
+        )
+        self.test_case.fail("\n".join(lines))
+
+
+class QueryBudgetMixin(object):
+    '''
+    Mixed into a TestCase, checks that GETs of the URLs returned by
+    get_query_budgets succeed without running more than their budget of
+    queries, starting from an empty cache. Budgets may also be checked
+    directly with assertMaxQueries.
+    '''
+
+    def get_query_budgets(self):
+        ''' A list of (url, budget), for the client set up by setUp. '''
+        return []
+
+    def assertMaxQueries(self, budget, label="The block"):
+        '''
+        A context manager that fails if the block runs more than budget
+        queries, listing the queries it repeated.
+        '''
+        return _AssertMaxQueriesContext(self, budget, label)
+
+    def test_query_budgets(self):
+        # Budgets are for the worst case, with nothing cached
+        for url, budget in self.get_query_budgets():
+            cache.clear()
+            with self.assertMaxQueries(budget, label=url):
+                response = self.client.get(url)
+            self.assertEqual(200, response.status_code, url)
@@ -77,6 +77,23 @@ Thank you,
 
 
 
+This message was auto-generated by Farnsworth (https://www.github.com/knagra/farnsworth).'''
+
+# The e-mail subject used for notification digests.
+DIGEST_SUBJECT = u"[Farnsworth - {house}] Your notifications"
+
+# The e-mail template used for notification digests.
+DIGEST_EMAIL = u'''Dear {full_name},
+
+Here is what happened on the house site for {house} since your last digest:
+
+{notifications}
+
+You can manage your e-mail preferences from this page: {profile_url}
+
+
+
+
 This message was auto-generated by Farnsworth (https://www.github.com/knagra/farnsworth).'''
 
 # The e-mail subject used when sending announcement e-mails.
@@ -215,11 +232,11 @@ MESSAGES = {
     'INACTIVE_MANAGER': u"{managerTitle} is currently deactivated.",
     'REQUEST_TYPE_ADDED': u"Request type {typeName} has been successfully added.",
     'REQUEST_TYPE_SAVED': u"Request type {typeName} has been successfully saved.",
-    'PROFILE_REQUEST_APPROVAL_EMAIL': u" A profile request approval e-mail was successfully sent to {full_name} at <a title=\"Write E-mail\" href=\"mailto:{email}\" class=\"alert-link\">{email}</a>.", # The initial space is necessary.
-    'PROFILE_REQUEST_DELETION_EMAIL': u" A profile request deletion e-mail was successfully sent to {full_name} at <a title=\"Write E-mail\" href=\"mailto:{email}\" class=\"alert-link\">{email}</a>.", # The initial space is necessary.
+    'PROFILE_REQUEST_APPROVAL_EMAIL': u" A profile request approval e-mail will be sent to {full_name} at <a title=\"Write E-mail\" href=\"mailto:{email}\" class=\"alert-link\">{email}</a>.", # The initial space is necessary.
+    'PROFILE_REQUEST_DELETION_EMAIL': u" A profile request deletion e-mail will be sent to {full_name} at <a title=\"Write E-mail\" href=\"mailto:{email}\" class=\"alert-link\">{email}</a>.", # The initial space is necessary.
     'EMAIL_FAIL': u"Farnsworth failed at sending an e-mail to <a title=\"Write E-mail\" href=\"mailto:{email}\" class=\"alert-link\">{email}</a>.",
     'NO_WORKSHIFT': u"You have not been set up for workshift this semester.",
     'MULTIPLE_CURRENT_SEMESTERS': u"Multiple current workshift semesters were detected. Farnsworth chose the semester with the latest start date as the current semester.  If you are not the workshift manager or the site admin, please inform both the site admin (<a href=\"mailto:{admin_email}\">{admin_email}</a>) and the workshift manager(s){workshift_emails} with this information.",
     'ANNOUNCEMENT_FAIL': u"Farnsworth failed to e-mail your announcement.",
-    'ANNOUNCEMENT_SUCCESS': u"Farnsworth successfully e-mailed your announcement.",
+    'ANNOUNCEMENT_SUCCESS': u"Farnsworth will e-mail your announcement shortly.",
 }
@@ -0,0 +1,186 @@
+"""
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+
+Streaming exports of a semester's workshift instances, shift log entries and
+pool hours. Rows are read in primary key order, EXPORT_CHUNK_SIZE at a time,
+as plain values rather than model instances, so memory use does not grow with
+the size of the semester.
+"""
+
+from __future__ import absolute_import
+
+import csv
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import json
+
+from django.conf import settings
+from django.utils.encoding import force_bytes
+from django.utils.timezone import get_current_timezone, localtime, \
+     make_aware
+
+from workshift.models import WorkshiftInstance, ShiftLogEntry, PoolHours
+
+# Column headers and the lookups they are read from, for each kind of export
+COLUMNS = {
+    "instances": [
+        ("id", "pk"),
+        ("date", "date"),
+        ("title", "title"),
+        ("pool", "pool__title"),
+        ("workshift_type", "workshift_type__title"),
+        ("workshifter", "workshifter__user__username"),
+        ("liable", "liable__user__username"),
+        ("verifier", "verifier__user__username"),
+        ("start_time", "start_time"),
+        ("end_time", "end_time"),
+        ("week_long", "week_long"),
+        ("intended_hours", "intended_hours"),
+        ("hours", "hours"),
+        ("closed", "closed"),
+        ("blown", "blown"),
+        ("verify", "verify"),
+    ],
+    "logs": [
+        ("id", "pk"),
+        ("entry_time", "entry_time"),
+        ("entry_type", "entry_type"),
+        ("member", "person__user__username"),
+        ("hours", "hours"),
+        ("note", "note"),
+    ],
+    "hours": [
+        ("id", "pk"),
+        ("pool", "pool__title"),
+        ("member", "workshiftprofile__user__username"),
+        ("hours", "hours"),
+        ("assigned_hours", "assigned_hours"),
+        ("hour_adjustment", "hour_adjustment"),
+        ("standing", "standing"),
+        ("first_date_standing", "first_date_standing"),
+        ("second_date_standing", "second_date_standing"),
+        ("third_date_standing", "third_date_standing"),
+        ("last_updated", "last_updated"),
+    ],
+}
+
+FORMATS = {
+    "csv": "text/csv",
+    "json": "application/json",
+}
+
+
+def _day_start(day):
+    return make_aware(datetime.combine(day, time.min), get_current_timezone())
+
+
+def get_export_queryset(kind, semester, pool=None, start_date=None,
+                        end_date=None, member=None):
+    """
+    The rows of one kind of export for a semester. Pool hours have no date,
+    so the date range does not apply to them.
+    """
+    if kind == "instances":
+        queryset = WorkshiftInstance.objects.filter(semester=semester)
+        if pool is not None:
+            queryset = queryset.filter(pool=pool)
+        if start_date is not None:
+            queryset = queryset.filter(date__gte=start_date)
+        if end_date is not None:
+            queryset = queryset.filter(date__lte=end_date)
+        if member is not None:
+            queryset = queryset.filter(workshifter__user__username=member)
+    elif kind == "logs":
+        queryset = ShiftLogEntry.objects.filter(person__semester=semester)
+        if pool is not None:
+            queryset = queryset.filter(workshiftinstance__pool=pool).distinct()
+        if start_date is not None:
+            queryset = queryset.filter(entry_time__gte=_day_start(start_date))
+        if end_date is not None:
+            queryset = queryset.filter(
+                entry_time__lt=_day_start(end_date + timedelta(days=1)),
+            )
+        if member is not None:
+            queryset = queryset.filter(person__user__username=member)
+    elif kind == "hours":
+        queryset = PoolHours.objects.filter(pool__semester=semester)
+        if pool is not None:
+            queryset = queryset.filter(pool=pool)
+        if member is not None:
+            queryset = queryset.filter(
+                workshiftprofile__user__username=member,
+            )
+    else:
+        raise ValueError("Unknown export: {0}".format(kind))
+    return queryset
+
+
+def iter_rows(queryset, lookups, chunk_size=None):
+    """
+    Yields a tuple of values for each object in queryset. The first lookup
+    must be "pk"; each chunk starts after the last primary key of the one
+    before, so no query has to skip over rows that were already read.
+    """
+    if chunk_size is None:
+        chunk_size = settings.EXPORT_CHUNK_SIZE
+    last_pk = None
+    while True:
+        chunk = queryset.order_by("pk")
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        count = 0
+        for row in chunk.values_list(*lookups)[:chunk_size].iterator():
+            count += 1
+            last_pk = row[0]
+            yield row
+        if count < chunk_size:
+            break
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return localtime(value).isoformat()
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+class _Echo(object):
+    """ A file-like object for csv.writer that returns what is written. """
+    def write(self, value):
+        return value
+
+
+def iter_csv(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([
+            "" if value is None else force_bytes(_value(value))
+            for value in row
+        ])
+
+
+def iter_json(headers, rows):
+    """ Yields a JSON list of objects, one row at a time. """
+    yield "["
+    separator = ""
+    for row in rows:
+        yield separator + json.dumps(
+            dict(zip(headers, [_value(value) for value in row])),
+            sort_keys=True,
+        )
+        separator = ","
+    yield "]"
+
+
+def iter_export(kind, fmt, queryset):
+    headers = [header for header, _ in COLUMNS[kind]]
+    rows = iter_rows(queryset, [lookup for _, lookup in COLUMNS[kind]])
+    if fmt == "csv":
+        return iter_csv(headers, rows)
+    return iter_json(headers, rows)
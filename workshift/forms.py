@@ -6,18 +6,20 @@ Authors: Karandeep Singh Nagra and Nader Morshed
 
 from __future__ import absolute_import
 
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+from decimal import Decimal
 
 from django import forms
 from django.conf import settings
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import F, Q
 from django.forms.models import BaseModelFormSet, modelformset_factory
 
-from notifications import notify
 from django_select2.widgets import Select2MultipleWidget
 
+from base.fanout import make_event, notify_many, send_events
 from base.models import UserProfile
-from managers.models import Manager
+from base.permissions import get_capabilities
 from workshift.models import Semester, WorkshiftPool, WorkshiftType, \
     TimeBlock, WorkshiftRating, WorkshiftProfile, \
     RegularWorkshift, ShiftLogEntry, InstanceInfo, WorkshiftInstance, \
@@ -115,7 +117,8 @@ class WorkshiftInstanceForm(forms.ModelForm):
     class Meta:
         model = WorkshiftInstance
         exclude = ("weekly_workshift", "info", "intended_hours", "logs",
-                   "blown", "semester", "verifier", "liable",)
+                   "blown", "semester", "verifier", "liable") + \
+                   WorkshiftInstance.info_fields
 
     weekly_workshift = forms.ModelChoiceField(
         required=False,
@@ -256,6 +259,41 @@ def _undo_verify_blown(instance, pool_hours):
         instance.closed = False
         pool_hours.standing -= instance.hours
 
+def _verify_error(instance, profile, user_profile, managers, pool_managers,
+                  undo=False):
+    """
+    Returns the reason profile may not verify instance, or None if they may.
+    managers are the verifier's manager positions and pool_managers the
+    managers of the instance's pool.
+    """
+    workshifter = instance.workshifter or instance.liable
+
+    if not workshifter:
+        return "Workshift is not filled."
+    if user_profile.status not in \
+      [UserProfile.RESIDENT, UserProfile.BOARDER]:
+        return "Verifier is not a member or boarder."
+
+    if instance.verify == AUTO_VERIFY:
+        return "Workshift is automatically verified."
+    elif instance.verify == WORKSHIFT_MANAGER_VERIFY:
+        if not any(i.workshift_manager for i in managers):
+            return "Verifier is not a workshift manager."
+    elif instance.verify == POOL_MANAGER_VERIFY:
+        if not set(managers).intersection(pool_managers):
+            return "Verifier is not in the list of managers for this pool."
+    elif instance.verify == ANY_MANAGER_VERIFY:
+        if not len(managers):
+            return "Verifier is not a manager."
+    elif instance.verify == OTHER_VERIFY:
+        if workshifter == profile:
+            return "Workshifter cannot verify self."
+
+    if utils.past_verify(instance) and not undo:
+        return "Workshift is past verification period."
+
+    return None
+
 class VerifyShiftForm(InteractShiftForm):
     title_short = '<span class="glyphicon glyphicon-ok"></span>'
     title_long = "Verify"
@@ -264,33 +302,15 @@ class VerifyShiftForm(InteractShiftForm):
     def clean_pk(self):
         instance = super(VerifyShiftForm, self).clean_pk()
 
-        workshifter = instance.workshifter or instance.liable
-        user_profile = UserProfile.objects.get(user=self.profile.user)
-        managers = Manager.objects.filter(incumbent=user_profile)
+        capabilities = get_capabilities(self.profile.user)
 
-        if not workshifter:
-            raise forms.ValidationError("Workshift is not filled.")
-        if user_profile.status not in \
-          [UserProfile.RESIDENT, UserProfile.BOARDER]:
-            raise forms.ValidationError("Verifier is not a member or boarder.")
-
-        if instance.verify == AUTO_VERIFY:
-            raise forms.ValidationError("Workshift is automatically verified.")
-        elif instance.verify == WORKSHIFT_MANAGER_VERIFY:
-            if not any(i.workshift_manager for i in managers):
-                raise forms.ValidationError("Verifier is not a workshift manager.")
-        elif instance.verify == POOL_MANAGER_VERIFY:
-            if not set(managers).intersection(instance.pool.managers):
-                raise forms.ValidationError("Verifier is not in the list of managers for this pool.")
-        elif instance.verify == ANY_MANAGER_VERIFY:
-            if not managers.count():
-                raise forms.ValidationError("Verifier is not a manager.")
-        elif instance.verify == OTHER_VERIFY:
-            if workshifter == self.profile:
-                raise forms.ValidationError("Workshifter cannot verify self.")
-
-        if utils.past_verify(instance) and not self.undo:
-            raise forms.ValidationError("Workshift is past verification period.")
+        error = _verify_error(
+            instance, self.profile, capabilities.profile,
+            capabilities.positions, instance.pool.managers.all(),
+            undo=self.undo,
+        )
+        if error:
+            raise forms.ValidationError(error)
 
         return instance
 
@@ -318,11 +338,11 @@ class VerifyShiftForm(InteractShiftForm):
         pool_hours.save(update_fields=["standing"])
 
         if self.profile != workshifter:
-            notify.send(
+            notify_many(
                 self.profile.user,
+                [workshifter.user],
                 verb="verified",
                 action_object=instance,
-                recipient=workshifter.user,
             )
 
         return instance
@@ -365,11 +385,11 @@ class UnVerifyShiftForm(InteractShiftForm):
         )
 
         if self.profile != workshifter:
-            notify.send(
+            notify_many(
                 self.profile.user,
+                [workshifter.user],
                 verb="unverified",
                 action_object=instance,
-                recipient=workshifter.user,
             )
 
         return instance
@@ -423,13 +443,12 @@ class BlownShiftForm(InteractShiftForm):
         for manager in instance.pool.managers.all():
             if manager.incumbent and manager.incumbent.user != self.profile.user:
                 targets.append(manager.incumbent.user)
-        for target in targets:
-            notify.send(
-                self.profile.user,
-                verb="marked as blown",
-                action_object=instance,
-                recipient=target,
-                )
+        notify_many(
+            self.profile.user,
+            targets,
+            verb="marked as blown",
+            action_object=instance,
+        )
 
         return instance
 
@@ -484,13 +503,12 @@ class UnBlownShiftForm(InteractShiftForm):
         for manager in instance.pool.managers.all():
             if manager.incumbent and manager.incumbent.user != self.profile.user:
                 targets.append(manager.incumbent.user)
-        for target in targets:
-            notify.send(
-                self.profile.user,
-                verb="marked as unblown",
-                action_object=instance,
-                recipient=target,
-            )
+        notify_many(
+            self.profile.user,
+            targets,
+            verb="marked as unblown",
+            action_object=instance,
+        )
 
         return instance
 
@@ -1060,6 +1078,8 @@ class FineDateForm(forms.Form):
         threshold = self.cleaned_data["threshold"]
 
         fined = []
+        # Members to notify, by the notification's verb
+        notices = defaultdict(list)
 
         for profile in WorkshiftProfile.objects.filter(semester=self.semester):
             pool_hours = profile.pool_hours.get(pool=pool)
@@ -1075,11 +1095,7 @@ class FineDateForm(forms.Form):
                     "second_date_standing",
                     "third_date_standing",
                 ])
-                notify.send(
-                    pool,
-                    verb="had its workshift fine cleared.",
-                    recipient=profile.user,
-                )
+                notices["had its workshift fine cleared."].append(profile.user)
                 continue
 
             standing = pool_hours.standing + offset
@@ -1098,15 +1114,228 @@ class FineDateForm(forms.Form):
                     "third_date_standing",
                 ])
                 fined.append(profile)
-                notify.send(
-                    pool,
-                    verb="generated a workshift fine of {0}"
-                    .format(currency(fine)),
-                    recipient=profile.user,
-                )
+                notices["generated a workshift fine of {0}"
+                        .format(currency(fine))].append(profile.user)
+
+        for verb, users in notices.items():
+            notify_many(pool, users, verb=verb)
 
         return fined
 
+class BatchInteractForm(forms.Form):
+    """
+    Verifies or blows a list of workshift instances at once. Permissions are
+    checked once per pool and every change is written inside a single
+    transaction, in bulk apart from the log entries.
+    """
+    VERIFY = "verify"
+    BLOWN = "blown"
+    ACTION_CHOICES = (
+        (VERIFY, "Verify"),
+        (BLOWN, "Blown"),
+    )
+    pks = forms.CharField(
+        help_text="Comma separated list of workshift instance pks.",
+    )
+    action = forms.ChoiceField(choices=ACTION_CHOICES)
+    note = forms.CharField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        self.profile = kwargs.pop("profile")
+        self.semester = kwargs.pop("semester")
+        self.undo = kwargs.pop("undo", False)
+        super(BatchInteractForm, self).__init__(*args, **kwargs)
+
+    def clean_pks(self):
+        try:
+            pks = set(
+                int(pk) for pk in self.cleaned_data["pks"].split(",")
+                if pk.strip()
+            )
+        except ValueError:
+            raise forms.ValidationError("Invalid list of workshifts.")
+        if not pks:
+            raise forms.ValidationError("No workshifts selected.")
+        return sorted(pks)
+
+    def _get_instances(self, pks):
+        instances = {}
+        for index in range(0, len(pks), 500):
+            instances.update(
+                (instance.pk, instance)
+                for instance in WorkshiftInstance.objects.filter(
+                    pk__in=pks[index:index + 500],
+                    semester=self.semester,
+                ).select_related("pool", "workshifter__user", "liable__user")
+            )
+        return instances
+
+    def _get_pool_hours(self, instances):
+        """
+        Map each (workshifter pk, pool pk) pair to the pk of its PoolHours.
+        """
+        workshifter_pks = list(set(
+            (instance.workshifter or instance.liable).pk
+            for instance in instances
+        ))
+        pool_pks = set(instance.pool_id for instance in instances)
+        pool_hours = {}
+        for index in range(0, len(workshifter_pks), 500):
+            pool_hours.update(
+                ((profile_pk, pool_pk), pk)
+                for pk, pool_pk, profile_pk in PoolHours.objects.filter(
+                    pool__in=pool_pks,
+                    workshiftprofile__in=workshifter_pks[index:index + 500],
+                ).values_list("pk", "pool", "workshiftprofile")
+            )
+        return pool_hours
+
+    def _check(self, instances, pks):
+        """
+        Returns the instances the action may be applied to along with a
+        dictionary of errors for the others, keyed by pk.
+        """
+        action = self.cleaned_data["action"]
+        user = self.profile.user
+        capabilities = get_capabilities(user)
+        user_profile = capabilities.profile
+        managers = capabilities.positions
+        pool_managers, pool_permissions = {}, {}
+
+        valid, errors = [], {}
+        for pk in pks:
+            instance = instances.get(pk)
+            if instance is None:
+                errors[pk] = "Workshift does not exist."
+                continue
+            if instance.closed and not self.undo:
+                errors[pk] = "Workshift has been closed."
+                continue
+
+            pool = instance.pool
+            if pool.pk not in pool_managers:
+                pool_managers[pool.pk] = list(
+                    pool.managers.select_related("incumbent__user")
+                )
+
+            if action == self.VERIFY:
+                error = _verify_error(
+                    instance, self.profile, user_profile, managers,
+                    pool_managers[pool.pk], undo=self.undo,
+                )
+            elif not instance.workshifter:
+                error = "Workshift is not filled."
+            else:
+                if pool.pk not in pool_permissions:
+                    pool_permissions[pool.pk] = pool.any_blown or \
+                      utils.can_manage(user, semester=self.semester, pool=pool)
+                error = None if pool_permissions[pool.pk] else \
+                  "You are not a workshift manager."
+
+            if error:
+                errors[pk] = error
+            else:
+                valid.append(instance)
+
+        pool_hours = self._get_pool_hours(valid)
+        checked = []
+        for instance in valid:
+            workshifter = instance.workshifter or instance.liable
+            key = (workshifter.pk, instance.pool_id)
+            if key not in pool_hours:
+                errors[instance.pk] = "Workshifter has no hours in this pool."
+            else:
+                instance.pool_hours_pk = pool_hours[key]
+                checked.append(instance)
+
+        return checked, errors, pool_managers
+
+    def _events(self, instances, pool_managers):
+        verb = "verified" if self.cleaned_data["action"] == self.VERIFY \
+          else "marked as blown"
+        events = []
+        for instance in instances:
+            workshifter = instance.workshifter or instance.liable
+            targets = []
+            if self.profile != workshifter:
+                targets.append(workshifter.user)
+            if self.cleaned_data["action"] == self.BLOWN:
+                for manager in pool_managers[instance.pool_id]:
+                    if manager.incumbent and \
+                       manager.incumbent.user != self.profile.user:
+                        targets.append(manager.incumbent.user)
+            events.append(make_event(
+                self.profile.user, targets, verb=verb, action_object=instance,
+            ))
+        return events
+
+    def save(self):
+        """
+        Applies the action, returning a dictionary mapping each requested pk
+        to an error message, or None if the action succeeded.
+        """
+        action = self.cleaned_data["action"]
+        pks = self.cleaned_data["pks"]
+        verify = action == self.VERIFY
+
+        with transaction.atomic():
+            instances = self._get_instances(pks)
+            instances, errors, pool_managers = self._check(instances, pks)
+
+            # Undo any previous verification or blown mark, then apply this one
+            deltas = defaultdict(Decimal)
+            for instance in instances:
+                delta = instance.hours if verify else -instance.hours
+                if instance.blown:
+                    delta += instance.hours
+                if instance.verifier_id:
+                    delta -= instance.hours
+                deltas[instance.pool_hours_pk] += delta
+
+            by_delta = defaultdict(list)
+            for pk, delta in deltas.items():
+                if delta:
+                    by_delta[delta].append(pk)
+            for delta, pool_hours_pks in by_delta.items():
+                for index in range(0, len(pool_hours_pks), 500):
+                    PoolHours.objects.filter(
+                        pk__in=pool_hours_pks[index:index + 500],
+                    ).update(standing=F("standing") + delta)
+
+            instance_pks = [instance.pk for instance in instances]
+            for index in range(0, len(instance_pks), 500):
+                WorkshiftInstance.objects.filter(
+                    pk__in=instance_pks[index:index + 500],
+                ).update(
+                    closed=True,
+                    blown=not verify,
+                    verifier=self.profile if verify else None,
+                )
+
+            entry_type = ShiftLogEntry.VERIFY if verify \
+              else ShiftLogEntry.BLOWN
+            # Entries are saved one at a time to learn their pks, which also
+            # keeps the log entry counter up to date
+            through = WorkshiftInstance.logs.through
+            links = []
+            for instance in instances:
+                entry = ShiftLogEntry.objects.create(
+                    person=self.profile,
+                    entry_type=entry_type,
+                    note=self.cleaned_data["note"] or None,
+                )
+                links.append(through(
+                    workshiftinstance_id=instance.pk,
+                    shiftlogentry_id=entry.pk,
+                ))
+            through.objects.bulk_create(links)
+
+        send_events(self._events(instances, pool_managers))
+
+        results = dict((pk, None) for pk in instance_pks)
+        results.update(errors)
+        return results
+
 INTERACTION_FORMS = [
     UnVerifyShiftForm, VerifyShiftForm, UnBlownShiftForm, BlownShiftForm, SignInForm,
     SignOutForm,
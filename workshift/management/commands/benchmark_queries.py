@@ -0,0 +1,309 @@
+"""
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+"""
+
+from __future__ import absolute_import
+
+from datetime import date, time, timedelta
+from optparse import make_option
+from random import Random
+from time import time as now
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from base.models import UserProfile
+from managers.models import Request, RequestType
+from workshift.models import Semester, WorkshiftPool, WorkshiftType, \
+     WorkshiftProfile, PoolHours, ShiftLogEntry, WorkshiftInstance
+
+# Far enough in the future to never collide with real semesters
+FIRST_YEAR = 2100
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Build a synthetic multi-year dataset inside a transaction, " \
+      "then record the query plans and latencies of the hot workshift " \
+      "queries against it. Nothing is left in the database afterwards."
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "--years",
+            dest="years",
+            default=5,
+            type="int",
+            help="Number of years of semesters to generate.",
+        ),
+        make_option(
+            "--members",
+            dest="members",
+            default=40,
+            type="int",
+            help="Number of workshifters in each semester.",
+        ),
+        make_option(
+            "--repeat",
+            dest="repeat",
+            default=20,
+            type="int",
+            help="Number of times to run each query.",
+        ),
+        make_option(
+            "--output",
+            dest="output",
+            default=None,
+            help="File to write the report to, defaults to stdout.",
+        ),
+    )
+
+    def handle(self, *args, **options):
+        self.lines = []
+        try:
+            with transaction.atomic():
+                start = now()
+                semester, profile, request_type = self._populate(
+                    years=options["years"],
+                    members=options["members"],
+                )
+                self._write(
+                    "Populated {0} instances in {1:.2f}s".format(
+                        WorkshiftInstance.objects.count(), now() - start,
+                    )
+                )
+                self._run_queries(
+                    semester, profile, request_type, options["repeat"],
+                )
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        report = "\n".join(self.lines) + "\n"
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(report)
+        else:
+            self.stdout.write(report, ending="")
+
+    def _write(self, line=""):
+        self.lines.append(line)
+
+    def _populate(self, years, members):
+        rand = Random(0)
+        seasons = [Semester.SPRING, Semester.SUMMER, Semester.FALL]
+        Semester.objects.bulk_create([
+            Semester(
+                season=season,
+                year=year,
+                start_date=date(year, 1 + 4 * index, 1),
+                end_date=date(year, 4 + 4 * index, 28),
+            )
+            for year in range(FIRST_YEAR, FIRST_YEAR + years)
+            for index, season in enumerate(seasons)
+        ])
+        semesters = list(
+            Semester.objects.filter(year__gte=FIRST_YEAR).order_by("start_date")
+        )
+
+        WorkshiftPool.objects.bulk_create([
+            WorkshiftPool(semester=semester, title="Regular Workshift",
+                          is_primary=True)
+            for semester in semesters
+        ])
+        pools = dict(
+            (pool.semester_id, pool)
+            for pool in WorkshiftPool.objects.filter(semester__in=semesters)
+        )
+
+        prefix = "bench{0}_".format(FIRST_YEAR)
+        User.objects.bulk_create([
+            User(username="{0}{1}".format(prefix, i))
+            for i in range(members)
+        ])
+        users = list(User.objects.filter(username__startswith=prefix))
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user) for user in users
+        ])
+        user_profiles = list(UserProfile.objects.filter(user__in=users))
+
+        WorkshiftProfile.objects.bulk_create([
+            WorkshiftProfile(user=user, semester=semester)
+            for semester in semesters
+            for user in users
+        ])
+        profiles = list(
+            WorkshiftProfile.objects.filter(semester__in=semesters)
+        )
+        PoolHours.objects.bulk_create([
+            PoolHours(pool=pools[profile.semester_id]) for profile in profiles
+        ])
+        # Each pool has one row per profile, pair them up in the same order
+        pool_hours = {}
+        for hours in PoolHours.objects.filter(pool__in=pools.values()) \
+          .order_by("pk"):
+            pool_hours.setdefault(hours.pool_id, []).append(hours)
+        through = WorkshiftProfile.pool_hours.through
+        rows = []
+        for semester in semesters:
+            semester_profiles = [
+                profile for profile in profiles
+                if profile.semester_id == semester.pk
+            ]
+            for profile, hours in zip(
+                    semester_profiles, pool_hours[pools[semester.pk].pk]):
+                rows.append(
+                    through(workshiftprofile=profile, poolhours=hours)
+                )
+        through.objects.bulk_create(rows)
+
+        WorkshiftType.objects.bulk_create([
+            WorkshiftType(title="{0}{1}".format(prefix, i))
+            for i in range(10)
+        ])
+        types = list(WorkshiftType.objects.filter(title__startswith=prefix))
+
+        profiles_by_semester = {}
+        for profile in profiles:
+            profiles_by_semester.setdefault(profile.semester_id, []) \
+              .append(profile)
+
+        today = date(FIRST_YEAR + years // 2, 6, 1)
+        instances = []
+        for semester in semesters:
+            day = semester.start_date
+            while day <= semester.end_date:
+                for index, workshift_type in enumerate(types):
+                    workshifter = rand.choice(
+                        profiles_by_semester[semester.pk] + [None]
+                    )
+                    instances.append(WorkshiftInstance(
+                        semester=semester,
+                        date=day,
+                        workshifter=workshifter,
+                        liable=workshifter,
+                        closed=day < today and workshifter is not None,
+                        title=workshift_type.title,
+                        workshift_type=workshift_type,
+                        pool=pools[semester.pk],
+                        start_time=time(8 + index),
+                        end_time=time(9 + index),
+                    ))
+                day += timedelta(days=1)
+        WorkshiftInstance.objects.bulk_create(instances, batch_size=500)
+
+        entry_types = [choice for choice, _ in ShiftLogEntry.ENTRY_CHOICES]
+        ShiftLogEntry.objects.bulk_create([
+            ShiftLogEntry(
+                person=profile,
+                entry_type=rand.choice(entry_types),
+            )
+            for profile in profiles
+            for _ in range(20)
+        ], batch_size=500)
+
+        request_type = RequestType.objects.create(
+            name="{0}requests".format(prefix),
+            url_name="{0}requests".format(prefix),
+        )
+        statuses = [choice for choice, _ in Request.STATUS_CHOICES]
+        Request.objects.bulk_create([
+            Request(
+                owner=rand.choice(user_profiles),
+                body="Synthetic request",
+                request_type=request_type,
+                status=rand.choice(statuses),
+            )
+            for _ in range(members * years * 20)
+        ], batch_size=500)
+
+        semester = [
+            semester for semester in semesters
+            if semester.start_date <= today <= semester.end_date
+        ][0]
+        profile = profiles_by_semester[semester.pk][0]
+        return semester, profile, request_type
+
+    def _explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        if connection.vendor == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            prefix = "EXPLAIN "
+        cursor = connection.cursor()
+        cursor.execute(prefix + sql, params)
+        return [
+            " ".join(str(column) for column in row)
+            for row in cursor.fetchall()
+        ]
+
+    def _time(self, title, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = now()
+            list(queryset.all())
+            timings.append((now() - start) * 1000)
+        timings.sort()
+
+        self._write(title)
+        for line in self._explain(queryset):
+            self._write("    " + line)
+        self._write(
+            "    median {0:.2f}ms, max {1:.2f}ms over {2} runs".format(
+                timings[len(timings) // 2], timings[-1], len(timings),
+            )
+        )
+        self._write()
+
+    def _run_queries(self, semester, profile, request_type, repeat):
+        today = date(semester.year, 6, 1)
+        queries = [
+            (
+                "Blown shifts (collect_blown)",
+                WorkshiftInstance.objects.filter(
+                    semester=semester, closed=False, date__lte=today,
+                ),
+            ),
+            (
+                "Upcoming shifts for a workshifter",
+                WorkshiftInstance.objects.filter(
+                    workshifter=profile, closed=False,
+                    date__gte=today, date__lte=today + timedelta(days=7),
+                ),
+            ),
+            (
+                "Open shifts",
+                WorkshiftInstance.objects.filter(
+                    closed=False, workshifter=None,
+                ).order_by("date")[:50],
+            ),
+            (
+                "Past shifts for a workshifter",
+                WorkshiftInstance.objects.filter(
+                    workshifter=profile, closed=True,
+                ),
+            ),
+            (
+                "Pool hours for a workshifter",
+                profile.pool_hours.filter(pool__semester=semester),
+            ),
+            (
+                "Last assignment log entry",
+                ShiftLogEntry.objects.filter(
+                    person=profile, entry_type=ShiftLogEntry.ASSIGNED,
+                ).order_by("-entry_time")[:1],
+            ),
+            (
+                "Open requests of a type",
+                Request.objects.filter(
+                    request_type=request_type, status=Request.OPEN,
+                ),
+            ),
+        ]
+        for title, queryset in queries:
+            self._time(title, queryset, repeat)
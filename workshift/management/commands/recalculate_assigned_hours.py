@@ -0,0 +1,92 @@
+"""
+Project: Farnsworth
+
+Authors: Karandeep Singh Nagra and Nader Morshed
+"""
+
+from __future__ import absolute_import
+
+from optparse import make_option
+from time import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from workshift.models import Semester, WorkshiftPool, WorkshiftProfile
+from workshift import utils
+
+class Command(BaseCommand):
+    help = "Recalculate the hours assigned to each workshifter by their " \
+      "regular workshifts, optionally clearing a pool's assignments first."
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "--semester",
+            dest="semester",
+            default=None,
+            help="Semester to update, as its season and year (i.e. Sp2015). "
+            "Defaults to every semester.",
+        ),
+        make_option(
+            "--clear",
+            action="store_true",
+            dest="clear",
+            default=False,
+            help="Clear all auto-assigned regular workshifts in the pool "
+            "before recalculating.",
+        ),
+        make_option(
+            "--pool",
+            dest="pool",
+            default=None,
+            type="int",
+            help="Primary key of the pool to clear, defaults to the "
+            "semester's primary pool.",
+        ),
+    )
+
+    def _get_semester(self, sem_url):
+        if sem_url is None:
+            return None
+        try:
+            return Semester.objects.get(season=sem_url[:2], year=sem_url[2:])
+        except (Semester.DoesNotExist, ValueError):
+            raise CommandError("Semester {0} does not exist.".format(sem_url))
+
+    def handle(self, *args, **options):
+        semester = self._get_semester(options["semester"])
+
+        if options["clear"]:
+            if semester is None:
+                try:
+                    semester = Semester.objects.get(current=True)
+                except (Semester.DoesNotExist,
+                        Semester.MultipleObjectsReturned):
+                    raise CommandError("Pick a semester to clear.")
+            pool = None
+            if options["pool"] is not None:
+                try:
+                    pool = WorkshiftPool.objects.get(
+                        pk=options["pool"], semester=semester,
+                    )
+                except WorkshiftPool.DoesNotExist:
+                    raise CommandError(
+                        "Pool {0} does not exist in {1}."
+                        .format(options["pool"], semester)
+                    )
+
+            start = time()
+            utils.clear_all_assignments(semester=semester, pool=pool)
+            self.stdout.write(
+                "Cleared assignments in {0:.3f}s".format(time() - start)
+            )
+
+        profiles = WorkshiftProfile.objects.all()
+        if semester is not None:
+            profiles = profiles.filter(semester=semester)
+
+        start = time()
+        utils.calculate_assigned_hours(profiles=profiles)
+        self.stdout.write(
+            "Recalculated assigned hours for {0} workshifters in {1:.3f}s"
+            .format(profiles.count(), time() - start)
+        )
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.db.models.deletion
+
+def forwards_func(apps, schema_editor):
+    RegularWorkshift = apps.get_model("workshift", "RegularWorkshift")
+    InstanceInfo = apps.get_model("workshift", "InstanceInfo")
+    WorkshiftInstance = apps.get_model("workshift", "WorkshiftInstance")
+    db_alias = schema_editor.connection.alias
+    instances = WorkshiftInstance.objects.using(db_alias)
+    for shift in RegularWorkshift.objects.using(db_alias) \
+      .select_related("workshift_type", "pool"):
+        instances.filter(weekly_workshift=shift).update(
+            title=shift.workshift_type.title,
+            workshift_type=shift.workshift_type,
+            pool=shift.pool,
+            verify=shift.verify,
+            week_long=shift.week_long,
+            start_time=shift.start_time,
+            end_time=shift.end_time,
+        )
+    for info in InstanceInfo.objects.using(db_alias).select_related("pool"):
+        instances.filter(info=info).update(
+            title=info.title,
+            pool=info.pool,
+            verify=info.verify,
+            week_long=info.week_long,
+            start_time=info.start_time,
+            end_time=info.end_time,
+        )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workshift', '0004_auto_20150208_1729'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workshiftinstance',
+            name='end_time',
+            field=models.TimeField(help_text='End time for this workshift.', null=True, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='workshiftinstance',
+            name='pool',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.SET_NULL, blank=True, to='workshift.WorkshiftPool', help_text='The workshift pool for this shift.', null=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='workshiftinstance',
+            name='start_time',
+            field=models.TimeField(help_text='Start time for this workshift.', null=True, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='workshiftinstance',
+            name='title',
+            field=models.CharField(help_text='Title for this shift.', max_length=255, null=True, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='workshiftinstance',
+            name='verify',
+            field=models.CharField(default='O', help_text='Who is able to mark this shift as completed.', max_length=1, choices=[('W', 'Workshift Managers only'), ('P', 'Pool Managers only'), ('M', 'Any Manager'), ('O', 'Another member'), ('S', 'Any member (including self)'), ('A', 'Automatically verified')]),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='workshiftinstance',
+            name='week_long',
+            field=models.BooleanField(default=False, help_text='If this shift is for the entire week.', db_index=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='workshiftinstance',
+            name='workshift_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.SET_NULL, blank=True, to='workshift.WorkshiftType', help_text="The workshift type of this shift's weekly workshift.", null=True),
+            preserve_default=True,
+        ),
+        migrations.AlterField(
+            model_name='workshiftinstance',
+            name='date',
+            field=models.DateField(help_text='Date of this workshift.', db_index=True),
+            preserve_default=True,
+        ),
+        migrations.RunPython(
+            forwards_func,
+        ),
+    ]
+
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workshift', '0005_instance_info_fields'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='shiftlogentry',
+            index_together=set([('person', 'entry_type', 'entry_time')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='workshiftinstance',
+            index_together=set([('workshifter', 'closed'), ('semester', 'closed', 'date'), ('closed', 'date')]),
+        ),
+    ]
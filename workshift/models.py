@@ -12,6 +12,7 @@ from django.db import models
 from django.utils.dateformat import time_format
 
 
+from base import counters
 from base.models import UserProfile
 from utils.variables import ANONYMOUS_USERNAME
 from managers.models import Manager
@@ -660,6 +661,9 @@ class ShiftLogEntry(models.Model):
 
     class Meta:
         ordering = ["-entry_time"]
+        index_together = [
+            ("person", "entry_type", "entry_time"),
+        ]
 
 class InstanceInfo(models.Model):
     """
@@ -722,6 +726,7 @@ class WorkshiftInstance(models.Model):
         help_text="The weekly workshift of which this is an instance.",
     )
     date = models.DateField(
+        db_index=True,
         help_text="Date of this workshift.",
     )
     workshifter = models.ForeignKey(
@@ -773,16 +778,65 @@ class WorkshiftInstance(models.Model):
         help_text="The entries for sign ins, sign outs, and verification.",
     )
 
+    # The fields below are copied from weekly_workshift or info when this
+    # instance is saved, and kept in sync by the handlers in workshift.signals,
+    # so that they can be displayed and filtered on without any joins.
+    title = models.CharField(
+        null=True,
+        blank=True,
+        max_length=255,
+        help_text="Title for this shift.",
+    )
+    workshift_type = models.ForeignKey(
+        WorkshiftType,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        help_text="The workshift type of this shift's weekly workshift.",
+    )
+    pool = models.ForeignKey(
+        WorkshiftPool,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        help_text="The workshift pool for this shift.",
+    )
+    verify = models.CharField(
+        default=OTHER_VERIFY,
+        choices=VERIFY_CHOICES,
+        max_length=1,
+        help_text="Who is able to mark this shift as completed.",
+    )
+    week_long = models.BooleanField(
+        default=False,
+        db_index=True,
+        help_text="If this shift is for the entire week.",
+    )
+    start_time = models.TimeField(
+        null=True,
+        blank=True,
+        help_text="Start time for this workshift.",
+    )
+    end_time = models.TimeField(
+        null=True,
+        blank=True,
+        help_text="End time for this workshift.",
+    )
+
+    # Fields copied from get_info() by sync_info()
+    info_fields = ("title", "workshift_type", "pool", "verify", "week_long",
+                   "start_time", "end_time")
+
+    class Meta:
+        index_together = [
+            ("closed", "date"),
+            ("workshifter", "closed"),
+            ("semester", "closed", "date"),
+        ]
+
     def get_info(self):
         return self.weekly_workshift or self.info
 
-    @property
-    def title(self):
-        if self.weekly_workshift:
-            return self.weekly_workshift.workshift_type.title
-        else:
-            return self.info.title
-
     @property
     def description(self):
         if self.weekly_workshift:
@@ -790,25 +844,35 @@ class WorkshiftInstance(models.Model):
         else:
             return self.info.description
 
-    @property
-    def pool(self):
-        return self.get_info().pool
-
-    @property
-    def verify(self):
-        return self.get_info().verify
-
-    @property
-    def week_long(self):
-        return self.get_info().week_long
-
-    @property
-    def start_time(self):
-        return self.get_info().start_time
-
-    @property
-    def end_time(self):
-        return self.get_info().end_time
+    def sync_info(self):
+        """
+        Copies the title, type, pool, verification, and times of this
+        instance's weekly workshift or info into its own fields.
+        """
+        info = self.get_info()
+        if info is None:
+            return
+        if self.weekly_workshift:
+            self.title = self.weekly_workshift.workshift_type.title
+            self.workshift_type = self.weekly_workshift.workshift_type
+        else:
+            self.title = self.info.title
+            self.workshift_type = None
+        self.pool = info.pool
+        self.verify = info.verify
+        self.week_long = info.week_long
+        self.start_time = info.start_time
+        self.end_time = info.end_time
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields", None)
+        if update_fields is None:
+            self.sync_info()
+        elif "weekly_workshift" in update_fields or "info" in update_fields:
+            self.sync_info()
+            kwargs["update_fields"] = \
+              list(update_fields) + list(self.info_fields)
+        super(WorkshiftInstance, self).save(*args, **kwargs)
 
     def __init__(self, *args, **kwargs):
         if "semester" not in kwargs:
@@ -819,7 +883,7 @@ class WorkshiftInstance(models.Model):
 
         super(WorkshiftInstance, self).__init__(*args, **kwargs)
 
-        if self.weekly_workshift is not None and self.info is not None:
+        if self.weekly_workshift_id is not None and self.info_id is not None:
             raise ValueError("Only one of [weekly_workshift, info] can be set")
 
     def __str__(self):
@@ -857,4 +921,9 @@ class WorkshiftInstance(models.Model):
     def get_edit_url(self):
         return wurl("workshift:edit_instance", pk=self.pk, sem_url=self.semester.sem_url)
 
+counters.register("workshift.semesters", Semester)
+counters.register("workshift.profiles", WorkshiftProfile)
+counters.register("workshift.instances", WorkshiftInstance)
+counters.register("workshift.log_entries", ShiftLogEntry)
+
 from workshift import signals
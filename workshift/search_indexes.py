@@ -24,6 +24,10 @@ class SemesterIndex(indexes.SearchIndex, indexes.Indexable):
     def index_queryset(self, using=None):
         return self.get_model().objects.all()
 
+    def read_queryset(self, using=None):
+        return self.index_queryset(using=using) \
+          .prefetch_related('workshift_managers')
+
 class WorkshiftPoolIndex(indexes.SearchIndex, indexes.Indexable):
     """ Index for workshift pools. """
     text = indexes.EdgeNgramField(document=True, use_template=True)
@@ -34,12 +38,15 @@ class WorkshiftPoolIndex(indexes.SearchIndex, indexes.Indexable):
         return WorkshiftPool
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.all().select_related('semester')
 
 class WorkshiftTypeIndex(indexes.SearchIndex, indexes.Indexable):
-    """ Index for workshift types. """
+    """ Index for workshift types. Results render from the stored fields alone. """
+    load_object = False
+
     text = indexes.EdgeNgramField(document=True, use_template=True)
     title = indexes.EdgeNgramField(model_attr='title')
+    url = indexes.CharField(model_attr='get_view_url', indexed=False)
     description = indexes.EdgeNgramField(model_attr='description', null=True)
     quick_tips = indexes.EdgeNgramField(model_attr='quick_tips', null=True)
 
@@ -60,7 +67,11 @@ class WorkshiftProfileIndex(indexes.SearchIndex, indexes.Indexable):
         return WorkshiftProfile
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.all().select_related('user', 'semester')
+
+    def read_queryset(self, using=None):
+        return self.index_queryset(using=using) \
+          .prefetch_related('pool_hours__pool')
 
 class RegularWorkshiftIndex(indexes.SearchIndex, indexes.Indexable):
     """ Index for a regular workshift. """
@@ -73,7 +84,12 @@ class RegularWorkshiftIndex(indexes.SearchIndex, indexes.Indexable):
         return RegularWorkshift
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.filter(pool__semester__current=True)
+        return self.get_model().objects.filter(pool__semester__current=True) \
+          .select_related('workshift_type', 'pool__semester')
+
+    def read_queryset(self, using=None):
+        return self.index_queryset(using=using) \
+          .prefetch_related('current_assignees__user')
 
 ''' Adding these clutters up search pages really quickly.
 class WorkshiftInstanceIndex(indexes.SearchIndex, indexes.Indexable):
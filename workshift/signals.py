@@ -191,8 +191,10 @@ def delete_workshift_instances(sender, instance, **kwargs):
         title=shift.workshift_type.title,
         description=shift.workshift_type.description,
         pool=shift.pool,
+        verify=shift.verify,
         start_time=shift.start_time,
         end_time=shift.end_time,
+        week_long=shift.week_long,
     )
     for instance in instances:
         if instance.closed:
@@ -258,6 +260,58 @@ def set_week_long(sender, instance, **kwargs):
     shift = instance
     shift.week_long = shift.day not in [i[0] for i in DAY_CHOICES]
 
+def _update_instance_info(instances, info, **kwargs):
+    instances.update(
+        pool=info.pool,
+        verify=info.verify,
+        week_long=info.week_long,
+        start_time=info.start_time,
+        end_time=info.end_time,
+        **kwargs
+    )
+
+@receiver(signals.post_save, sender=RegularWorkshift)
+def update_shift_instances(sender, instance, created, update_fields=None,
+                           **kwargs):
+    shift = instance
+    if created:
+        return
+
+    info_fields = ["workshift_type", "pool", "verify", "week_long", "day",
+                   "start_time", "end_time"]
+    if update_fields is not None and \
+      not any(field in update_fields for field in info_fields):
+        return
+
+    _update_instance_info(
+        WorkshiftInstance.objects.filter(weekly_workshift=shift),
+        shift,
+        title=shift.workshift_type.title,
+        workshift_type=shift.workshift_type,
+    )
+
+@receiver(signals.post_save, sender=InstanceInfo)
+def update_info_instances(sender, instance, created, **kwargs):
+    info = instance
+    if created:
+        return
+
+    _update_instance_info(
+        WorkshiftInstance.objects.filter(info=info),
+        info,
+        title=info.title,
+    )
+
+@receiver(signals.post_save, sender=WorkshiftType)
+def update_type_instances(sender, instance, created, **kwargs):
+    wtype = instance
+    if created:
+        return
+
+    WorkshiftInstance.objects.filter(
+        workshift_type=wtype,
+    ).update(title=wtype.title)
+
 @receiver(signals.pre_delete, sender=WorkshiftInstance)
 def subtract_instance_hours(sender, instance, **kwargs):
     if instance.closed and instance.workshifter:
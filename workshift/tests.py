@@ -2,12 +2,16 @@
 from __future__ import absolute_import
 
 from datetime import timedelta, time, date
+import json
 
 from django.conf import settings
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.utils.six import StringIO
 from django.utils.timezone import now, localtime
 
+from base import counters
 from base.models import User, UserProfile, ProfileRequest
 from farnsworth import pre_fill
 from managers.models import Manager
@@ -18,7 +22,8 @@ from workshift.models import *
 from workshift.forms import *
 from workshift.fields import DAY_CHOICES
 from workshift.cron import CollectBlownCronJob, UpdateWeeklyStandings
-from workshift import utils, signals
+from workshift import utils, signals, views
+from utils.testing import QueryBudgetMixin
 
 class TestStart(TestCase):
     """
@@ -557,7 +562,31 @@ class TestUtils(TestCase):
         self.assertEqual(self.p2.hours, PoolHours.objects.get(pool=self.p2).hours)
 
     def test_can_manage(self):
-        pass
+        self.assertFalse(utils.can_manage(self.u, self.semester, self.p2))
+
+        # Each check is only run once for a user object
+        user = User.objects.get(pk=self.u.pk)
+        pool_manager = Manager.objects.create(
+            title="Alternate Manager",
+            incumbent=UserProfile.objects.get(user=self.u),
+        )
+        self.p2.managers.add(pool_manager)
+        with self.assertNumQueries(3):
+            self.assertFalse(utils.can_manage(user, self.semester))
+            self.assertFalse(utils.can_manage(user, self.semester, self.p1))
+            self.assertTrue(utils.can_manage(user, self.semester, self.p2))
+            self.assertTrue(utils.can_manage(user, pool=self.p2))
+
+        user = User.objects.get(pk=self.u.pk)
+        self.semester.workshift_managers.add(user)
+        self.assertTrue(utils.can_manage(user, self.semester))
+
+        user = User.objects.get(pk=self.u.pk)
+        pool_manager.workshift_manager = True
+        pool_manager.save()
+        with self.assertNumQueries(1):
+            self.assertTrue(utils.can_manage(user, self.semester, self.p1))
+            self.assertTrue(utils.can_manage(user))
 
     def test_is_available(self):
         pass
@@ -695,7 +724,148 @@ class TestUtils(TestCase):
             utils.collect_blown(moment=moment),
         )
 
-class TestViews(TestCase):
+    def test_calculate_assigned_hours(self):
+        wtype = WorkshiftType.objects.create(title="Test Assigned Hours")
+        shift1 = RegularWorkshift.objects.create(
+            workshift_type=wtype,
+            pool=self.p1,
+            hours=2,
+        )
+        shift2 = RegularWorkshift.objects.create(
+            workshift_type=wtype,
+            pool=self.p1,
+            hours=3,
+        )
+        shift3 = RegularWorkshift.objects.create(
+            workshift_type=wtype,
+            pool=self.p2,
+            hours=4,
+        )
+        for shift in [shift1, shift2, shift3]:
+            shift.current_assignees = [self.profile]
+
+        PoolHours.objects.all().update(assigned_hours=10)
+        utils.calculate_assigned_hours()
+
+        self.assertEqual(
+            5, self.profile.pool_hours.get(pool=self.p1).assigned_hours,
+        )
+        self.assertEqual(
+            4, self.profile.pool_hours.get(pool=self.p2).assigned_hours,
+        )
+
+        RegularWorkshift.objects.filter(pk=shift3.pk).update(active=False)
+        utils.calculate_assigned_hours(profiles=[self.profile])
+
+        self.assertEqual(
+            0, self.profile.pool_hours.get(pool=self.p2).assigned_hours,
+        )
+
+    def test_clear_all_assignments(self):
+        wtype = WorkshiftType.objects.create(title="Test Clear Assignments")
+        shift = RegularWorkshift.objects.create(
+            workshift_type=wtype,
+            pool=self.p1,
+            hours=2,
+        )
+        shift.current_assignees = [self.profile]
+        self.assertTrue(WorkshiftInstance.objects.filter(
+            weekly_workshift=shift, workshifter=self.profile,
+        ).exists())
+
+        utils.clear_all_assignments(semester=self.semester, pool=self.p1)
+
+        self.assertEqual(0, shift.current_assignees.count())
+        self.assertEqual(
+            0, self.profile.pool_hours.get(pool=self.p1).assigned_hours,
+        )
+        self.assertFalse(WorkshiftInstance.objects.filter(
+            weekly_workshift=shift, workshifter=self.profile,
+        ).exists())
+
+    def test_recalculate_command(self):
+        wtype = WorkshiftType.objects.create(title="Test Command")
+        shift = RegularWorkshift.objects.create(
+            workshift_type=wtype,
+            pool=self.p1,
+            hours=2,
+        )
+        shift.current_assignees = [self.profile]
+        PoolHours.objects.all().update(assigned_hours=0)
+
+        out = StringIO()
+        call_command("recalculate_assigned_hours", stdout=out)
+        self.assertIn("Recalculated assigned hours", out.getvalue())
+        self.assertEqual(
+            2, self.profile.pool_hours.get(pool=self.p1).assigned_hours,
+        )
+
+        call_command(
+            "recalculate_assigned_hours", clear=True,
+            semester=self.semester.season + str(self.semester.year),
+            stdout=out,
+        )
+        self.assertIn("Cleared assignments", out.getvalue())
+        self.assertEqual(0, shift.current_assignees.count())
+
+    def test_benchmark_command(self):
+        instances = WorkshiftInstance.objects.count()
+        out = StringIO()
+        call_command(
+            "benchmark_queries", years=1, members=3, repeat=1, stdout=out,
+        )
+        self.assertIn("Blown shifts", out.getvalue())
+        self.assertIn("Open requests of a type", out.getvalue())
+        # The synthetic data is rolled back
+        self.assertEqual(instances, WorkshiftInstance.objects.count())
+
+    def test_instance_info_sync(self):
+        wtype = WorkshiftType.objects.create(title="Test Sync")
+        shift = RegularWorkshift.objects.create(
+            workshift_type=wtype,
+            pool=self.p1,
+            day=2,
+            start_time=time(9),
+        )
+        instance = WorkshiftInstance.objects.filter(weekly_workshift=shift)[0]
+        self.assertEqual("Test Sync", instance.title)
+        self.assertEqual(wtype, instance.workshift_type)
+        self.assertEqual(self.p1, instance.pool)
+        self.assertEqual(time(9), instance.start_time)
+        self.assertFalse(instance.week_long)
+
+        shift.pool = self.p2
+        shift.day = None
+        shift.verify = AUTO_VERIFY
+        shift.save()
+        wtype.title = "Test Sync Renamed"
+        wtype.save()
+
+        instance = WorkshiftInstance.objects.get(pk=instance.pk)
+        self.assertEqual("Test Sync Renamed", instance.title)
+        self.assertEqual(self.p2, instance.pool)
+        self.assertEqual(AUTO_VERIFY, instance.verify)
+        self.assertTrue(instance.week_long)
+        self.assertIn(
+            instance,
+            WorkshiftInstance.objects.filter(pool=self.p2, week_long=True),
+        )
+
+        info = InstanceInfo.objects.create(title="One Time", pool=self.p1)
+        once = WorkshiftInstance.objects.create(
+            info=info,
+            date=localtime(now()).date(),
+        )
+        info.title = "One Time Renamed"
+        info.end_time = time(17)
+        info.save()
+
+        once = WorkshiftInstance.objects.get(pk=once.pk)
+        self.assertEqual("One Time Renamed", once.title)
+        self.assertEqual(time(17), once.end_time)
+        self.assertEqual(None, once.workshift_type)
+
+class TestViews(QueryBudgetMixin, TestCase):
     """
     Tests a few basic things about the application: That all the pages can load
     correctly, and that they contain the content that is expected.
@@ -797,6 +967,22 @@ class TestViews(TestCase):
 
         self.assertTrue(self.client.login(username="wu", password="pwd"))
 
+    def get_query_budgets(self):
+        return [
+            (reverse("workshift:view_semester"), 31),
+            (reverse("workshift:semester_info"), 19),
+            (reverse("workshift:view_open"), 17),
+            (reverse("workshift:profiles"), 24),
+            (reverse("workshift:profile",
+                     kwargs={"targetUsername": self.wu.username}), 36),
+            (reverse("workshift:manage"), 25),
+            (reverse("workshift:view_pool", kwargs={"pk": self.pool.pk}), 19),
+            (reverse("workshift:view_shift", kwargs={"pk": self.shift.pk}), 33),
+            (reverse("workshift:view_instance",
+                     kwargs={"pk": self.instance.pk}), 46),
+            (reverse("workshift:list_types"), 20),
+        ]
+
     def test_no_profile(self):
         self.client.logout()
         self.client.login(username='u', password='pwd')
@@ -1024,6 +1210,103 @@ class TestViews(TestCase):
         response = self.client.get(url + "?day=2014-100-100")
         self.assertEqual(response.status_code, 200)
 
+    def test_open_shifts(self):
+        other = Semester.objects.create(
+            year=self.sem.year + 1,
+            start_date=self.sem.start_date + timedelta(days=365),
+            end_date=self.sem.end_date + timedelta(days=365),
+        )
+        other_info = InstanceInfo.objects.create(
+            title="Other Semester Shift",
+            pool=WorkshiftPool.objects.get(semester=other, is_primary=True),
+        )
+        WorkshiftInstance.objects.create(info=other_info, date=other.start_date)
+        other.current = False
+        other.save(update_fields=["current"])
+        self.sem.current = True
+        self.sem.save(update_fields=["current"])
+
+        info = InstanceInfo.objects.create(
+            title="Open Shift",
+            pool=self.pool,
+        )
+        opens = [
+            WorkshiftInstance.objects.create(
+                info=info,
+                date=self.sem.start_date + timedelta(days=i // 2),
+            )
+            for i in range(5)
+        ]
+        self.wprofile.ratings.add(WorkshiftRating.objects.create(
+            workshift_type=self.wtype,
+            rating=WorkshiftRating.LIKE,
+        ))
+        self.assertEqual(
+            set([self.wtype.pk]), views._get_preferred_types(self.wprofile),
+        )
+
+        url = reverse("workshift:view_open")
+        old_size = views.OPEN_SHIFTS_PAGE_SIZE
+        views.OPEN_SHIFTS_PAGE_SIZE = 2
+        try:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotContains(response, other_info.title)
+            self.assertEqual(
+                opens[:2],
+                [shift for shift, preferred in response.context["shift_tuples"]],
+            )
+            self.assertIsNone(response.context["previous_cursor"])
+
+            response = self.client.get(
+                url + "?after=" + response.context["next_cursor"],
+            )
+            self.assertEqual(
+                opens[2:4],
+                [shift for shift, preferred in response.context["shift_tuples"]],
+            )
+
+            response = self.client.get(
+                url + "?after=" + response.context["next_cursor"],
+            )
+            self.assertEqual(
+                opens[4:],
+                [shift for shift, preferred in response.context["shift_tuples"]],
+            )
+            self.assertIsNone(response.context["next_cursor"])
+
+            response = self.client.get(
+                url + "?before=" + response.context["previous_cursor"],
+            )
+            self.assertEqual(
+                opens[2:4],
+                [shift for shift, preferred in response.context["shift_tuples"]],
+            )
+
+            response = self.client.get(url + "?after=abcd")
+            self.assertEqual(response.status_code, 200)
+        finally:
+            views.OPEN_SHIFTS_PAGE_SIZE = old_size
+
+    def test_open_shifts_sign_in(self):
+        info = InstanceInfo.objects.create(
+            title="Open Shift",
+            pool=self.pool,
+        )
+        instance = WorkshiftInstance.objects.create(
+            info=info,
+            date=self.sem.start_date,
+        )
+        response = self.client.post(reverse("workshift:view_open"), {
+            "pk": instance.pk,
+            "sign_in": "",
+        })
+        self.assertRedirects(response, instance.get_view_url())
+        self.assertEqual(
+            self.wprofile,
+            WorkshiftInstance.objects.get(pk=instance.pk).workshifter,
+        )
+
     def test_auto_assign(self):
         self.test_clear_assignees()
 
@@ -1490,6 +1773,130 @@ class TestInteractForms(TestCase):
         form = SignOutForm({"pk": self.once.pk}, profile=self.up)
         self.assertFalse(form.is_valid())
 
+    def test_batch_verify(self):
+        second = WorkshiftInstance.objects.create(
+            weekly_workshift=self.shift,
+            date=self.sem.start_date + timedelta(days=1),
+            workshifter=self.up,
+            verify=OTHER_VERIFY,
+        )
+        pool_hours = self.up.pool_hours.get(pool=self.pool)
+        standing = pool_hours.standing
+        counters.reconcile()
+
+        form = BatchInteractForm(
+            {
+                "pks": "{0},{1},{2},-1".format(
+                    self.instance.pk, second.pk, self.once.pk,
+                ),
+                "action": BatchInteractForm.VERIFY,
+            },
+            profile=self.op,
+            semester=self.sem,
+        )
+        self.assertTrue(form.is_valid())
+        results = form.save()
+
+        self.assertIsNone(results[self.instance.pk])
+        self.assertIsNone(results[second.pk])
+        self.assertEqual("Workshift is not filled.", results[self.once.pk])
+        self.assertEqual("Workshift does not exist.", results[-1])
+
+        for instance in [self.instance, second]:
+            instance = WorkshiftInstance.objects.get(pk=instance.pk)
+            self.assertTrue(instance.closed)
+            self.assertEqual(self.op, instance.verifier)
+            log = instance.logs.filter(entry_type=ShiftLogEntry.VERIFY)
+            self.assertEqual(1, log.count())
+            self.assertEqual(self.op, log[0].person)
+
+        self.assertEqual(
+            standing + self.instance.hours + second.hours,
+            PoolHours.objects.get(pk=pool_hours.pk).standing,
+        )
+        self.assertEqual(2, self.u.notifications.unread().count())
+        self.assertEqual(
+            ShiftLogEntry.objects.count(),
+            counters.get_counts()["workshift.log_entries"],
+        )
+
+    def test_batch_blown_notifications(self):
+        # The manager is notified once, as the workshifter
+        self.instance.workshifter = self.wp
+        self.instance.save()
+        form = BatchInteractForm(
+            {
+                "pks": str(self.instance.pk),
+                "action": BatchInteractForm.BLOWN,
+            },
+            profile=self.op,
+            semester=self.sem,
+        )
+        self.assertTrue(form.is_valid())
+        self.assertEqual({self.instance.pk: None}, form.save())
+        self.assertEqual(
+            1,
+            self.wu.notifications.filter(verb="marked as blown").count(),
+        )
+
+    def test_batch_blown(self):
+        self.pool.any_blown = False
+        self.pool.save()
+        pool_hours = self.up.pool_hours.get(pool=self.pool)
+        standing = pool_hours.standing
+        data = {
+            "pks": str(self.instance.pk),
+            "action": BatchInteractForm.BLOWN,
+        }
+
+        form = BatchInteractForm(data, profile=self.op, semester=self.sem)
+        self.assertTrue(form.is_valid())
+        self.assertEqual(
+            {self.instance.pk: "You are not a workshift manager."},
+            form.save(),
+        )
+
+        self.assertTrue(self.client.login(username="wu", password="pwd"))
+        response = self.client.post(reverse("workshift:batch_interact"), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {str(self.instance.pk): {"success": True, "error": None}},
+            json.loads(response.content)["results"],
+        )
+
+        instance = WorkshiftInstance.objects.get(pk=self.instance.pk)
+        self.assertTrue(instance.blown)
+        self.assertTrue(instance.closed)
+        self.assertEqual(
+            1, instance.logs.filter(entry_type=ShiftLogEntry.BLOWN).count(),
+        )
+        self.assertEqual(
+            standing - instance.hours,
+            PoolHours.objects.get(pk=pool_hours.pk).standing,
+        )
+
+        # Managers may verify over a blown shift, which restores its hours
+        response = self.client.post(reverse("workshift:batch_interact"), {
+            "pks": str(self.instance.pk),
+            "action": BatchInteractForm.VERIFY,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            standing + instance.hours,
+            PoolHours.objects.get(pk=pool_hours.pk).standing,
+        )
+
+    def test_batch_bad_input(self):
+        self.assertTrue(self.client.login(username="wu", password="pwd"))
+        url = reverse("workshift:batch_interact")
+        self.assertEqual(405, self.client.get(url).status_code)
+        response = self.client.post(url, {
+            "pks": "a,b",
+            "action": BatchInteractForm.VERIFY,
+        })
+        self.assertEqual(400, response.status_code)
+        self.assertIn("pks", json.loads(response.content)["errors"])
+
 class TestPermissions(TestCase):
     """
     Tests that different levels of users and management are only able to access
@@ -2496,3 +2903,162 @@ class TestSemester(TestCase):
                 admin_email=settings.ADMINS[0][1],
                 workshift_emails=workshift_emails_str,
                 ))
+
+class TestExport(TestCase):
+    """
+    Tests the streaming CSV and JSON exports of a semester's workshift data.
+    """
+    def setUp(self):
+        self.today = localtime(now()).date()
+        self.sem = Semester.objects.create(
+            year=self.today.year,
+            start_date=self.today,
+            end_date=self.today + timedelta(days=6),
+        )
+
+        self.su = User.objects.create_superuser(
+            username="su", email="su@bsc.coop", password="pwd",
+        )
+        self.u = User.objects.create_user(username="u", password="pwd")
+        self.ou = User.objects.create_user(username="ou", password="pwd")
+
+        self.pool = WorkshiftPool.objects.get(semester=self.sem)
+        self.hi_pool = WorkshiftPool.objects.create(
+            title="HI Hours",
+            semester=self.sem,
+        )
+
+        self.wprofile = WorkshiftProfile.objects.get(user=self.u)
+        self.oprofile = WorkshiftProfile.objects.get(user=self.ou)
+
+        self.instances = []
+        for day, pool, profile in [
+                (0, self.pool, self.wprofile),
+                (1, self.pool, self.oprofile),
+                (2, self.hi_pool, self.wprofile),
+                (3, self.pool, self.wprofile),
+                (4, self.hi_pool, self.oprofile),
+        ]:
+            info = InstanceInfo.objects.create(
+                title="Shift {0}".format(day),
+                pool=pool,
+            )
+            self.instances.append(WorkshiftInstance.objects.create(
+                info=info,
+                date=self.today + timedelta(days=day),
+                workshifter=profile,
+            ))
+
+        self.entry = ShiftLogEntry.objects.create(
+            person=self.wprofile,
+            note="Signed in, with a comma",
+            entry_type=ShiftLogEntry.SIGNIN,
+        )
+        self.instances[2].logs = [self.entry]
+        ShiftLogEntry.objects.create(
+            person=self.oprofile,
+            entry_type=ShiftLogEntry.ASSIGNED,
+        )
+
+        self.assertTrue(self.client.login(username="su", password="pwd"))
+
+    def _get(self, kind, fmt, **params):
+        response = self.client.get(
+            reverse("workshift:export", kwargs={"kind": kind, "fmt": fmt}),
+            params,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    def _titles(self, **params):
+        content = self._get("instances", "json", **params)
+        return [row["title"] for row in json.loads(content.decode("utf-8"))]
+
+    def test_instances_csv(self):
+        lines = self._get("instances", "csv").splitlines()
+        self.assertEqual(6, len(lines))
+        self.assertTrue(lines[0].startswith(b"id,date,title,pool,"))
+        self.assertIn(
+            "{0},{1},Shift 0,{2},".format(
+                self.instances[0].pk, self.today.isoformat(), self.pool.title,
+            ).encode("utf-8"),
+            lines[1],
+        )
+
+    def test_filters(self):
+        self.assertEqual(
+            ["Shift 2", "Shift 4"],
+            self._titles(pool=self.hi_pool.pk),
+        )
+        self.assertEqual(
+            ["Shift 0", "Shift 2", "Shift 3"],
+            self._titles(member="u"),
+        )
+        self.assertEqual(
+            ["Shift 1", "Shift 2"],
+            self._titles(
+                start_date=(self.today + timedelta(days=1)).isoformat(),
+                end_date=(self.today + timedelta(days=2)).isoformat(),
+            ),
+        )
+        self.assertEqual(
+            ["Shift 2"],
+            self._titles(pool=self.hi_pool.pk, member="u"),
+        )
+
+    def test_chunks(self):
+        with self.settings(EXPORT_CHUNK_SIZE=2):
+            self.assertEqual(
+                ["Shift {0}".format(i) for i in range(5)],
+                self._titles(),
+            )
+
+    def _log_pks(self, **params):
+        content = self._get("logs", "json", **params)
+        return [row["id"] for row in json.loads(content.decode("utf-8"))]
+
+    def test_logs(self):
+        entries = ShiftLogEntry.objects.filter(person__semester=self.sem)
+        self.assertEqual(
+            list(entries.order_by("pk").values_list("pk", flat=True)),
+            self._log_pks(),
+        )
+        self.assertEqual(
+            list(entries.filter(workshiftinstance__pool=self.hi_pool)
+                 .order_by("pk").values_list("pk", flat=True)),
+            self._log_pks(pool=self.hi_pool.pk),
+        )
+        self.assertIn(self.entry.pk, self._log_pks(pool=self.hi_pool.pk))
+        self.assertNotIn(self.entry.pk, self._log_pks(pool=self.pool.pk))
+
+        content = self._get("logs", "csv", member="u")
+        self.assertIn(b'"Signed in, with a comma"', content)
+        self.assertNotIn(b",ou,", content)
+
+    def test_hours(self):
+        rows = json.loads(self._get("hours", "json").decode("utf-8"))
+        self.assertEqual(
+            set([("u", self.pool.title), ("u", self.hi_pool.title),
+                 ("ou", self.pool.title), ("ou", self.hi_pool.title),
+                 ("su", self.pool.title), ("su", self.hi_pool.title)]),
+            set((row["member"], row["pool"]) for row in rows),
+        )
+
+        rows = json.loads(
+            self._get("hours", "json", member="ou", pool=self.pool.pk)
+            .decode("utf-8")
+        )
+        self.assertEqual(1, len(rows))
+        self.assertEqual(
+            self.oprofile.pool_hours.get(pool=self.pool).pk,
+            rows[0]["id"],
+        )
+
+    def test_manager_required(self):
+        self.client.logout()
+        self.assertTrue(self.client.login(username="u", password="pwd"))
+        response = self.client.get(
+            reverse("workshift:export", kwargs={"kind": "hours", "fmt": "csv"}),
+        )
+        self.assertEqual(response.status_code, 302)
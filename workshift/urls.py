@@ -22,10 +22,12 @@ urlpatterns = [
     url(r"^workshift(?:/(?P<sem_url>\w+\d+))?/manage/easy_fill/$", views.fill_shifts_view, name="easy_fill"),
     url(r"^workshift(?:/(?P<sem_url>\w+\d+))?/manage/add_shift/$", views.add_shift_view, name="add_shift"),
     url(r"^workshift(?:/(?P<sem_url>\w+\d+))?/manage/fine_date/$", views.fine_date_view, name="fine_date"),
+    url(r"^workshift(?:/(?P<sem_url>\w+\d+))?/manage/export/(?P<kind>instances|logs|hours)\.(?P<fmt>csv|json)$", views.export_view, name="export"),
     url(r"^workshift(?:/(?P<sem_url>\w+\d+))?/pool/(?P<pk>\d+)/$", views.pool_view, name="view_pool"),
     url(r"^workshift(?:/(?P<sem_url>\w+\d+))?/pool/(?P<pk>\d+)/edit/$", views.edit_pool_view, name="edit_pool"),
     url(r"^workshift(?:/(?P<sem_url>\w+\d+))?/shift/(?P<pk>\d+)/$", views.shift_view, name="view_shift"),
     url(r"^workshift(?:/(?P<sem_url>\w+\d+))?/shift/(?P<pk>\d+)/edit/$", views.edit_shift_view, name="edit_shift"),
+    url(r"^workshift(?:/(?P<sem_url>\w+\d+))?/instance/batch/$", views.batch_interact_view, name="batch_interact"),
     url(r"^workshift(?:/(?P<sem_url>\w+\d+))?/instance/(?P<pk>\d+)/$", views.instance_view, name="view_instance"),
     url(r"^workshift(?:/(?P<sem_url>\w+\d+))?/instance/(?P<pk>\d+)/edit/$", views.edit_instance_view, name="edit_instance"),
     url(r"^workshift/types/$", views.list_types_view, name="list_types"),
@@ -12,10 +12,11 @@ from itertools import cycle
 import random
 
 from django.conf import settings
-from django.db.models import Q
+from django.db.models import Sum
 from django.utils.timezone import now, localtime
 
-from notifications import notify
+from base.fanout import notify_many
+from base.permissions import get_capabilities
 from pytz import timezone
 
 from managers.models import Manager
@@ -27,18 +28,38 @@ def can_manage(user, semester=None, pool=None):
     current workshift managers, that semester's workshift managers, and site
     superusers.
     """
-    if semester and user in semester.workshift_managers.all():
+    if user.is_superuser or user.is_staff:
         return True
 
-    if Manager and Manager.objects.filter(
-        incumbent__user=user, workshift_manager=True
-    ).count() > 0:
+    capabilities = get_capabilities(user)
+    if not capabilities.authenticated:
+        return False
+
+    if capabilities.is_workshift_manager:
         return True
 
-    if pool and pool.managers.filter(incumbent__user=user).count() > 0:
+    if semester and semester.pk in capabilities.remember(
+        "workshift_semesters",
+        lambda: set(Semester.objects.filter(workshift_managers=user)
+                    .values_list("pk", flat=True)),
+    ):
         return True
 
-    return user.is_superuser or user.is_staff
+    return bool(pool) and pool.pk in managed_pools(user)
+
+def managed_pools(user):
+    """
+    The pks of the workshift pools that a user holds one of the manager
+    positions of.
+    """
+    capabilities = get_capabilities(user)
+    if not capabilities.authenticated:
+        return set()
+    return capabilities.remember(
+        "workshift_pools",
+        lambda: set(WorkshiftPool.objects.filter(managers__incumbent__user=user)
+                    .values_list("pk", flat=True)),
+    )
 
 def get_year_season(day=None):
     """
@@ -310,12 +331,11 @@ def collect_blown(semester=None, moment=None):
             for manager in instance.pool.managers.all():
                 if manager.incumbent:
                     targets.append(manager.incumbent.user)
-            for target in targets:
-                notify.send(
-                    instance,
-                    verb="was automatically marked as blown",
-                    recipient=target,
-                )
+            notify_many(
+                instance,
+                targets,
+                verb="was automatically marked as blown",
+            )
 
         instance.save(update_fields=["closed", "blown"])
 
@@ -519,12 +539,11 @@ def randomly_assign_instances(semester, pool, profiles=None, instances=None):
         profiles = WorkshiftProfile.objects.filter(semester=semester)
     if instances is None:
         instances = WorkshiftInstance.objects.filter(
-            Q(info__pool=pool) |
-            Q(weekly_workshift__pool=pool),
+            pool=pool,
             workshifter__isnull=True,
             closed=False,
         ).exclude(
-            weekly_workshift__workshift_type__assignment=WorkshiftType.NO_ASSIGN,
+            workshift_type__assignment=WorkshiftType.NO_ASSIGN,
         )
 
     instances = list(instances)
@@ -538,10 +557,7 @@ def randomly_assign_instances(semester, pool, profiles=None, instances=None):
 
     # Initialize with already-assigned instances
     for profile in profiles:
-        for shift in profile.instance_workshifter.filter(
-                Q(info__pool=pool) |
-                Q(weekly_workshift__pool=pool)
-            ):
+        for shift in profile.instance_workshifter.filter(pool=pool):
             hours_mapping[profile] += float(shift.hours)
         pool_hours = profile.pool_hours.get(pool=pool)
         if pool.weeks_per_period == 0:
@@ -573,6 +589,12 @@ def randomly_assign_instances(semester, pool, profiles=None, instances=None):
     return profiles, instances
 
 def clear_all_assignments(semester=None, pool=None):
+    """
+    Removes every workshifter from the auto-assigned regular workshifts in a
+    pool. The assignments are deleted directly from the through table, so the
+    per-shift m2m_changed handlers are replaced by one bulk unassignment of the
+    open instances and one recalculation of the affected members' hours.
+    """
     if semester is None:
         try:
             semester = Semester.objects.get(current=True)
@@ -588,8 +610,21 @@ def clear_all_assignments(semester=None, pool=None):
         is_manager_shift=False,
         workshift_type__assignment=WorkshiftType.AUTO_ASSIGN,
     )
-    for shift in shifts:
-        shift.current_assignees.clear()
+    assignments = RegularWorkshift.current_assignees.through.objects.filter(
+        regularworkshift__in=shifts,
+    )
+    profiles = list(WorkshiftProfile.objects.filter(
+        pk__in=set(assignments.values_list("workshiftprofile", flat=True)),
+    ))
+
+    assignments.delete()
+
+    WorkshiftInstance.objects.filter(
+        weekly_workshift__in=shifts,
+        closed=False,
+    ).update(workshifter=None, liable=None)
+
+    calculate_assigned_hours(profiles=profiles)
 
 def update_standings(semester=None, pool_hours=None, moment=None):
     if semester is None:
@@ -649,7 +684,7 @@ def reset_standings(semester=None, pool_hours=None):
 
         for field in ["workshifter", "liable"]:
             instances = WorkshiftInstance.objects.filter(
-                Q(weekly_workshift__pool=hours.pool) | Q(info__pool=hours.pool),
+                pool=hours.pool,
                 closed=True,
                 **{field: profile}
             )
@@ -669,18 +704,41 @@ def reset_standings(semester=None, pool_hours=None):
 def calculate_assigned_hours(profiles=None):
     """
     Recalculates PoolHour.assigned_hours from scratch.
+
+    The hours of every active regular workshift are summed per (profile, pool)
+    in a single grouped query over the current_assignees table, and the
+    results are written back with one update per distinct total.
     """
     if profiles is None:
         profiles = WorkshiftProfile.objects.all()
-    for profile in profiles:
-        for pool_hours in profile.pool_hours.all():
-            shifts = RegularWorkshift.objects.filter(
-                current_assignees=profile,
-                pool=pool_hours.pool,
-                active=True,
-            )
-            pool_hours.assigned_hours = sum(i.hours for i in shifts)
-            pool_hours.save(update_fields=["assigned_hours"])
+
+    assignments = RegularWorkshift.current_assignees.through.objects.filter(
+        workshiftprofile__in=profiles,
+        regularworkshift__active=True,
+    ).values(
+        "workshiftprofile", "regularworkshift__pool",
+    ).annotate(
+        total=Sum("regularworkshift__hours"),
+    )
+    totals = dict(
+        ((i["workshiftprofile"], i["regularworkshift__pool"]), i["total"])
+        for i in assignments
+    )
+
+    pool_hours = WorkshiftProfile.pool_hours.through.objects.filter(
+        workshiftprofile__in=profiles,
+    ).values_list("workshiftprofile", "poolhours__pool", "poolhours")
+
+    grouped = defaultdict(list)
+    for profile_pk, pool_pk, pool_hours_pk in pool_hours:
+        grouped[totals.get((profile_pk, pool_pk)) or 0].append(pool_hours_pk)
+
+    for total, pks in grouped.items():
+        # Keep each update below SQLite's limit on query parameters
+        for index in range(0, len(pks), 500):
+            PoolHours.objects.filter(
+                pk__in=pks[index:index + 500],
+            ).update(assigned_hours=total)
 
 def reset_instance_assignments(semester=None, shifts=None):
     if semester is None:
@@ -7,14 +7,15 @@ Authors: Karandeep Singh Nagra and Nader Morshed
 from __future__ import division, absolute_import
 
 from datetime import date, timedelta
+import json
 
 from django.db.models import Q
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.core.urlresolvers import reverse
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseNotAllowed, \
+     HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import render_to_response, get_object_or_404
 from django.template import RequestContext
 from django.utils.timezone import now, localtime
@@ -23,6 +24,8 @@ import inflect
 p = inflect.engine()
 
 from utils.variables import MESSAGES, date_formats
+from base.counters import get_counts
+from base.permissions import get_capabilities
 from base.models import User
 from managers.models import Manager
 from workshift.decorators import get_workshift_profile, \
@@ -30,13 +33,15 @@ from workshift.decorators import get_workshift_profile, \
 from workshift.models import *
 from workshift.forms import *
 from workshift import utils
+from workshift.export import FORMATS, get_export_queryset, iter_export
 from workshift.templatetags.workshift_tags import wurl
 
 def add_archive_context(request):
-    semester_count = Semester.objects.count()
-    workshift_profile_count = WorkshiftProfile.objects.count()
-    shift_log_entry_count = ShiftLogEntry.objects.count()
-    workshift_instance_count = WorkshiftInstance.objects.count()
+    counts = get_counts()
+    semester_count = counts["workshift.semesters"]
+    workshift_profile_count = counts["workshift.profiles"]
+    shift_log_entry_count = counts["workshift.log_entries"]
+    workshift_instance_count = counts["workshift.instances"]
     nodes = [
         [
             "{} {}".format(semester_count, p.plural("semester", semester_count)),
@@ -314,18 +319,16 @@ def semester_view(request, semester, profile=None):
     day_shifts = WorkshiftInstance.objects.filter(
         date__gte=start_date,
         date__lte=end_date,
-    ).exclude(
-        Q(weekly_workshift__week_long=True) |
-        Q(info__week_long=True),
+        week_long=False,
     )
 
     last_monday = start_date - timedelta(days=start_date.weekday())
     next_sunday = end_date - timedelta(days=end_date.weekday() + 1) + timedelta(weeks=1)
 
     week_shifts = WorkshiftInstance.objects.filter(
-        Q(weekly_workshift__week_long=True) |
-        Q(info__week_long=True),
-        date__gte=last_monday, date__lte=next_sunday,
+        date__gte=last_monday,
+        date__lte=next_sunday,
+        week_long=True,
     )
 
     template_dict["last_monday"] = last_monday.strftime("%Y-%m-%d")
@@ -372,7 +375,7 @@ def _get_forms(profile, instance, undo=False, prefix=""):
     if (not instance.closed or undo) and instance.workshifter:
         workshifter = instance.workshifter or instance.liable
         pool = instance.pool
-        managers = Manager.objects.filter(incumbent__user=profile.user)
+        managers = get_capabilities(profile.user).positions
         verify, blow = False, False
 
         # The many ways a person can be eligible to verify a shift...
@@ -385,7 +388,7 @@ def _get_forms(profile, instance, undo=False, prefix=""):
         elif instance.verify == ANY_MANAGER_VERIFY and managers:
             verify = True
         elif instance.verify == POOL_MANAGER_VERIFY and \
-          set(managers).intersections(pool.managers):
+          set(managers).intersection(pool.managers.all()):
             verify = True
         elif instance.verify == WORKSHIFT_MANAGER_VERIFY and \
           any(i.workshift_manager for i in managers):
@@ -405,8 +408,7 @@ def _get_forms(profile, instance, undo=False, prefix=""):
         if pool.any_blown:
             blow = True
 
-        pool_managers = pool.managers.filter(incumbent__user=profile.user)
-        if pool_managers.count():
+        if pool.pk in utils.managed_pools(profile.user):
             blow = True
 
         if blow and not instance.blown:
@@ -467,45 +469,94 @@ def _get_forms(profile, instance, undo=False, prefix=""):
 
     return ret
 
-def _is_preferred(instance, profile):
+def _get_preferred_types(profile):
     """
-    Check if a user has marked an instance's workshift type as preferred.
+    Get the pks of the workshift types a user has marked as preferred.
     """
-    if not instance.weekly_workshift:
-        return False
-    if profile and profile.ratings.filter(
-        workshift_type=instance.weekly_workshift.workshift_type,
-        rating=WorkshiftRating.LIKE,
-        ).count() == 0:
-        return False
-    return True
+    if not profile:
+        return set()
+    return set(
+        profile.ratings.filter(
+            rating=WorkshiftRating.LIKE,
+        ).values_list("workshift_type", flat=True)
+    )
+
+def _get_cursor(request, name):
+    """
+    Parse a (date, pk) keyset cursor of the form "YYYY-MM-DD_pk" from the
+    request's GET parameters.
+    """
+    try:
+        day, pk = request.GET[name].split("_")
+        return date(*map(int, day.split("-"))), int(pk)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _format_cursor(instance):
+    return "{0}_{1}".format(instance.date.strftime("%Y-%m-%d"), instance.pk)
+
+OPEN_SHIFTS_PAGE_SIZE = 250
 
 @get_workshift_profile
 def open_shifts_view(request, semester, profile=None):
+    """
+    List the open, unassigned shifts for the semester, paginated by
+    (date, pk) so that later pages cost as much as the first.
+    """
     page_name = "Upcoming Open Shifts"
+
+    if profile and SignInForm.action_name in request.POST:
+        form = SignInForm(request.POST, profile=profile)
+        if form.is_valid():
+            instance = form.save()
+            return HttpResponseRedirect(instance.get_view_url())
+        for error in form.errors.values():
+            messages.add_message(request, messages.ERROR, error)
+
     shifts = WorkshiftInstance.objects.filter(
+        semester=semester,
         closed=False,
         workshifter=None,
-    ).order_by("date")
-    shift_count = shifts.count()
-    paginator = Paginator(shifts, 250)
+    )
+    after = _get_cursor(request, "after")
+    before = _get_cursor(request, "before")
+    if before is not None:
+        shifts = shifts.filter(
+            Q(date__lt=before[0]) | Q(date=before[0], pk__lt=before[1])
+        ).order_by("-date", "-pk")
+    else:
+        if after is not None:
+            shifts = shifts.filter(
+                Q(date__gt=after[0]) | Q(date=after[0], pk__gt=after[1])
+            )
+        shifts = shifts.order_by("date", "pk")
+
+    # Grab one extra row to know whether there is another page
+    shifts = list(shifts[:OPEN_SHIFTS_PAGE_SIZE + 1])
+    has_more = len(shifts) > OPEN_SHIFTS_PAGE_SIZE
+    shifts = shifts[:OPEN_SHIFTS_PAGE_SIZE]
+    if before is not None:
+        shifts.reverse()
+        has_previous, has_next = has_more, True
+    else:
+        has_previous, has_next = after is not None, has_more
+
+    preferred_types = _get_preferred_types(profile)
+    for shift in shifts:
+        # Every row shares the semester, skip fetching it for each URL
+        shift.semester = semester
 
-    page = request.GET.get("page")
-    try:
-        shifts = paginator.page(page)
-    except PageNotAnInteger:
-        shifts = paginator.page(1)
-    except EmptyPage:
-        shifts = paginator.page(paginator.num_pages)
-    shift_tuples = [
-        (instance, _get_forms(profile, instance), _is_preferred(instance, profile))
-        for instance in shifts
-    ]
     return render_to_response("open_shifts.html", {
         "page_name": page_name,
-        "shifts": shifts,
-        "shift_count": shift_count,
-        "shift_tuples": shift_tuples,
+        "profile": profile,
+        "shift_tuples": [
+            (shift, shift.workshift_type_id in preferred_types)
+            for shift in shifts
+        ],
+        "previous_cursor": _format_cursor(shifts[0])
+        if shifts and has_previous else None,
+        "next_cursor": _format_cursor(shifts[-1])
+        if shifts and has_next else None,
     }, context_instance=RequestContext(request))
 
 @workshift_manager_required
@@ -747,8 +798,37 @@ def manage_view(request, semester, profile=None):
         "close_semester_form": close_semester_form,
         "open_semester_form": open_semester_form,
         "workshifters": zip(workshifters, pool_hours),
+        "semester": semester,
     }, context_instance=RequestContext(request))
 
+@semester_required
+@workshift_manager_required
+def export_view(request, semester, kind, fmt):
+    """
+    Streams a semester's workshift instances, shift log entries or pool hours
+    as CSV or JSON. The rows can be filtered by pool, by date range and by
+    member, using the pool, start_date, end_date and member parameters.
+    """
+    pool = None
+    if request.GET.get("pool", "").isdigit():
+        pool = get_object_or_404(
+            WorkshiftPool, semester=semester, pk=request.GET["pool"],
+        )
+    queryset = get_export_queryset(
+        kind, semester,
+        pool=pool,
+        start_date=_get_date(request, "start_date", None),
+        end_date=_get_date(request, "end_date", None),
+        member=request.GET.get("member") or None,
+    )
+    response = StreamingHttpResponse(
+        iter_export(kind, fmt, queryset),
+        content_type=FORMATS[fmt],
+    )
+    response["Content-Disposition"] = \
+      'attachment; filename="{0}_{1}.{2}"'.format(semester.sem_url, kind, fmt)
+    return response
+
 @semester_required
 @workshift_manager_required
 def assign_shifts_view(request, semester):
@@ -1006,7 +1086,7 @@ def fill_shifts_view(request, semester):
     fill_hi_shifts_form = None
     reset_all_shifts_form = None
 
-    managers = Manager.objects.filter(incumbent__user=request.user)
+    titles = [position.title for position in get_capabilities(request.user).positions]
     admin = utils.can_manage(request.user, semester=semester)
 
     if admin:
@@ -1028,13 +1108,13 @@ def fill_shifts_view(request, semester):
         )
     # XXX: BAD! We should filter by pool owners? By Manager bool flags? By
     # arbitrary django permissions?
-    if admin or managers.filter(title="Social Manager"):
+    if admin or "Social Manager" in titles:
         fill_social_shifts_form = FillSocialShiftsForm(
             request.POST,
             semester=semester,
         )
     # XXX: See above
-    if admin or managers.filter(title="Maintenance Manager"):
+    if admin or "Maintenance Manager" in titles:
         fill_hi_shifts_form = FillHIShiftsForm(
             request.POST,
             semester=semester,
@@ -1237,11 +1317,8 @@ def shift_view(request, semester, pk, profile=None):
     page_name = shift.workshift_type.title
 
     if shift.is_manager_shift:
-        president = Manager.objects.filter(
-            incumbent__user=request.user,
-            president=True,
-        ).count() > 0
-        can_edit = request.user.is_superuser or president
+        can_edit = request.user.is_superuser or \
+          get_capabilities(request.user).is_president
     else:
         can_edit = utils.can_manage(request.user, semester=semester, pool=shift.pool)
 
@@ -1310,6 +1387,48 @@ def edit_shift_view(request, semester, pk, profile=None):
         "edit_form": edit_form,
     }, context_instance=RequestContext(request))
 
+@get_workshift_profile
+def batch_interact_view(request, semester, profile=None):
+    """
+    Verify or blow a list of workshift instances at once. Responds with JSON
+    mapping each requested pk to whether the action succeeded and, if not,
+    why.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    if not profile:
+        return HttpResponse(
+            json.dumps({"error": "You do not have a workshift profile."}),
+            content_type="application/json",
+            status=403,
+        )
+
+    form = BatchInteractForm(
+        request.POST,
+        profile=profile,
+        semester=semester,
+        undo=utils.can_manage(request.user, semester),
+    )
+    if not form.is_valid():
+        return HttpResponse(
+            json.dumps({"errors": dict(
+                (field, list(errors)) for field, errors in form.errors.items()
+            )}),
+            content_type="application/json",
+            status=400,
+        )
+
+    results = form.save()
+    return HttpResponse(
+        json.dumps({
+            "results": dict(
+                (str(pk), {"success": error is None, "error": error})
+                for pk, error in results.items()
+            ),
+        }),
+        content_type="application/json",
+    )
+
 @get_workshift_profile
 def instance_view(request, semester, pk, profile=None):
     """
@@ -1346,11 +1465,8 @@ def instance_view(request, semester, pk, profile=None):
 
     edit_hours_form = None
     if instance.weekly_workshift and instance.weekly_workshift.is_manager_shift:
-        president = Manager.objects.filter(
-            incumbent__user=request.user,
-            president=True
-        ).count() > 0
-        edit_hours = request.user.is_superuser or president
+        edit_hours = request.user.is_superuser or \
+          get_capabilities(request.user).is_president
     else:
         edit_hours = utils.can_manage(
             request.user, semester=instance.pool.semester, pool=instance.pool,